@@ -0,0 +1,314 @@
+"""Offline throughput benchmark for the scrape pipeline.
+
+Replaces Google, the web and the keyword model with local stand-ins so runs are repeatable and
+need no network: a synthetic HTTP site (in a separate process, on one or more 127.0.0.x aliases),
+a fake search backend and a stub keyword generator. Reports URLs/sec, fetch latency percentiles
+and peak RSS.
+
+    python src/benchmark.py --urls 10000
+    python src/benchmark.py --urls 100000 --page-size 32768 --latency lognormal --latency-ms 80
+    python src/benchmark.py --mode fetch --urls 50000 --concurrency 64 --json result.json
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+from scraper.search import SearchBackend
+
+DEFAULT_URLS = 10000
+DEFAULT_RESULTS = 100  # Search results per fake keyword
+DEFAULT_PAGE_SIZE = 16 * 1024  # Bytes per synthetic page
+DEFAULT_LATENCY_MS = 20  # Median server-side delay per page
+DEFAULT_HOSTS = 32  # Loopback aliases (127.0.0.1, 127.0.0.2, ...) the site is served on
+DEFAULT_OVERLAP = 0.1  # Share of search results that repeat a URL from another keyword
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+
+VOCABULARY = (
+    "fantasy rpg pc game guide build mod review news patch expansion forum strategy tips boss quest "
+    "dungeon loot skill tree class armor weapon magic spell dragon witcher skyrim final open world "
+    "multiplayer coop campaign story lore map walkthrough release trailer update community download"
+).split()
+
+
+# Synthetic site
+
+def page_delay(distribution, latency_ms, rng):
+    """Return a server-side delay in seconds drawn from the chosen distribution."""
+    if distribution == "fixed":
+        return latency_ms / 1000
+    if distribution == "uniform":
+        return rng.uniform(0, 2 * latency_ms) / 1000
+    return rng.lognormvariate(0, 0.75) * latency_ms / 1000  # Median latency_ms with a long tail
+
+
+def build_page(path, page_size):
+    """Return an HTML page for a path, padded with body text to about page_size bytes."""
+    head = (
+        f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Synthetic page {path}</title>"
+        f"<meta name=\"description\" content=\"Benchmark page served for {path}\"></head><body>"
+    ).encode("utf-8")
+    tail = b"</body></html>"
+    filler = b"<p>lorem ipsum dolor sit amet</p>"
+    repeats = max(0, page_size - len(head) - len(tail)) // len(filler)
+    return head + filler * repeats + tail
+
+
+def serve_site(hosts, page_size, distribution, latency_ms, ready):
+    """Serve synthetic pages on one port per loopback alias until the process is terminated."""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class PageHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, like real sites
+
+        def do_GET(self):
+            time.sleep(page_delay(distribution, latency_ms, random))
+            body = build_page(self.path, page_size)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    base_urls = []
+    for host in range(1, hosts + 1):
+        server = ThreadingHTTPServer((f"127.0.0.{host}", 0), PageHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_urls.append(f"http://127.0.0.{host}:{server.server_port}")
+    ready.send(base_urls)
+    threading.Event().wait()
+
+
+class SyntheticSite:
+    """Runs the synthetic site in a child process so it does not share the GIL or RSS with the scraper."""
+    def __init__(self, hosts=DEFAULT_HOSTS, page_size=DEFAULT_PAGE_SIZE, distribution="lognormal", latency_ms=DEFAULT_LATENCY_MS):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(
+            target=serve_site, args=(hosts, page_size, distribution, latency_ms, sender), daemon=True
+        )
+        self.process.start()
+        self.base_urls = receiver.recv()
+
+    def close(self):
+        self.process.terminate()
+        self.process.join()
+
+
+# Search and keyword stand-ins
+
+class FakeSearch(SearchBackend):
+    """Deterministic stand-in for the Google backend that spreads result URLs over the synthetic hosts."""
+    name = "fake"
+
+    def __init__(self, base_urls, overlap=DEFAULT_OVERLAP, latency_ms=0):
+        self.base_urls = base_urls
+        self.overlap = overlap
+        self.latency_ms = latency_ms
+
+    def search(self, keyword, num_results):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        seed = int.from_bytes(hashlib.blake2b(keyword.encode("utf-8"), digest_size=8).digest(), "big")
+        rng = random.Random(seed)
+        urls = []
+        for rank in range(num_results):
+            # Overlapping results point into a small shared pool, the rest are unique to the keyword
+            page = f"shared/{rng.randrange(1000)}" if rng.random() < self.overlap else f"{seed:x}/{rank}"
+            urls.append(f"{self.base_urls[rank % len(self.base_urls)]}/{page}")
+        return urls
+
+
+class StubKeywordGenerator:
+    """Stand-in for KeywordGenerator producing distinct queries with an optional per-batch delay."""
+    def __init__(self, latency_ms=0, seed=0):
+        self.latency_ms = latency_ms
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.generated = 0
+
+    def generate(self, description, count=1, stop_event=None, avoid=()):
+        if self.latency_ms and (stop_event or threading.Event()).wait(self.latency_ms / 1000):
+            return []  # Stopped mid-batch, like KeywordGenerator
+        with self.lock:
+            keywords = []
+            for _ in range(count):
+                self.generated += 1
+                # A unique token keeps two queries with the same words below the dedup threshold
+                keywords.append(f"q{self.generated} " + " ".join(self.rng.sample(VOCABULARY, 5)))
+            return keywords
+
+
+# Runs
+
+def peak_rss_mb(who=resource.RUSAGE_SELF):
+    """Peak RSS of this process, or with RUSAGE_CHILDREN of its largest child that has exited."""
+    return resource.getrusage(who).ru_maxrss / 1024  # ru_maxrss is in KiB on Linux
+
+
+def open_caches(args, cache_dir):
+    """Return (page_cache, serp_cache) in cache_dir with --cache, else (None, None).
+
+    Never the user's caches: the synthetic URLs repeat from run to run, so a second run would be
+    served from the first one's entries.
+    """
+    from scraper.cache import PageCache, SerpCache
+
+    if not args.cache:
+        return None, None
+    return PageCache(os.path.join(cache_dir, "pages.sqlite")), SerpCache(os.path.join(cache_dir, "serps.sqlite"))
+
+
+def run_pipeline(args, site, cache_dir):
+    """Drive a full ScrapeJob (keywords -> SERPs -> pages), as the GUI worker and CLI do."""
+    from scraper.fetch import FetchEngine
+    from scraper.job import ScrapeJob
+    from scraper.metrics import Metrics
+
+    keywords = max(1, -(-args.urls // args.results))
+    page_cache, serp_cache = open_caches(args, cache_dir)
+    metrics = Metrics()
+    engine = FetchEngine(
+        max_concurrent=args.concurrency, cache=page_cache, metrics=metrics, host_concurrency=args.host_concurrency or None,
+        host_delay=args.host_delay, parse_workers=args.parse_workers
+    )
+    job = ScrapeJob(
+        "Synthetic benchmark description",
+        keywords,
+        args.results,
+        StubKeywordGenerator(args.generate_latency_ms, args.seed).generate,
+        search=FakeSearch(site.base_urls, args.overlap, args.search_latency_ms),
+        use_cache=args.cache,
+        use_journal=False,
+        metrics=metrics,
+        fetch_engine=engine,
+        serp_cache=serp_cache
+    )
+    pages = 0
+    try:
+        for event, value in job.run():
+            if event == "result":
+                pages += 1
+            elif event == "error":
+                print(value, file=sys.stderr)
+    finally:
+        engine.close()
+        for cache in (page_cache, serp_cache):
+            if cache:
+                cache.close()
+    return pages, metrics
+
+
+def run_fetch(args, site, cache_dir):
+    """Drive FetchEngine.get_page_info directly over a fixed list of URLs."""
+    from scraper.fetch import FetchEngine
+
+    search = FakeSearch(site.base_urls, overlap=0)
+    urls = [url for block in range(-(-args.urls // args.results)) for url in search(f"block {block}", args.results)][:args.urls]
+    cache, _ = open_caches(args, cache_dir)
+    engine = FetchEngine(
+        max_concurrent=args.concurrency, cache=cache, host_concurrency=args.host_concurrency or None, host_delay=args.host_delay,
+        parse_workers=args.parse_workers
+    )
+    pages = 0
+    try:
+        for _ in engine.fetch_all(urls):
+            pages += 1
+    finally:
+        engine.close()
+        if cache:
+            cache.close()
+    return pages, engine.metrics
+
+
+def summarize(args, pages, metrics, elapsed, children_rss_mb):
+    snapshot = metrics.snapshot()
+    fetch = snapshot["latency"].get("fetch", {})
+    return {
+        "mode": args.mode,
+        "urls": args.urls,
+        "pages": pages,
+        "seconds": elapsed,
+        "urls_per_second": pages / elapsed if elapsed else 0.0,
+        "fetch_p50_ms": fetch.get("p50", 0.0) * 1000,
+        "fetch_p99_ms": fetch.get("p99", 0.0) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_child_rss_mb": children_rss_mb,  # Largest parse worker; the synthetic site is not counted
+        "concurrency": args.concurrency,
+        "page_size": args.page_size,
+        "latency": f"{args.latency} {args.latency_ms}ms",
+        "metrics": snapshot,
+    }
+
+
+def build_parser():
+    from scraper.fetch import DEFAULT_MAX_CONCURRENT_FETCHES
+    from scraper.metadata import DEFAULT_PARSE_WORKERS
+    from scraper.politeness import DEFAULT_HOST_CONCURRENCY, DEFAULT_HOST_DELAY
+
+    parser = argparse.ArgumentParser(prog="benchmark.py", description="Offline throughput benchmark for AI SERP Scraper.")
+    parser.add_argument("--mode", choices=["pipeline", "fetch"], default="pipeline",
+                        help="pipeline runs a whole ScrapeJob; fetch only exercises the fetch engine.")
+    parser.add_argument("--urls", type=int, default=DEFAULT_URLS, help="Number of URLs to scrape.")
+    parser.add_argument("--results", type=int, default=DEFAULT_RESULTS, help="Search results per keyword.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENT_FETCHES, help="Max concurrent page fetches.")
+    parser.add_argument("--hosts", type=int, default=DEFAULT_HOSTS, help="Loopback aliases to serve the synthetic site on.")
+    # Politeness is off by default so the numbers measure the engine, not the per-host delay
+    parser.add_argument("--host-concurrency", type=int, default=0,
+                        help=f"Per-host fetch cap of the host scheduler; 0 turns it off (scrapes use {DEFAULT_HOST_CONCURRENCY}).")
+    parser.add_argument("--host-delay", type=float, default=0,
+                        help=f"Min seconds between requests to one host (scrapes use {DEFAULT_HOST_DELAY:g}).")
+    parser.add_argument("--parse-workers", type=int, default=DEFAULT_PARSE_WORKERS, help="Processes parsing page heads; 0 parses in-process.")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Bytes per synthetic page.")
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="lognormal", help="Server delay distribution.")
+    parser.add_argument("--latency-ms", type=float, default=DEFAULT_LATENCY_MS, help="Median server delay per page.")
+    parser.add_argument("--search-latency-ms", type=float, default=0, help="Delay of each fake search.")
+    parser.add_argument("--generate-latency-ms", type=float, default=0, help="Delay of each stub keyword batch.")
+    parser.add_argument("--overlap", type=float, default=DEFAULT_OVERLAP, help="Share of search results shared between keywords.")
+    parser.add_argument("--cache", action="store_true", help="Go through page and SERP caches, kept in a temporary directory.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the summary, with the full metrics snapshot, to this file.")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    from scraper.metadata import close_parse_pools
+
+    site = SyntheticSite(args.hosts, args.page_size, args.latency, args.latency_ms)
+    try:
+        with tempfile.TemporaryDirectory(prefix="aiserp-benchmark-") as cache_dir:
+            start = time.perf_counter()
+            pages, metrics = (run_pipeline if args.mode == "pipeline" else run_fetch)(args, site, cache_dir)
+            elapsed = time.perf_counter() - start
+        # Parse workers only count towards RUSAGE_CHILDREN once they have exited; the site is still running
+        close_parse_pools()
+        children_rss_mb = peak_rss_mb(resource.RUSAGE_CHILDREN)
+    finally:
+        site.close()
+
+    summary = summarize(args, pages, metrics, elapsed, children_rss_mb)
+    print(
+        f"{summary['pages']} pages in {summary['seconds']:.1f}s: {summary['urls_per_second']:.0f} URLs/s, "
+        f"fetch p50 {summary['fetch_p50_ms']:.0f}ms, p99 {summary['fetch_p99_ms']:.0f}ms, "
+        f"peak RSS {summary['peak_rss_mb']:.0f} MB"
+        + (f" (+{summary['peak_child_rss_mb']:.0f} MB per parse worker)" if args.parse_workers else "")
+    )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,434 @@
+"""Headless command line interface for AI SERP Scraper.
+
+Runs scrapes without PyQt5 and streams one JSON object per line. Heavy modules (transformers,
+requests, googlesearch) are only imported by the subcommands that need them.
+
+    python src/cli.py scrape --description "..." --keywords 20 --results 10 > pages.jsonl
+    python src/cli.py scrape --jobs jobs.jsonl --parallel-jobs 4 --output pages.jsonl
+    python src/cli.py scrape --resume 20241026-210416-1a2b3c
+    python src/cli.py scrape --description "..." --metrics-port 9100 --metrics-json metrics.json
+    python src/cli.py jobs
+    python src/cli.py cache stats
+    python src/cli.py export --format csv --output pages.csv
+    python src/cli.py shard split --jobs jobs.jsonl --keywords-per-shard 10
+    python src/cli.py shard work --processes 4
+    python src/cli.py shard collect --output pages.csv
+    python src/cli.py serve-keywords --port 8765
+"""
+import argparse
+import json
+import os
+import sys
+
+DEFAULT_KEYWORDS = 10
+DEFAULT_RESULTS = 10
+
+
+def log(message):
+    """Progress goes to stderr so stdout stays valid JSONL."""
+    print(message, file=sys.stderr, flush=True)
+
+
+def load_jobs(args):
+    """Return the list of job specs described by the command line."""
+    if args.resume:
+        return [{"id": args.resume, "resume": True}]
+
+    if args.jobs:
+        from scraper.campaign import load_campaign
+
+        return load_campaign(args.jobs, args.keywords, args.results)
+
+    if args.description_file:
+        with open(args.description_file, encoding="utf-8") as file:
+            description = file.read()
+    else:
+        description = args.description
+    return [{"id": "1", "description": description, "keywords": args.keywords, "results": args.results}]
+
+
+def write_line(output, record):
+    output.write(json.dumps(record, ensure_ascii=False) + "\n")
+    output.flush()
+
+
+def write_metrics(path, metrics):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(metrics.snapshot(), file, indent=2)
+
+
+def job_options(args):
+    """Return the ScrapeJob keyword arguments set by the options of add_job_options()."""
+    from scraper.search import default_search
+
+    return dict(
+        max_concurrent_fetches=args.concurrency,
+        use_cache=not args.no_cache,
+        search=default_search(args.search_backend, args.search_rate),
+        host_concurrency=args.host_concurrency or None,
+        host_delay=args.host_delay,
+        respect_robots=not args.ignore_robots,
+        max_result_memory=args.max_result_memory * 1024 * 1024,
+        generate_timeout=args.generate_timeout,
+        search_timeout=args.search_timeout,
+        page_timeout=args.page_timeout,
+        parse_workers=args.parse_workers,
+        max_redirects=args.max_redirects,
+        deadline=args.deadline,
+        adaptive=args.adaptive,
+        min_yield=args.min_yield,
+    )
+
+
+def cmd_scrape(args):
+    from scraper.job import ScrapeJob
+    from scraper.keyword_server import connect_keyword_generator
+    from scraper.metrics import Metrics, serve_metrics
+
+    jobs = load_jobs(args)
+    metrics = Metrics()  # One set of counters for every job of this invocation
+    metrics_server = serve_metrics(metrics, args.metrics_port) if args.metrics_port else None
+    if metrics_server:
+        log(f"Metrics on http://127.0.0.1:{args.metrics_port}/")
+    log(f"Loading {args.model}...")
+    generator = connect_keyword_generator(args.model, quantize=args.quantize, metrics=metrics, url=args.keyword_server)
+
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        if args.jobs:
+            return run_campaign(args, jobs, generator, metrics, output)
+        for spec in jobs:
+            options = dict(job_options(args), tail_path=args.tail, metrics=metrics)
+            if spec.get("resume"):
+                job = ScrapeJob.resume(spec["id"], generator.generate, **options)
+            else:
+                job = ScrapeJob(spec["description"], spec["keywords"], spec["results"], generator.generate, **options)
+            log(f"[{spec['id']}] journal: {job.job_id}")
+            try:
+                for event, value in job.run():
+                    if event == "result":
+                        write_line(output, {
+                            "type": "page", "job": spec["id"], "url": value.url, "title": value.title,
+                            "description": value.description, "keywords": list(value.keywords), **value.extra,
+                        })
+                    elif event == "keyword_attached":
+                        record, keyword = value
+                        write_line(output, {"type": "keyword_attached", "job": spec["id"], "url": record.url, "keyword": keyword})
+                    elif event == "keyword":
+                        log(f"[{spec['id']}] keyword: {value}")
+                    elif event == "error":
+                        log(f"[{spec['id']}] {value}")
+            except KeyboardInterrupt:
+                log(f"[{spec['id']}] Interrupted")
+                return 130
+            finally:
+                job.results.close()
+                log(f"[{spec['id']}] stats: {json.dumps(job.stats())}")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if args.metrics_json:
+            write_metrics(args.metrics_json, metrics)
+        if metrics_server:
+            metrics_server.shutdown()
+    return 0
+
+
+def run_campaign(args, specs, generator, metrics, output):
+    """Run the jobs of a jobs file side by side over one model, fetch pool and set of caches."""
+    from scraper.campaign import Campaign
+
+    campaign = Campaign(
+        specs, generator, parallel_jobs=args.parallel_jobs, metrics=metrics, tail_path=args.tail, **job_options(args)
+    )
+    log(f"Running {len(specs)} jobs, {campaign.parallel_jobs} at a time")
+    try:
+        for job_id, event, value in campaign.run():
+            if event == "result":
+                write_line(output, {
+                    "type": "page", "job": job_id, "url": value.url, "title": value.title,
+                    "description": value.description, "keywords": list(value.keywords), **value.extra,
+                })
+            elif event == "keyword_attached":
+                record, keyword = value
+                write_line(output, {"type": "keyword_attached", "job": job_id, "url": record.url, "keyword": keyword})
+            elif event == "keyword":
+                log(f"[{job_id}] keyword: {value}")
+            elif event == "error":
+                log(f"[{job_id}] {value}")
+    except KeyboardInterrupt:
+        log("Interrupted")
+        return 130
+    finally:
+        campaign.results.close()
+        for job_id, job in campaign.jobs.items():
+            log(f"[{job_id}] journal: {job.job_id}, stats: {json.dumps(job.stats())}")
+        log(f"campaign stats: {json.dumps(campaign.stats())}")
+    return 0
+
+
+def cmd_serve_keywords(args):
+    from scraper.keyword_server import serve_keywords
+    from scraper.keywords import load_keyword_generator
+
+    log(f"Loading {args.model}...")
+    generator = load_keyword_generator(args.model, quantize=args.quantize)
+    server = serve_keywords(generator, args.host, args.port, model_id=args.model, max_batch=args.max_batch)
+    log(f"Serving keywords on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def cmd_jobs(args):
+    from scraper.journal import list_jobs
+
+    for job in list_jobs():
+        print(json.dumps({
+            "job_id": job["job_id"], "status": job.get("status"), "pages": job["pages"],
+            "keywords": job.get("keywords_to_generate"), "results": job.get("num_results_per_keyword"),
+            "description": (job.get("description") or "")[:80],
+        }, ensure_ascii=False))
+    return 0
+
+
+def cmd_cache(args):
+    from scraper.cache import PageCache, SerpCache
+
+    page_cache = PageCache()
+    serp_cache = SerpCache()
+    try:
+        if args.action == "clear":
+            if args.which in ("pages", "all"):
+                page_cache.clear()
+            if args.which in ("serps", "all"):
+                serp_cache.clear()
+        print(json.dumps({
+            "pages": page_cache.count(),
+            "serps": serp_cache.count(),
+            "page_cache_path": page_cache.path,
+            "page_cache_bytes": os.path.getsize(page_cache.path),
+            "serp_cache_path": serp_cache.path,
+            "serp_cache_bytes": os.path.getsize(serp_cache.path),
+        }, indent=2))
+    finally:
+        page_cache.close()
+        serp_cache.close()
+    return 0
+
+
+def cmd_export(args):
+    from datetime import datetime, timezone
+    from scraper.cache import PageCache
+    from scraper.export import export_rows
+
+    page_cache = PageCache()
+    rows = (
+        (url, title, description, datetime.fromtimestamp(fetched_at, timezone.utc).isoformat())
+        for url, title, description, fetched_at in page_cache.iter_pages()
+    )
+    try:
+        written = export_rows(rows, args.output, args.format, ["URL", "TITLE", "DESCRIPTION", "FETCHED_AT"])
+    finally:
+        page_cache.close()
+    log(f"Exported {written} pages to {args.output}")
+    return 0
+
+
+def add_job_options(parser):
+    """Add the model, search and fetch options shared by everything that runs scrape jobs."""
+    from scraper.adaptive import DEFAULT_MIN_YIELD
+    from scraper.keywords import DEFAULT_MODEL_ID
+    from scraper.fetch import DEFAULT_MAX_CONCURRENT_FETCHES, DEFAULT_PAGE_TIMEOUT
+    from scraper.metadata import DEFAULT_PARSE_WORKERS, PARSER_BACKEND
+    from scraper.net import DEFAULT_MAX_REDIRECTS, RESOLVER_BACKEND
+    from scraper.pipeline import DEFAULT_GENERATE_TIMEOUT, DEFAULT_SEARCH_TIMEOUT
+    from scraper.politeness import DEFAULT_HOST_CONCURRENCY, DEFAULT_HOST_DELAY
+    from scraper.results import DEFAULT_MAX_RESULT_MEMORY
+    from scraper.search import SEARCH_BACKENDS, DEFAULT_SEARCH_BACKEND, DEFAULT_SEARCH_RATE
+
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENT_FETCHES, help="Max concurrent page fetches.")
+    parser.add_argument("--parse-workers", type=int, default=DEFAULT_PARSE_WORKERS,
+                        help=f"Processes parsing page heads; 0 parses on the fetch threads (HTML parser: {PARSER_BACKEND}).")
+    parser.add_argument("--host-concurrency", type=int, default=DEFAULT_HOST_CONCURRENCY,
+                        help="Max concurrent fetches per host (0 turns per-host scheduling off).")
+    parser.add_argument("--host-delay", type=float, default=DEFAULT_HOST_DELAY,
+                        help="Min seconds between requests to one host; raised by robots.txt crawl-delay and throttling.")
+    parser.add_argument("--ignore-robots", action="store_true", help="Fetch pages even if robots.txt disallows them.")
+    parser.add_argument("--deadline", type=float, help="Stop each job after this many seconds; it can be resumed later.")
+    parser.add_argument("--generate-timeout", type=float, default=DEFAULT_GENERATE_TIMEOUT,
+                        help="Seconds one keyword generation call may take before it is cut short.")
+    parser.add_argument("--search-timeout", type=float, default=DEFAULT_SEARCH_TIMEOUT,
+                        help="Seconds one search may take, backoff included, before its keyword is retried later.")
+    parser.add_argument("--max-redirects", type=int, default=DEFAULT_MAX_REDIRECTS,
+                        help=f"Redirects followed per page before it is given up (DNS resolver: {RESOLVER_BACKEND}).")
+    parser.add_argument("--page-timeout", type=float, default=DEFAULT_PAGE_TIMEOUT, help="Seconds one page fetch may take in total.")
+    parser.add_argument("--max-result-memory", type=int, default=DEFAULT_MAX_RESULT_MEMORY // (1024 * 1024), metavar="MB",
+                        help="Memory the pages of one job may take before the oldest are moved to a temporary file.")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Steer keywords away from queries that stop finding new URLs and stop early when they all do.")
+    parser.add_argument("--min-yield", type=float, default=DEFAULT_MIN_YIELD,
+                        help="With --adaptive, share of new URLs per SERP below which keywords count as saturated.")
+    parser.add_argument("--model", default=DEFAULT_MODEL_ID, help="Hugging Face model used to generate keywords.")
+    parser.add_argument("--quantize", action="store_true", help="Use an int8 copy of the model (converted once, then cached).")
+    parser.add_argument("--keyword-server", help="Keyword server to use when it is running (default: $AISERP_KEYWORD_SERVER or "
+                        "http://127.0.0.1:8765); the model is loaded in-process otherwise.")
+    parser.add_argument("--search-backend", choices=sorted(SEARCH_BACKENDS), default=DEFAULT_SEARCH_BACKEND, help="Search provider.")
+    parser.add_argument("--search-rate", type=float, default=DEFAULT_SEARCH_RATE,
+                        help="Max searches per second; lowered automatically while the provider answers 429/503.")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the page and SERP caches.")
+
+
+def add_source_options(parser):
+    """Add the mutually exclusive ways of saying what to scrape."""
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--description", help="Description of the websites to find.")
+    source.add_argument("--description-file", help="File containing the description.")
+    source.add_argument("--jobs", help='JSONL file with one {"description", "keywords", "results", "id"} object per line.')
+    parser.add_argument("--keywords", type=int, default=DEFAULT_KEYWORDS, help="Keywords to generate per description.")
+    parser.add_argument("--results", type=int, default=DEFAULT_RESULTS, help="Search results per keyword.")
+    return source
+
+
+def run_shard_worker(args, threads=None):
+    """Load the model and work through the shard queue; runs in its own process with --processes."""
+    from scraper.keyword_server import connect_keyword_generator
+    from scraper.shards import ShardQueue, run_worker
+
+    if threads:
+        import torch
+        torch.set_num_threads(threads)  # Share the cores between the worker processes instead of oversubscribing them
+    generator = connect_keyword_generator(args.model, quantize=args.quantize, url=args.keyword_server)
+    queue = ShardQueue(args.queue, lease_seconds=args.lease)
+    try:
+        completed = run_worker(queue, generator.generate, job_options(args), stop_when_idle=not args.wait, log=log)
+    finally:
+        queue.close()
+    log(f"Worker finished after {completed} shards")
+    return completed
+
+
+def cmd_shard(args):
+    from scraper.journal import new_job_id
+    from scraper.shards import ShardQueue, split_job
+
+    if args.action == "work":
+        if args.processes <= 1:
+            run_shard_worker(args)
+            return 0
+        import multiprocessing
+
+        threads = max(1, (os.cpu_count() or 1) // args.processes)
+        context = multiprocessing.get_context("spawn")  # Fresh interpreters; torch does not survive fork well
+        workers = [context.Process(target=run_shard_worker, args=(args, threads)) for _ in range(args.processes)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return 0 if all(worker.exitcode == 0 for worker in workers) else 1
+
+    queue = ShardQueue(args.queue)
+    try:
+        if args.action == "split":
+            campaign = args.campaign or new_job_id()
+            specs = []
+            for spec in load_jobs(args):
+                specs.extend(split_job(spec["description"], spec["keywords"], spec["results"], args.keywords_per_shard))
+            queue.add(campaign, specs)
+            log(f"Queued {len(specs)} shards for campaign {campaign} in {queue.path}")
+        elif args.action == "status":
+            print(json.dumps(queue.status(), indent=2))
+        elif args.action == "collect":
+            from scraper.export import export_rows, format_for_path
+
+            rows = (
+                (url, title, description, ", ".join(keywords))
+                for url, title, description, keywords in queue.iter_results(args.campaign)
+            )
+            written = export_rows(rows, args.output, args.format or format_for_path(args.output), ["URL", "TITLE", "DESCRIPTION", "KEYWORD"])
+            log(f"Collected {written} pages into {args.output}")
+    finally:
+        queue.close()
+    return 0
+
+
+def build_parser():
+    from scraper.campaign import DEFAULT_PARALLEL_JOBS
+    from scraper.keyword_server import DEFAULT_PORT as DEFAULT_KEYWORD_PORT, MAX_BATCH_SEQUENCES
+    from scraper.keywords import DEFAULT_MODEL_ID
+    from scraper.shards import DEFAULT_KEYWORDS_PER_SHARD, DEFAULT_LEASE_SECONDS
+
+    parser = argparse.ArgumentParser(prog="cli.py", description="AI SERP Scraper without the GUI.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scrape = subparsers.add_parser("scrape", help="Generate keywords, search them and stream page metadata as JSONL.")
+    source = add_source_options(scrape)
+    source.add_argument("--resume", metavar="JOB_ID", help="Finish a stopped or crashed job from its journal.")
+    add_job_options(scrape)
+    scrape.add_argument("--parallel-jobs", type=int, default=DEFAULT_PARALLEL_JOBS,
+                        help="With --jobs, how many jobs run at once, sharing the model, fetch pool and caches.")
+    scrape.add_argument("--output", "-o", help="Append JSONL to this file instead of stdout.")
+    scrape.add_argument("--tail", help="Also append one CSV/JSONL row per page and keyword to this file as pages arrive.")
+    scrape.add_argument("--metrics-port", type=int, help="Serve live per-stage metrics as JSON on this localhost port.")
+    scrape.add_argument("--metrics-json", help="Write the final per-stage metrics to this JSON file.")
+    scrape.set_defaults(handler=cmd_scrape)
+
+    shard = subparsers.add_parser("shard", help="Split large campaigns into shards that worker processes run in parallel.")
+    shard.add_argument("--queue", help="Shard queue database (default: ~/.cache/aiserpscraper/shards.sqlite).")
+    shard_actions = shard.add_subparsers(dest="action", required=True)
+
+    split = shard_actions.add_parser("split", help="Queue descriptions as shards of a few keywords each.")
+    add_source_options(split)
+    split.add_argument("--keywords-per-shard", type=int, default=DEFAULT_KEYWORDS_PER_SHARD, help="Keywords generated per shard.")
+    split.add_argument("--campaign", help="Name the shards are queued under (default: a new id).")
+    split.set_defaults(resume=None)
+
+    work = shard_actions.add_parser("work", help="Claim and run shards until none are left.")
+    add_job_options(work)
+    work.add_argument("--processes", type=int, default=1, help="Worker processes to start on this machine.")
+    work.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="Seconds a shard stays leased without a renewal.")
+    work.add_argument("--wait", action="store_true", help="Keep polling for new shards instead of exiting when the queue is empty.")
+
+    shard_actions.add_parser("status", help="Show shard counts per campaign and status.")
+
+    collect = shard_actions.add_parser("collect", help="Merge the pages of finished shards into one file.")
+    collect.add_argument("--campaign", help="Only this campaign.")
+    collect.add_argument("--format", "-f", choices=["csv", "jsonl", "parquet"], help="Output format (default: from the file extension).")
+    collect.add_argument("--output", "-o", required=True, help="File to write.")
+    shard.set_defaults(handler=cmd_shard)
+
+    serve = subparsers.add_parser("serve-keywords", help="Load the model once and generate keywords for every GUI/CLI client.")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=DEFAULT_KEYWORD_PORT)
+    serve.add_argument("--model", default=DEFAULT_MODEL_ID, help="Hugging Face model used to generate keywords.")
+    serve.add_argument("--quantize", action="store_true", help="Use an int8 copy of the model (converted once, then cached).")
+    serve.add_argument("--max-batch", type=int, default=MAX_BATCH_SEQUENCES, help="Keywords sampled together in one generate call.")
+    serve.set_defaults(handler=cmd_serve_keywords)
+
+    jobs = subparsers.add_parser("jobs", help="List journaled jobs, newest first.")
+    jobs.set_defaults(handler=cmd_jobs)
+
+    cache = subparsers.add_parser("cache", help="Inspect or clear the on-disk caches.")
+    cache.add_argument("action", choices=["stats", "clear"])
+    cache.add_argument("which", nargs="?", choices=["pages", "serps", "all"], default="all")
+    cache.set_defaults(handler=cmd_cache)
+
+    export = subparsers.add_parser("export", help="Export every cached page.")
+    export.add_argument("--format", "-f", choices=["csv", "jsonl", "parquet"], default="csv")
+    export.add_argument("--output", "-o", required=True, help="File to write.")
+    export.set_defaults(handler=cmd_export)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
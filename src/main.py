@@ -1,111 +1,160 @@
+import json
+import multiprocessing
+import os
 import sys
+import time
+STARTUP_TIME = time.perf_counter()  # Taken before the heavy imports so startup timings include them
 from PyQt5.QtWidgets import QApplication, QVBoxLayout, QWidget, QPushButton, QProgressBar, QLabel, QTextEdit, QSpinBox
 from PyQt5.QtCore import QRunnable, QThreadPool, pyqtSignal, QObject
-from googlesearch import search
 from ui.content import ContentPanel
-import requests
-from bs4 import BeautifulSoup
-import time
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+from scraper.campaign import Campaign, load_campaign
+from scraper.fetch import DEFAULT_MAX_CONCURRENT_FETCHES
+from scraper.job import ScrapeJob
+from scraper.journal import list_jobs, FINISHED
+from scraper.keyword_server import connect_keyword_generator
+from scraper.keywords import DEFAULT_MODEL_ID
+from scraper.metrics import Metrics
+from scraper.results import DEFAULT_MAX_RESULT_MEMORY
+
+ROW_BATCH_SIZE = 200  # Rows coalesced into one signal to the table
+ROW_BATCH_INTERVAL = 0.25  # Seconds before a partial batch is sent anyway
+QUANTIZE_MODEL = os.environ.get("AISERP_QUANTIZE") == "1"  # Load an int8 copy of the model, converted once and cached
+MAX_RESULT_MEMORY = int(os.environ.get("AISERP_RESULT_MEMORY_MB", DEFAULT_MAX_RESULT_MEMORY // (1024 * 1024))) * 1024 * 1024
+
+class ModelLoaderSignals(QObject):
+    """Defines the signals available from the model loading thread."""
+    loaded = pyqtSignal(object)  # Signal with the loaded KeywordGenerator
+    error = pyqtSignal(str)      # Signal to send error messages
+
+class ModelLoader(QRunnable):
+    """Connects to the keyword server, or loads the model itself, in a separate thread so the window can show right away."""
+    def __init__(self, model_id=DEFAULT_MODEL_ID, quantize=QUANTIZE_MODEL, metrics=None):
+        super().__init__()
+        self.model_id = model_id
+        self.quantize = quantize
+        self.metrics = metrics  # Metrics the generator reports generation time and tokens to
+        self.signals = ModelLoaderSignals()
+
+    def run(self):
+        try:
+            keyword_generator = connect_keyword_generator(self.model_id, quantize=self.quantize, metrics=self.metrics)
+        except Exception as e:
+            self.signals.error.emit(f"Could not load {self.model_id}: {str(e)}")
+            return
+        self.signals.loaded.emit(keyword_generator)
 
 class ScrapeWorkerSignals(QObject):
     """Defines the signals available from a running search thread."""
-    result = pyqtSignal(list)  # Signal to send the search results back
+    rows = pyqtSignal(list)    # Signal with the indexes of a batch of new rows in the job's ResultStore
+    keywords_attached = pyqtSignal(list)  # Signal with the indexes of rows already sent that gained keywords
     finished = pyqtSignal()    # Signal when the search finishes
-    keyword = pyqtSignal(str)  # Progress signal
+    keyword = pyqtSignal(str)  # Signal with each keyword as it is generated
     progress = pyqtSignal(int)  # Progress signal
     error = pyqtSignal(str)    # Signal to send error messages
+    queues = pyqtSignal(dict)  # Signal with the pipeline's per-stage queue depths
+    stats = pyqtSignal(dict)  # Signal with run statistics (cache hit rates, searches saved)
+    metrics = pyqtSignal(dict)  # Signal with a snapshot of per-stage latencies and throughput
+
+def campaign_events(campaign):
+    """Turn a Campaign's (job_id, event, value) into ScrapeJob-style events; rows keep their job ID in the store."""
+    for job_id, event, value in campaign.run():
+        yield event, f"[{job_id}] {value}" if event == "error" else value
 
 class ScrapeWorker(QRunnable):
     """Search worker that runs in a separate thread."""
-    def __init__(self, keywords_to_generate, num_results_per_keyword, description):
+    def __init__(self, job):
         super().__init__()
-        self.keywords_to_generate = keywords_to_generate
-        self.num_results_per_keyword = num_results_per_keyword
-        self.description = description
+        self.job = job  # ScrapeJob, new or resumed from its journal, or a Campaign of several
+        self.keywords_to_generate = job.keywords_to_generate
         self.signals = ScrapeWorkerSignals()
-        self.is_interrupted = False  # Flag to check if the worker is stopped
+        self.pending_rows = []  # Indexes of rows waiting to be sent in the next batch
+        self.pending_attachments = []
+        self.last_flush = 0
 
     def run(self):
-        """Perform the search and send the results."""
-        results = []
+        """Perform the search and stream the results in small batches."""
+        keywords_done = 0
 
         # Perform the search
+        events = campaign_events(self.job) if isinstance(self.job, Campaign) else self.job.run()
         try:
-            for i in range(0, self.keywords_to_generate):
-                if self.is_interrupted:
-                    break  # Stop if the worker is interrupted
-                # Generate keyword based on description
-                keyword = main_window.get_keyword(self.description)
-                if not keyword:
-                    self.signals.error.emit("No keyword generated.")
-                    break
-
-                # Emit the keyword for progress purposes
-                self.signals.keyword.emit(keyword)
-
-                # Perform search and convert the generator to a list
-                scrape_results = list(search(keyword, num_results=self.num_results_per_keyword))
-
-                # Loop through each URL in the search results
-                for url in scrape_results:
-                    if self.is_interrupted:
-                        break  # Stop if the worker is interrupted
-
-                    # Get page info (title and meta description)
-                    title, meta_description = self.get_page_info(url)
-                    print(f"URL: {url}, Title: {title}, Description: {meta_description}")
-                    results.append((url, title, meta_description, keyword))
-
-                    time.sleep(0.1)  # Simulate progress delay
-                
-                # Emit progress
-                progress = int(((i + 1) / self.keywords_to_generate) * 100)
-                self.signals.progress.emit(progress)
-
-                if self.is_interrupted:
-                    break  # Stop if the worker is interrupted
+            for event, value in events:
+                if event == "keyword":
+                    # Emit the keyword for progress purposes
+                    self.signals.keyword.emit(value)
+                elif event == "result":
+                    print(f"URL: {value.url}, Title: {value.title}, Description: {value.description}")
+                    self.pending_rows.append(value.index)
+                elif event == "keyword_attached":
+                    record, keyword = value
+                    self.pending_attachments.append(record.index)
+                elif event == "keyword_done":
+                    # Emit progress
+                    keywords_done += 1
+                    progress = int((keywords_done / self.keywords_to_generate) * 100)
+                    self.signals.progress.emit(progress)
+                elif event == "queues":
+                    self.signals.queues.emit(value)
+                    self.signals.stats.emit(self.job.stats())
+                    self.signals.metrics.emit(self.job.metrics.snapshot())
+                elif event == "error":
+                    self.signals.error.emit(value)
+                self.flush_rows()
         except Exception as e:
             self.signals.error.emit(f"Error occurred: {str(e)}")
-            self.signals.result.emit([])  # Emit empty results on error
-            return
-
-        # Emit the results and finish signal
-        self.signals.result.emit(results)
+        finally:
+            self.flush_rows(force=True)
+
+        stats = self.job.stats()
+        if stats:
+            page_cache = stats.get("page_cache")  # Empty when the page cache is off
+            if page_cache:
+                print(
+                    f"Page cache hit rate: {page_cache['hit_rate']:.0%} ({page_cache['hits']} hits, "
+                    f"{page_cache['revalidated']} revalidated)"
+                )
+            print(
+                f"Searches: {stats['searches']}, "
+                f"searches saved: {stats['searches_saved']}, keywords rejected: {stats['keywords_rejected']}, "
+                f"duplicate URLs skipped: {stats['urls_deduplicated']}, unique URLs: {stats['unique_urls']} "
+                f"({stats['unique_urls_per_search']:.1f} per search)"
+            )
+            self.signals.stats.emit(stats)
+
+        metrics = self.job.metrics.snapshot()
+        print(f"Metrics: {json.dumps(metrics['throughput'])}")
+        self.signals.metrics.emit(metrics)
+
+        # Emit the finish signal
         self.signals.finished.emit()
 
-    def stop(self):
-        """Stop the worker."""
-        self.is_interrupted = True
-
-    def get_page_info(self, url):
-        """Scrape the title and meta description from the webpage."""
-        try:
-            response = requests.get(url, timeout=5)
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            # Get title
-            title = soup.title.string if soup.title else "No Title Found"
-
-            # Get meta description
-            description_tag = soup.find('meta', attrs={'name': 'description'})
-            if description_tag:
-                meta_description = description_tag.get('content', 'No Description Found')
-            else:
-                meta_description = "No Description Found"
+    def flush_rows(self, force=False):
+        """Send pending rows as one batch once enough have piled up or enough time has passed."""
+        now = time.monotonic()
+        if not force and len(self.pending_rows) < ROW_BATCH_SIZE and now - self.last_flush < ROW_BATCH_INTERVAL:
+            return
+        self.last_flush = now
+        if self.pending_rows:
+            self.signals.rows.emit(self.pending_rows)
+            self.pending_rows = []
+        if self.pending_attachments:
+            self.signals.keywords_attached.emit(self.pending_attachments)
+            self.pending_attachments = []
 
-            return title, meta_description
-        except Exception:
-            return "No Title Found", "No Description Found"
+    def stop(self):
+        """Stop the worker and drain every pipeline stage."""
+        self.job.stop()
 
 
 class AISerpScraperApp(QWidget):
     def __init__(self):
         super().__init__()
-        self.initUI()
         self.threadpool = QThreadPool()  # Create a thread pool to manage threads
         self.current_worker = None  # To keep track of the running worker
-        self.scraped_results = []  # Store results persistently
+        self.keyword_generator = None  # Set once the model has loaded in the background
+        self.metrics = Metrics()  # Shared by the keyword generator and each scrape job, reset per run
+        self.first_keyword_logged = False
+        self.initUI()
 
     def initUI(self):
         self.setWindowTitle('AI SERP SCRAPER')
@@ -165,79 +214,123 @@ class AISerpScraperApp(QWidget):
         
         self.setLayout(layout)
 
-        model_id = "Qwen/Qwen2.5-0.5B-Instruct"
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_id, 
-            device_map="cpu", 
-            trust_remote_code=True, 
-        ).to("cpu")
-        self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        # Load the model in the background; scraping is enabled once it is ready
+        self.content_panel.set_model_loading(True)
+        model_loader = ModelLoader(metrics=self.metrics)
+        model_loader.signals.loaded.connect(self.model_loaded)
+        model_loader.signals.error.connect(self.display_error)
+        self.threadpool.start(model_loader)
 
         # Connect the search functionality
         self.content_panel.scrape_button.clicked.connect(self.scrape_content)
-
-    def get_keyword(self, description):
-        messages = [
-            {"role": "system", "content": "You are a helpful AI assistant."},
-            {"role": "user", "content": (
-                "Generate a single, natural-sounding medium/long-tail search query based on the provided description. "
-                "The query should be phrased like how a user would type it into Google, using complete phrases, and should be between 8-12 tokens. "
-                "Avoid lists of keywords or unnatural phrasing. "
-                "Only respond with the query itself.\n\n"
-                f"Description:\n\n{description}"
-            )}
-        ]
-
-        text = self.tokenizer.apply_chat_template(
-            messages,
-            tokenize=False,
-            add_generation_prompt=True
-        )
-        model_inputs = self.tokenizer([text], return_tensors="pt").to(self.model.device)
-
-        generated_ids = self.model.generate(
-            **model_inputs,
-            max_new_tokens=16,
-            temperature=0.7,
-            do_sample=True
-        )
-        generated_ids = [
-            output_ids[len(input_ids):] for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)
-        ]
-
-        response = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0].replace('"', '').replace("'", "").replace("-", " ").replace("_", " ")
-        print(response)
-        return response
+        self.content_panel.resume_button.clicked.connect(self.resume_scrape)
+        self.content_panel.campaign_button.clicked.connect(self.run_campaign)
+
+    def model_loaded(self, keyword_generator):
+        """Enable scraping once the model is ready."""
+        self.keyword_generator = keyword_generator
+        self.content_panel.set_model_loading(False)
+        print(f"Model ready after {time.perf_counter() - STARTUP_TIME:.2f}s")
+
+    def get_keywords(self, description, count, stop_event=None, avoid=()):
+        """Generate `count` keywords for the description in batched generate calls (called on pipeline threads)."""
+        keywords = self.keyword_generator.generate(description, count, stop_event, avoid)
+        if not self.first_keyword_logged:
+            self.first_keyword_logged = True
+            print(f"First keyword after {time.perf_counter() - STARTUP_TIME:.2f}s")
+        for keyword in keywords:
+            print(keyword)
+        return keywords
 
     def scrape_content(self):
         """Run the search in a separate thread."""
         # Prevent spawning multiple workers
-        if self.current_worker:
-            return  # A worker is already running
+        if self.current_worker or not self.keyword_generator:
+            return  # A worker is already running or the model is still loading
 
         keywords_to_generate = self.content_panel.keyword_input.value()
         num_results_per_keyword = self.content_panel.result_input.value()
         description = self.content_panel.description_input.toPlainText()
 
+        self.start_worker(ScrapeJob(
+            description,
+            keywords_to_generate,
+            num_results_per_keyword,
+            self.get_keywords,
+            max_concurrent_fetches=DEFAULT_MAX_CONCURRENT_FETCHES,
+            tail_path=self.content_panel.tail_path,
+            metrics=self.metrics,
+            max_result_memory=MAX_RESULT_MEMORY,
+            adaptive=self.content_panel.adaptive
+        ))
+
+    def resume_scrape(self):
+        """Resume the most recent job that did not finish, from its journal."""
+        if self.current_worker or not self.keyword_generator:
+            return  # A worker is already running or the model is still loading
+
+        unfinished = [job for job in list_jobs() if job.get("status") != FINISHED]
+        if not unfinished:
+            self.display_error("No unfinished job to resume.")
+            return
+
+        job = ScrapeJob.resume(
+            unfinished[0]["job_id"], self.get_keywords, tail_path=self.content_panel.tail_path, metrics=self.metrics,
+            max_result_memory=MAX_RESULT_MEMORY, adaptive=self.content_panel.adaptive
+        )
+        self.content_panel.description_input.setText(job.description)
+        self.content_panel.keyword_input.setValue(job.keywords_to_generate)
+        self.content_panel.result_input.setValue(job.num_results_per_keyword)
+        self.start_worker(job)
+
+    def run_campaign(self):
+        """Run every description of a JSONL jobs file side by side, sharing the model, fetch pool and caches."""
+        if self.current_worker or not self.keyword_generator:
+            return  # A worker is already running or the model is still loading
+
+        path = self.content_panel.choose_jobs_file()
+        if not path:
+            return
+        try:
+            # Jobs without their own counts use the ones set in the window
+            specs = load_campaign(path, self.content_panel.keyword_input.value(), self.content_panel.result_input.value())
+            campaign = Campaign(
+                specs, self.keyword_generator, tail_path=self.content_panel.tail_path, metrics=self.metrics,
+                max_result_memory=MAX_RESULT_MEMORY, adaptive=self.content_panel.adaptive
+            )
+        except (OSError, ValueError, KeyError) as e:
+            self.display_error(f"Could not read {path}: {str(e)}")
+            return
+        self.start_worker(campaign)
+
+    def start_worker(self, job):
+        """Run a scrape job on the thread pool and wire its signals to the panel."""
         # Reset the error label
         self.content_panel.error_label.setText("")
 
-        # Clear the current results before adding new ones
-        self.content_panel.result_table.setRowCount(0)
+        # Clear the current results and counters before adding new ones
+        self.content_panel.clear_results(job.results)
+        self.metrics.reset()
 
-        # Create a worker and move the search task to a separate thzread
-        self.current_worker = ScrapeWorker(keywords_to_generate, num_results_per_keyword, description)
-        self.current_worker.signals.result.connect(self.store_results)
+        # Create a worker and move the search task to a separate thread
+        self.current_worker = ScrapeWorker(job)
+        self.current_worker.signals.rows.connect(self.content_panel.append_results)
+        self.current_worker.signals.keywords_attached.connect(self.content_panel.attach_keywords)
         self.current_worker.signals.finished.connect(self.scrape_finished)
-        self.current_worker.signals.keyword.connect(self.get_keyword)
+        self.current_worker.signals.keyword.connect(self.content_panel.display_keyword)
         self.current_worker.signals.progress.connect(self.update_progress)
         self.current_worker.signals.error.connect(self.display_error)
+        self.current_worker.signals.queues.connect(self.content_panel.display_queue_depths)
+        self.current_worker.signals.stats.connect(self.content_panel.display_stats)
+        self.current_worker.signals.metrics.connect(self.content_panel.display_metrics)
 
         # Start the worker
         self.threadpool.start(self.current_worker)
         self.content_panel.progress_bar.setValue(0)
         self.content_panel.stop_button.setEnabled(True)
         self.content_panel.scrape_button.setEnabled(False)  # Disable the search button during the search
+        self.content_panel.resume_button.setEnabled(False)
+        self.content_panel.campaign_button.setEnabled(False)
 
     def stop_scrape(self):
         """Stop the current worker."""
@@ -250,13 +343,10 @@ class AISerpScraperApp(QWidget):
         self.current_worker = None
         self.content_panel.progress_bar.setValue(100)
         self.content_panel.scrape_button.setEnabled(True)  # Re-enable the search button
+        self.content_panel.resume_button.setEnabled(True)
+        self.content_panel.campaign_button.setEnabled(True)
         self.content_panel.stop_button.setEnabled(False)  # Disable the stop button
 
-    def store_results(self, results):
-        """Store results and display them."""
-        self.scraped_results = results  # Store results in the persistent list
-        self.content_panel.display_results(results)
-
     def update_progress(self, value):
         """Update the progress bar."""
         self.content_panel.progress_bar.setValue(value)
@@ -267,7 +357,9 @@ class AISerpScraperApp(QWidget):
         self.content_panel.error_label.setText(error_message)
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # In the PyInstaller build, parse workers start here and must not open the window
     app = QApplication(sys.argv)
     main_window = AISerpScraperApp()
     main_window.show()
+    print(f"Window shown after {time.perf_counter() - STARTUP_TIME:.2f}s")
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,117 @@
+import threading
+from collections import deque
+
+DEFAULT_MIN_YIELD = 0.2  # New unique URLs per SERP URL below which a keyword has stopped paying for its search
+YIELD_WINDOW = 8  # Searched keywords the marginal yield is averaged over
+MAX_AVOID_KEYWORDS = 12  # Keywords quoted back to the model as ones to steer away from
+MAX_REDIRECTS = 2  # Low-yield windows answered by changing direction before the run stops early
+
+CONTINUE = "continue"
+REDIRECT = "redirect"
+STOP = "stop"
+
+
+class YieldTracker:
+    """Measures how many new unique URLs each keyword's SERP brings and decides when to change course.
+
+    A keyword's yield is the share of its SERP URLs that no earlier keyword of the run had found.
+    Keywords whose yield falls below `min_yield` are saturated: they are handed back to the model
+    as queries to avoid. Once a full window of `window` keywords averages below `min_yield`, the
+    next keywords are steered away from everything recently used (a redirect); after
+    `max_redirects` redirects that did not lift the yield back up, `decide()` says to stop.
+
+    `record()` is called from the fetch stage and `decide()` / `avoid_keywords()` from the keyword
+    stage, so the tracker is guarded by a lock.
+    """
+    def __init__(self, min_yield=DEFAULT_MIN_YIELD, window=YIELD_WINDOW, max_redirects=MAX_REDIRECTS):
+        self.min_yield = min_yield
+        self.window = window
+        self.max_redirects = max_redirects
+        self.lock = threading.Lock()
+
+        self.recent = deque(maxlen=window)  # (keyword, yield) of the latest searched keywords
+        self.saturated = deque(maxlen=MAX_AVOID_KEYWORDS)  # Latest keywords that fell below min_yield
+        self.saturated_count = 0
+        self.measured = 0  # Keywords recorded since the last redirect
+        self.redirects = 0  # Redirects since the yield last recovered
+        self.redirect_count = 0
+        self.redirecting = False  # Set by a redirect, cleared once the yield recovers
+        self.keywords = 0
+        self.serp_urls = 0
+        self.new_urls = 0
+
+    def record(self, keyword, new_urls, serp_urls):
+        """Record that a keyword's SERP of `serp_urls` URLs held `new_urls` URLs not seen before."""
+        keyword_yield = new_urls / serp_urls if serp_urls else 0.0
+        with self.lock:
+            self.keywords += 1
+            self.serp_urls += serp_urls
+            self.new_urls += new_urls
+            self.measured += 1
+            self.recent.append((keyword, keyword_yield))
+            if keyword_yield < self.min_yield and keyword not in self.saturated:
+                self.saturated.append(keyword)
+                self.saturated_count += 1
+
+    def marginal_yield(self):
+        """Return the mean yield of the last `window` keywords, or None until that many were searched."""
+        with self.lock:
+            return self._marginal_yield()
+
+    def decide(self, pending=0):
+        """Return CONTINUE, REDIRECT (steer the next keywords elsewhere) or STOP.
+
+        `pending` is how many keywords were generated but not recorded yet. After a redirect they
+        do not count towards judging it, since they were chosen before it. A recovered yield
+        clears the redirects, so only `max_redirects` failed ones in a row stop the run:
+
+        >>> tracker = YieldTracker(min_yield=0.5, window=2, max_redirects=2)
+        >>> def searched(*new_urls):
+        ...     for i, new in enumerate(new_urls):
+        ...         tracker.record(f"keyword {i}", new, 1)
+        ...     return tracker.decide()
+        >>> [searched(0, 0), searched(1, 1), searched(0, 0), searched(1, 1), searched(0, 0), searched(0, 0)]
+        ['redirect', 'continue', 'redirect', 'continue', 'redirect', 'redirect']
+        >>> searched(0, 0)
+        'stop'
+        """
+        with self.lock:
+            marginal = self._marginal_yield()
+            if marginal is None or self.measured < self.window:
+                return CONTINUE  # Not enough keywords since the last change of direction to judge it
+            if marginal >= self.min_yield:
+                self.redirecting = False
+                self.redirects = 0  # The last change of direction worked
+                return CONTINUE
+            if self.redirects >= self.max_redirects:
+                return STOP
+            self.redirects += 1
+            self.redirect_count += 1
+            self.redirecting = True
+            self.measured = -pending
+            return REDIRECT
+
+    def avoid_keywords(self):
+        """Return the queries the model should steer away from, most recent first.
+
+        Normally the saturated keywords; after a redirect, every recently searched keyword too.
+        """
+        with self.lock:
+            avoid = list(reversed(self.saturated))
+            if self.redirecting:
+                avoid += [keyword for keyword, _ in reversed(self.recent) if keyword not in avoid]
+            return avoid[:MAX_AVOID_KEYWORDS]
+
+    def stats(self):
+        with self.lock:
+            return {
+                "marginal_yield": self._marginal_yield(),
+                "overall_yield": self.new_urls / self.serp_urls if self.serp_urls else None,
+                "saturated_keywords": self.saturated_count,
+                "redirects": self.redirect_count,
+            }
+
+    def _marginal_yield(self):
+        if len(self.recent) < self.window:
+            return None
+        return sum(keyword_yield for _, keyword_yield in self.recent) / len(self.recent)
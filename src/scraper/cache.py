@@ -0,0 +1,203 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "aiserpscraper")
+DEFAULT_PAGE_TTL = 7 * 24 * 60 * 60  # Seconds before a cached page must be revalidated
+DEFAULT_MAX_PAGES = 200_000  # Least recently used pages are evicted past this count
+EVICT_EVERY = 500  # Puts between eviction checks
+DEFAULT_SERP_TTL = 24 * 60 * 60  # Seconds a search result page stays valid
+
+CachedPage = namedtuple("CachedPage", "url title description fetched_at etag last_modified extra")
+
+
+def default_cache_path(name):
+    """Return the path of a cache database in the per-user cache directory."""
+    os.makedirs(DEFAULT_CACHE_DIR, exist_ok=True)
+    return os.path.join(DEFAULT_CACHE_DIR, name)
+
+
+class PageCache:
+    """Persistent (canonical URL -> page metadata) cache backed by SQLite."""
+    def __init__(self, path=None, ttl=DEFAULT_PAGE_TTL, max_entries=DEFAULT_MAX_PAGES):
+        self.path = path or default_cache_path("pages.sqlite")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()  # The connection is shared by every fetch thread
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._puts_since_evict = 0
+
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    url_key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    title TEXT,
+                    description TEXT,
+                    fetched_at REAL NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    accessed_at REAL NOT NULL,
+                    extra TEXT
+                )
+            """)
+            columns = {row[1] for row in self.connection.execute("PRAGMA table_info(pages)")}
+            if "extra" not in columns:  # Caches written before the other head fields were extracted
+                self.connection.execute("ALTER TABLE pages ADD COLUMN extra TEXT")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS pages_accessed_at ON pages (accessed_at)")
+
+    def get(self, url_key):
+        """Return the CachedPage for a canonical URL, fresh or not, or None."""
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT url, title, description, fetched_at, etag, last_modified, extra FROM pages WHERE url_key = ?",
+                (url_key,)
+            ).fetchone()
+            if row:
+                self.connection.execute("UPDATE pages SET accessed_at = ? WHERE url_key = ?", (time.time(), url_key))
+        if not row:
+            return None
+        return CachedPage(*row[:6], json.loads(row[6]) if row[6] else {})
+
+    def is_fresh(self, page):
+        """Return True if a cached page is younger than the TTL."""
+        return time.time() - page.fetched_at < self.ttl
+
+    def put(self, url_key, url, title, description, etag=None, last_modified=None, extra=None):
+        """Store freshly fetched metadata for a canonical URL; `extra` holds the other head fields."""
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pages (url_key, url, title, description, fetched_at, etag, last_modified, accessed_at, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url_key, url, title, description, now, etag, last_modified, now, json.dumps(extra) if extra else None)
+            )
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= EVICT_EVERY:
+                self._puts_since_evict = 0
+                self._evict()
+
+    def refresh(self, url_key):
+        """Mark a cached page as fresh again after a 304 Not Modified."""
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url_key = ?", (now, now, url_key)
+            )
+
+    def _evict(self):
+        """Drop the least recently used pages beyond max_entries. Caller holds the lock."""
+        (count,) = self.connection.execute("SELECT COUNT(*) FROM pages").fetchone()
+        if count > self.max_entries:
+            self.connection.execute(
+                "DELETE FROM pages WHERE url_key IN (SELECT url_key FROM pages ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def count(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def iter_pages(self):
+        """Yield (url, title, description, fetched_at) for every cached page, a page of rows at a time."""
+        last_key = ""
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    "SELECT url_key, url, title, description, fetched_at FROM pages WHERE url_key > ? ORDER BY url_key LIMIT 1000",
+                    (last_key,)
+                ).fetchall()
+            if not rows:
+                return
+            last_key = rows[-1][0]
+            for row in rows:
+                yield row[1:]
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM pages")
+
+    def record_hit(self, revalidated=False):
+        with self.lock:
+            self.hits += 1
+            if revalidated:
+                self.revalidated += 1
+
+    def record_miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def stats(self):
+        """Return hit/miss counters for this session."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class SerpCache:
+    """Persistent (normalized query, num_results) -> [url] cache backed by SQLite."""
+    def __init__(self, path=None, ttl=DEFAULT_SERP_TTL):
+        self.path = path or default_cache_path("serp.sqlite")
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS serps (
+                    query_key TEXT NOT NULL,
+                    num_results INTEGER NOT NULL,
+                    urls TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (query_key, num_results)
+                )
+            """)
+
+    def get(self, query_key, num_results):
+        """Return the cached URLs for a normalized query, or None if missing or expired."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT urls, fetched_at FROM serps WHERE query_key = ? AND num_results = ?",
+                (query_key, num_results)
+            ).fetchone()
+        if not row or time.time() - row[1] >= self.ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, query_key, num_results, urls):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO serps VALUES (?, ?, ?, ?)",
+                (query_key, num_results, json.dumps(urls), time.time())
+            )
+            self.connection.execute("DELETE FROM serps WHERE fetched_at < ?", (time.time() - self.ttl,))
+
+    def count(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM serps").fetchone()[0]
+
+    def clear(self):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM serps")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,206 @@
+import json
+import queue
+import threading
+
+from scraper.cache import PageCache, SerpCache
+from scraper.export import TailExporter
+from scraper.fetch import FetchEngine, DEFAULT_MAX_CONCURRENT_FETCHES, DEFAULT_PAGE_TIMEOUT
+from scraper.job import ScrapeJob
+from scraper.metadata import DEFAULT_PARSE_WORKERS
+from scraper.metrics import Metrics
+from scraper.net import DEFAULT_MAX_REDIRECTS
+from scraper.politeness import DEFAULT_HOST_CONCURRENCY, DEFAULT_HOST_DELAY
+from scraper.results import ResultStore, DEFAULT_MAX_RESULT_MEMORY
+
+DEFAULT_PARALLEL_JOBS = 4  # Jobs of a campaign running at the same time
+EVENT_QUEUE_SIZE = 1024  # Events buffered between the job threads and the consumer
+
+SUMMED_STATS = ("searches", "searches_saved", "keywords_rejected", "urls_deduplicated", "unique_urls")
+
+_RUNNER_DONE = object()  # Put on the event queue by a job thread once no job is left for it
+
+
+def load_campaign(path, default_keywords, default_results):
+    """Read a JSONL jobs file into job specs: {"id", "description", "keywords", "results"}.
+
+    Each line holds one job; "keywords" and "results" fall back to the defaults and "id" to the
+    line number.
+    """
+    specs = []
+    with open(path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            spec = json.loads(line)
+            specs.append({
+                "id": str(spec.get("id", line_number)),
+                "description": spec["description"],
+                "keywords": int(spec.get("keywords", default_keywords)),
+                "results": int(spec.get("results", default_results)),
+            })
+    return specs
+
+
+def shared_generate(keyword_generator):
+    """Return a generate_keywords callable that several jobs can call at once.
+
+    An in-process KeywordGenerator is put behind a KeywordBatcher, so keywords requested by
+    concurrent jobs are sampled together in one generate call; anything else (a keyword server
+    client, which the server already batches) is called directly.
+    """
+    if not hasattr(keyword_generator, "generate_many"):
+        return keyword_generator.generate
+
+    from scraper.keyword_server import KeywordBatcher
+
+    batcher = KeywordBatcher(keyword_generator)
+
+    def generate(description, count, stop_event=None, avoid=()):
+        # A batch shared with other jobs is not interrupted; the pipeline stops waiting for it instead
+        return batcher.generate(description, count, avoid)
+
+    return generate
+
+
+class Campaign:
+    """Runs many scrape jobs concurrently over one model, one fetch pool and one set of caches.
+
+    Up to `parallel_jobs` ScrapeJobs run at once, each on its own thread, and share:
+
+    - the keyword generator, through `shared_generate()`, so their generate calls are batched
+    - one FetchEngine with its connection pool, host scheduler, parse pool and page cache, so a
+      page found by several jobs is fetched once and the per-host limits hold across jobs
+    - one SerpCache, so a query generated by several jobs is searched once
+    - one ResultStore, `results`, whose rows are tagged with the ID of the job that found them
+
+    `run()` yields (job_id, event, value) with the events of ScrapeJob.run(), interleaved as the
+    jobs produce them. Every job is journaled on its own, so a stopped job can be resumed alone.
+    The ScrapeJob keyword arguments in `job_options` (timeouts, adaptive...) apply to every job.
+    """
+    def __init__(self, specs, keyword_generator, parallel_jobs=DEFAULT_PARALLEL_JOBS, metrics=None,
+                 max_concurrent_fetches=DEFAULT_MAX_CONCURRENT_FETCHES, use_cache=True, tail_path=None,
+                 host_concurrency=DEFAULT_HOST_CONCURRENCY, host_delay=DEFAULT_HOST_DELAY, respect_robots=True,
+                 page_timeout=DEFAULT_PAGE_TIMEOUT, parse_workers=DEFAULT_PARSE_WORKERS,
+                 max_redirects=DEFAULT_MAX_REDIRECTS, max_result_memory=DEFAULT_MAX_RESULT_MEMORY, **job_options):
+        ids = [spec["id"] for spec in specs]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Campaign job IDs must be unique")
+        self.specs = specs
+        self.generate_keywords = shared_generate(keyword_generator)
+        self.parallel_jobs = max(1, parallel_jobs)
+        self.metrics = metrics or Metrics()
+        self.use_cache = use_cache
+        self.tail_path = tail_path  # Written by the consumer thread, since the jobs run side by side
+        self.job_options = job_options
+        self.fetch_options = dict(
+            max_concurrent=max_concurrent_fetches,
+            host_concurrency=host_concurrency,
+            host_delay=host_delay,
+            respect_robots=respect_robots,
+            page_timeout=page_timeout,
+            parse_workers=parse_workers,
+            max_redirects=max_redirects,
+        )
+        self.keywords_to_generate = sum(spec["keywords"] for spec in specs)
+
+        self.results = ResultStore(max_result_memory)  # Pages of every job, tagged with its ID
+        self.jobs = {}  # job ID -> ScrapeJob, once started
+        self.fetch_engine = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def run(self):
+        """Run every job, yielding (job_id, event, value) until all have finished or been stopped."""
+        page_cache = PageCache() if self.use_cache else None
+        serp_cache = SerpCache() if self.use_cache else None
+        self.fetch_engine = FetchEngine(cache=page_cache, metrics=self.metrics, **self.fetch_options)
+        tail = TailExporter(self.tail_path) if self.tail_path else None
+
+        pending = queue.Queue()
+        for spec in self.specs:
+            pending.put(spec)
+        events = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+        threads = [
+            threading.Thread(target=self._run_jobs, args=(pending, events, serp_cache), name=f"campaign-{i}", daemon=True)
+            for i in range(min(self.parallel_jobs, len(self.specs)))
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            running = len(threads)
+            while running:
+                item = events.get()
+                if item is _RUNNER_DONE:
+                    running -= 1
+                    continue
+                job_id, event, value = item
+                if tail and event == "result":
+                    tail.write_page(value.url, value.title, value.description, value.keywords)
+                elif tail and event == "keyword_attached":
+                    record, keyword = value
+                    tail.write_page(record.url, record.title, record.description, [keyword])
+                elif tail and event == "queues":
+                    tail.flush()
+                yield item
+        finally:
+            self.stop()
+            while any(thread.is_alive() for thread in threads):
+                try:
+                    events.get(timeout=0.1)  # Keep the job threads from blocking on a full queue while they wind down
+                except queue.Empty:
+                    pass
+            if tail:
+                tail.close()
+            self.fetch_engine.close()
+            if page_cache:
+                page_cache.close()
+            if serp_cache:
+                serp_cache.close()
+
+    def _run_jobs(self, pending, events, serp_cache):
+        """Take jobs off `pending` and run them one after another until none is left."""
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    spec = pending.get_nowait()
+                except queue.Empty:
+                    break
+                job = ScrapeJob(
+                    spec["description"], spec["keywords"], spec["results"], self.generate_keywords,
+                    metrics=self.metrics, use_cache=self.use_cache, fetch_engine=self.fetch_engine, serp_cache=serp_cache,
+                    results=self.results, tag=spec["id"], **self.job_options
+                )
+                with self.lock:
+                    self.jobs[spec["id"]] = job
+                    if self.stop_event.is_set():
+                        job.stop()
+                try:
+                    for event, value in job.run():
+                        events.put((spec["id"], event, value))
+                except Exception as e:
+                    events.put((spec["id"], "error", f"Job {spec['id']} failed: {e}"))
+        finally:
+            events.put(_RUNNER_DONE)
+
+    def stop(self):
+        """Stop every running job and skip the ones that have not started."""
+        with self.lock:
+            self.stop_event.set()
+            for job in self.jobs.values():
+                job.stop()
+
+    def stats(self):
+        """Sum the search counters of every job started so far, with the shared page cache's hit rate."""
+        with self.lock:
+            jobs = list(self.jobs.values())
+        stats = dict.fromkeys(SUMMED_STATS, 0)
+        for job in jobs:
+            job_stats = job.stats()
+            for key in SUMMED_STATS:
+                stats[key] += job_stats.get(key, 0)
+        stats["unique_urls_per_search"] = stats["unique_urls"] / stats["searches"] if stats["searches"] else 0.0
+        stats["jobs"] = len(jobs)
+        if self.fetch_engine:
+            stats["page_cache"] = self.fetch_engine.cache_stats()
+        return stats
@@ -0,0 +1,56 @@
+import re
+
+DEFAULT_SIMILARITY_THRESHOLD = 0.75  # Token-set Jaccard at or above this counts as a duplicate
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("a an and are best can do for from how i in is of on or the to what where which with".split())
+
+
+def normalize_query(query):
+    """Lowercase a query and collapse punctuation and whitespace."""
+    return " ".join(TOKEN_RE.findall(query.lower()))
+
+
+def query_tokens(query):
+    """Return the set of meaningful tokens in a query."""
+    tokens = set(TOKEN_RE.findall(query.lower()))
+    return (tokens - STOPWORDS) or tokens
+
+
+class KeywordDeduper:
+    """Rejects keywords whose token sets are too similar to keywords already used in the run."""
+    def __init__(self, threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.token_sets = []
+        self.index = {}  # token -> ids of accepted keywords containing it
+
+    def is_duplicate(self, keyword):
+        """Return True if the keyword is a near-duplicate of one already accepted."""
+        tokens = query_tokens(keyword)
+        if not tokens:
+            return True
+
+        # Only keywords sharing at least one token can be similar
+        candidates = set()
+        for token in tokens:
+            candidates.update(self.index.get(token, ()))
+        for candidate in candidates:
+            other = self.token_sets[candidate]
+            if len(tokens & other) / len(tokens | other) >= self.threshold:
+                return True
+        return False
+
+    def add(self, keyword):
+        """Record an accepted keyword."""
+        tokens = query_tokens(keyword)
+        keyword_id = len(self.token_sets)
+        self.token_sets.append(tokens)
+        for token in tokens:
+            self.index.setdefault(token, []).append(keyword_id)
+
+    def accept(self, keyword):
+        """Record the keyword and return True unless it is a near-duplicate."""
+        if self.is_duplicate(keyword):
+            return False
+        self.add(keyword)
+        return True
@@ -0,0 +1,140 @@
+import csv
+import json
+import os
+
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+TAIL_FORMATS = ("csv", "jsonl")  # Formats that can be appended to row by row
+CHUNK_ROWS = 5000  # Rows buffered between writes
+
+
+class ExportError(Exception):
+    """Raised when an export cannot be written in the requested format."""
+
+
+def format_for_path(path, default="csv"):
+    """Guess the export format from a file extension."""
+    extension = os.path.splitext(path)[1].lower().lstrip(".")
+    return extension if extension in EXPORT_FORMATS else default
+
+
+def chunked(rows, size=CHUNK_ROWS):
+    """Group an iterable of rows into lists of at most `size` rows."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class CsvWriter:
+    def __init__(self, path, columns, append=False):
+        exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, "a" if append else "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        if not exists:
+            self.writer.writerow(columns)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlWriter:
+    def __init__(self, path, columns, append=False):
+        self.keys = [column.lower() for column in columns]
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write_rows(self, rows):
+        self.file.writelines(json.dumps(dict(zip(self.keys, row)), ensure_ascii=False) + "\n" for row in rows)
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """Columnar output through pyarrow, one row group per chunk."""
+    def __init__(self, path, columns, append=False):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ExportError("Parquet export needs pyarrow (pip install pyarrow).")
+        if append:
+            raise ExportError("Parquet files cannot be appended to; use CSV or JSONL for live export.")
+        self.pyarrow = pyarrow
+        self.columns = columns
+        self.schema = pyarrow.schema([(column.lower(), pyarrow.string()) for column in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write_rows(self, rows):
+        columns = [[row[i] for row in rows] for i in range(len(self.columns))]
+        self.writer.write_table(self.pyarrow.Table.from_arrays(columns, schema=self.schema))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {"csv": CsvWriter, "jsonl": JsonlWriter, "parquet": ParquetWriter}
+
+
+def open_writer(path, fmt, columns, append=False):
+    """Open a writer with write_rows()/flush()/close() for one of EXPORT_FORMATS."""
+    if fmt not in WRITERS:
+        raise ExportError(f"Unknown export format: {fmt}")
+    return WRITERS[fmt](path, columns, append=append)
+
+
+def export_rows(rows, path, fmt, columns, chunk_rows=CHUNK_ROWS):
+    """Stream rows into a file chunk by chunk and return how many were written."""
+    written = 0
+    writer = open_writer(path, fmt, columns)
+    try:
+        for chunk in chunked(rows, chunk_rows):
+            writer.write_rows(chunk)
+            written += len(chunk)
+    finally:
+        writer.close()
+    return written
+
+
+class TailExporter:
+    """Appends rows to a file as a scrape produces them and syncs every batch to disk.
+
+    Rows are (url, title, description, keyword), one per page/keyword pair, so a page that
+    later turns up for another keyword gets one more line instead of rewriting an earlier one.
+    """
+    COLUMNS = ["URL", "TITLE", "DESCRIPTION", "KEYWORD"]
+
+    def __init__(self, path, fmt=None):
+        fmt = fmt or format_for_path(path)
+        if fmt not in TAIL_FORMATS:
+            raise ExportError(f"Live export supports {', '.join(TAIL_FORMATS)}, not {fmt}.")
+        self.path = path
+        self.writer = open_writer(path, fmt, self.COLUMNS, append=True)
+
+    def write_page(self, url, title, description, keywords):
+        self.writer.write_rows([(url, title, description, keyword) for keyword in keywords])
+        self.writer.file.flush()  # Hand the lines to the OS right away; flush() also syncs them to disk
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.flush()
+        self.writer.close()
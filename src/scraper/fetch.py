@@ -0,0 +1,231 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from scraper.metadata import extract_metadata, shared_parse_pool, PageMetadata, PageTimeout, NO_TITLE, DEFAULT_PARSE_WORKERS
+from scraper.metrics import Metrics
+from scraper.net import create_session, Prewarmer, DEFAULT_MAX_REDIRECTS
+from scraper.politeness import HostScheduler, RobotsCache, DEFAULT_HOST_CONCURRENCY, DEFAULT_HOST_DELAY, ROBOTS_DISALLOWED
+from scraper.urls import canonicalize_url
+
+DEFAULT_MAX_CONCURRENT_FETCHES = 16  # Global cap on in-flight page requests
+DEFAULT_TIMEOUT = 5  # Seconds to connect, and between two reads
+DEFAULT_PAGE_TIMEOUT = 15  # Seconds one page may take in total, so a server trickling bytes cannot hold a fetch thread
+
+
+class FetchEngine:
+    """Fetches page metadata concurrently over a shared pool of keep-alive connections.
+
+    Unless host_concurrency is None, URLs submitted with `submit_url()` go through a HostScheduler
+    that caps and paces requests per host, and robots.txt is honoured when respect_robots is set.
+
+    `close()` cancels queued fetches and makes the ones in flight stop reading at their next chunk.
+
+    Heads are parsed on the fetch threads, or with `parse_workers` in a process pool shared by
+    every engine in the process.
+
+    Connections come from a session built by `scraper.net.create_session`: host names are
+    resolved through the process-wide DNS cache, bodies are compressed and at most
+    `max_redirects` redirects are followed. `prewarm(urls)` opens connections to the hosts of URLs
+    about to be submitted.
+
+    Concurrent requests for the same page, such as two campaign jobs finding it at once, share a
+    single fetch.
+    """
+    def __init__(self, max_concurrent=DEFAULT_MAX_CONCURRENT_FETCHES, timeout=DEFAULT_TIMEOUT, cache=None, metrics=None,
+                 host_concurrency=DEFAULT_HOST_CONCURRENCY, host_delay=DEFAULT_HOST_DELAY, respect_robots=True,
+                 page_timeout=DEFAULT_PAGE_TIMEOUT, parse_workers=DEFAULT_PARSE_WORKERS, max_redirects=DEFAULT_MAX_REDIRECTS):
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.page_timeout = page_timeout
+        self.closed = threading.Event()
+        self.in_flight = {}  # canonical URL -> Future of the fetch under way
+        self.in_flight_lock = threading.Lock()
+        self.cache = cache  # Optional PageCache
+        self.metrics = metrics or Metrics()
+
+        # Imported here so modules that only need this file's constants stay quick to import
+        import requests
+
+        # One session for every fetch so connections to the same host are reused
+        self.session = create_session(max_concurrent, self.metrics, max_redirects=max_redirects)
+        self.timeout_errors = (requests.Timeout, PageTimeout)  # PageTimeout: the head trickled in past page_timeout
+        self.redirect_errors = (requests.TooManyRedirects,)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="fetch")
+        self.parse_pool = shared_parse_pool(parse_workers)
+
+        self.scheduler = None
+        self.max_pending = max_concurrent * 2  # URLs worth submitting ahead; just a couple of rounds without a scheduler
+        if host_concurrency:
+            robots = RobotsCache(self.session, timeout) if respect_robots else None
+            self.scheduler = HostScheduler(self.executor, max_concurrent, host_concurrency, host_delay, robots)
+            self.max_pending = self.scheduler.max_queued  # Queued per host, so many hosts can be interleaved
+        self.prewarmer = Prewarmer(self.session, timeout, self.metrics, should_connect=self._should_prewarm)
+
+    def get_page_info(self, url):
+        """Scrape the title and meta description from the webpage's head, going through the cache if set."""
+        page = self.get_page_metadata(url)
+        return page.title, page.description
+
+    def get_page_metadata(self, url):
+        """Return the PageMetadata of a webpage's head, going through the cache if set."""
+        self.metrics.increment("fetch.pages")
+        url_key = canonicalize_url(url)
+        with self.in_flight_lock:
+            future = self.in_flight.get(url_key)
+            owner = future is None
+            if owner:
+                future = self.in_flight[url_key] = Future()
+        if not owner:
+            self.metrics.increment("fetch.coalesced")
+            return future.result()
+
+        try:
+            page = self._get_page_metadata(url, url_key)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(page)
+            return page
+        finally:
+            with self.in_flight_lock:
+                del self.in_flight[url_key]
+
+    def _get_page_metadata(self, url, url_key):
+        if not self.cache:
+            return self._fetch_page_metadata(url)
+
+        cached = self.cache.get(url_key)
+        if cached and self.cache.is_fresh(cached):
+            self.cache.record_hit()
+            self.metrics.increment("page_cache.hits")
+            return PageMetadata(cached.title, cached.description, **cached.extra)
+
+        # Stale entries are revalidated with a conditional GET
+        headers = {}
+        if cached and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+        return self._fetch_page_metadata(url, url_key, cached, headers)
+
+    def _fetch_page_metadata(self, url, url_key=None, cached=None, headers=None):
+        if self.closed.is_set():
+            return PageMetadata()
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.page_timeout
+        try:
+            # Inside the try, since a malformed URL fails here first
+            if self.scheduler and not self.scheduler.allowed(url):
+                self.metrics.increment("fetch.robots_disallowed")
+                return PageMetadata(NO_TITLE, ROBOTS_DISALLOWED)
+            self.metrics.increment("fetch.requests")
+            with self.metrics.timer("fetch"), self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                if self.scheduler:
+                    self.scheduler.observe(url, time.perf_counter() - start, response.status_code)
+                if cached and response.status_code == 304:
+                    self.cache.record_hit(revalidated=True)
+                    self.cache.refresh(url_key)
+                    self.metrics.increment("page_cache.hits")
+                    self.metrics.increment("page_cache.revalidated")
+                    return PageMetadata(cached.title, cached.description, **cached.extra)
+
+                if response.status_code >= 400:
+                    self.metrics.increment("fetch.http_errors")
+                page = extract_metadata(
+                    response, metrics=self.metrics, deadline=deadline, stop_event=self.closed, pool=self.parse_pool
+                )
+                self.metrics.increment("fetch.wire_bytes", response.raw.tell())  # As received: compressed, drained remainders included
+                if self.closed.is_set():
+                    return page  # Cut short: not worth caching
+                if self.cache:
+                    self.cache.record_miss()
+                    self.metrics.increment("page_cache.misses")
+                    if response.ok:
+                        self.cache.put(
+                            url_key, url, page.title, page.description,
+                            response.headers.get("ETag"), response.headers.get("Last-Modified"), page.extra()
+                        )
+                return page
+        except Exception as e:
+            if isinstance(e, self.timeout_errors):
+                self.metrics.increment("fetch.timeouts")
+            elif isinstance(e, self.redirect_errors):
+                self.metrics.increment("fetch.too_many_redirects")
+            else:
+                self.metrics.increment("fetch.errors")
+            if self.scheduler:
+                self.scheduler.observe(url, time.perf_counter() - start, failed=True)
+            if self.cache:
+                self.cache.record_miss()
+                self.metrics.increment("page_cache.misses")
+            return PageMetadata()
+
+    def submit(self, fn, *args):
+        """Run fn on one of the fetch threads and return its Future."""
+        return self.executor.submit(fn, *args)
+
+    def submit_url(self, url, fn, *args):
+        """Run fn(*args), which fetches url, on a fetch thread once url's host has room; return its Future."""
+        if self.scheduler and not self._is_fresh_in_cache(url):
+            return self.scheduler.submit(url, fn, *args)
+        return self.executor.submit(fn, *args)  # Fresh cache hits never touch the host, so skip its queue
+
+    def cancel(self, futures):
+        """Cancel fetches from submit_url() that have not started yet and drop them from their host queues."""
+        for future in futures:
+            future.cancel()
+        if self.scheduler:
+            self.scheduler.discard_cancelled()
+
+    def prewarm(self, urls):
+        """Resolve the hosts of URLs about to be submitted and open connections to them in the background."""
+        if not self.closed.is_set():
+            self.prewarmer.warm(urls)
+
+    def _should_prewarm(self, url):
+        """Skip pages the cache will answer; fetch robots.txt ahead and skip pages it disallows."""
+        if self.closed.is_set() or self._is_fresh_in_cache(url):
+            return False
+        if self.scheduler and self.scheduler.robots:
+            return self.scheduler.robots.can_fetch(url)
+        return True
+
+    def _is_fresh_in_cache(self, url):
+        if not self.cache:
+            return False
+        cached = self.cache.get(canonicalize_url(url))
+        return bool(cached and self.cache.is_fresh(cached))
+
+    def fetch_all(self, urls, is_interrupted=lambda: False):
+        """Fetch all URLs concurrently, yielding (url, title, meta_description) as each one finishes."""
+        futures = {self.submit_url(url, self.get_page_info, url): url for url in urls}
+        try:
+            for future in as_completed(futures):
+                if is_interrupted():
+                    break
+                title, meta_description = future.result()
+                yield futures[future], title, meta_description
+        finally:
+            # Drop anything still queued if the caller stopped early
+            for future in futures:
+                future.cancel()
+
+    def cache_stats(self):
+        """Return the page cache's hit/miss counters, or an empty dict without a cache."""
+        return self.cache.stats() if self.cache else {}
+
+    def host_stats(self):
+        """Return the scheduler's per-host queue depths, delays and outcome counts."""
+        return self.scheduler.host_stats() if self.scheduler else {}
+
+    def close(self):
+        """Shut down the worker threads and release pooled connections, abandoning fetches in flight."""
+        self.closed.set()
+        self.prewarmer.close()
+        if self.scheduler:
+            self.scheduler.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
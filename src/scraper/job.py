@@ -0,0 +1,243 @@
+from scraper.adaptive import DEFAULT_MIN_YIELD
+from scraper.cache import PageCache, SerpCache
+from scraper.dedup import KeywordDeduper
+from scraper.export import TailExporter
+from scraper.fetch import FetchEngine, DEFAULT_MAX_CONCURRENT_FETCHES, DEFAULT_PAGE_TIMEOUT
+from scraper.politeness import DEFAULT_HOST_CONCURRENCY, DEFAULT_HOST_DELAY
+from scraper.journal import JobJournal, new_job_id, prune_journals, FINISHED, STOPPED, FAILED
+from scraper.metadata import DEFAULT_PARSE_WORKERS
+from scraper.metrics import Metrics
+from scraper.net import DEFAULT_MAX_REDIRECTS
+from scraper.pipeline import ScrapePipeline, DEFAULT_GENERATE_TIMEOUT, DEFAULT_SEARCH_TIMEOUT
+from scraper.results import ResultStore, DEFAULT_MAX_RESULT_MEMORY
+from scraper.search import default_search
+
+
+class PageRecord:
+    """One distinct page found by a job, with every keyword that surfaced it so far.
+
+    Handed out by `ScrapeJob.run()`; the job itself keeps its pages in `ScrapeJob.results`.
+    """
+    __slots__ = ("index", "url", "title", "description", "keywords", "extra")
+
+    def __init__(self, index, url, title, description, keywords, extra=None):
+        self.index = index  # Row in ScrapeJob.results
+        self.url = url
+        self.title = title
+        self.description = description
+        self.keywords = keywords
+        self.extra = extra or {}  # Other head fields: canonical, og_title, og_description, lang, robots
+
+    def as_row(self):
+        """Return (url, title, description, keywords) with the keywords joined into one string."""
+        return self.url, self.title, self.description, ", ".join(self.keywords)
+
+
+class ScrapeJob:
+    """One scrape run (description -> keywords -> SERPs -> pages) together with its caches and fetch pool.
+
+    Shared by the GUI worker and the headless CLI. `run()` forwards the pipeline's events, except
+    that results are merged into PageRecords:
+
+    - ("result", record) for every distinct page
+    - ("keyword_attached", (record, keyword)) when another keyword surfaces a page already emitted
+
+    Progress is written to a JobJournal under `job_id`. Running a job whose journal already has
+    entries (see `ScrapeJob.resume`) first re-emits the journaled pages, then only does the work
+    the earlier attempt did not finish.
+
+    Per-stage latencies and counters are collected in `metrics`; pass the Metrics the keyword
+    generator reports to so generation time and tokens/sec land in the same snapshot.
+
+    `stop()` returns control within a few hundred milliseconds: see ScrapePipeline for how each
+    stage is interrupted. `generate_timeout`, `search_timeout` and `page_timeout` bound single
+    calls of each stage, and `deadline` the whole run in seconds; a job stopped by its deadline is
+    journaled as stopped and can be resumed.
+
+    With `adaptive`, keyword generation follows the yield of new unique URLs per search: queries
+    that stopped finding new sites are fed back to the model to avoid, and generation ends early
+    once the yield stays below `min_yield` (see ScrapePipeline).
+
+    Pages are kept in `results`, a ResultStore that moves its oldest rows to disk once they take
+    more than `max_result_memory` bytes. It outlives the run so the window can keep showing it.
+
+    A Campaign runs several jobs over shared resources: it passes its own `fetch_engine` (with
+    the page cache), `serp_cache` and `results` store, which the job uses without closing, and a
+    `tag` stored with every row the job adds.
+    """
+    def __init__(self, description, keywords_to_generate, num_results_per_keyword, generate_keywords,
+                 search=None, max_concurrent_fetches=DEFAULT_MAX_CONCURRENT_FETCHES, use_cache=True,
+                 tail_path=None, job_id=None, use_journal=True, metrics=None,
+                 host_concurrency=DEFAULT_HOST_CONCURRENCY, host_delay=DEFAULT_HOST_DELAY, respect_robots=True,
+                 max_result_memory=DEFAULT_MAX_RESULT_MEMORY, generate_timeout=DEFAULT_GENERATE_TIMEOUT,
+                 search_timeout=DEFAULT_SEARCH_TIMEOUT, page_timeout=DEFAULT_PAGE_TIMEOUT, deadline=None,
+                 parse_workers=DEFAULT_PARSE_WORKERS, adaptive=False, min_yield=DEFAULT_MIN_YIELD,
+                 max_redirects=DEFAULT_MAX_REDIRECTS, fetch_engine=None, serp_cache=None, results=None, tag=None):
+        self.description = description
+        self.keywords_to_generate = keywords_to_generate
+        self.num_results_per_keyword = num_results_per_keyword
+        self.generate_keywords = generate_keywords
+        self.search = search or default_search()  # Rate-limited Google unless another backend is given
+        self.max_concurrent_fetches = max_concurrent_fetches
+        self.use_cache = use_cache
+        self.tail_path = tail_path  # Optional CSV/JSONL file that rows are appended to as they arrive
+        self.job_id = job_id or new_job_id()
+        self.use_journal = use_journal
+        self.metrics = metrics or Metrics()
+        self.host_concurrency = host_concurrency  # Per-host fetch cap; None turns the host scheduler off
+        self.host_delay = host_delay
+        self.respect_robots = respect_robots
+        self.generate_timeout = generate_timeout
+        self.search_timeout = search_timeout
+        self.page_timeout = page_timeout
+        self.deadline = deadline
+        self.parse_workers = parse_workers  # Processes parsing page heads; 0 parses on the fetch threads
+        self.max_redirects = max_redirects
+        self.adaptive = adaptive
+        self.min_yield = min_yield
+
+        self.shared_fetch_engine = fetch_engine
+        self.shared_serp_cache = serp_cache
+        self.tag = tag  # Campaign job ID stored with each row
+
+        self.results = results if results is not None else ResultStore(max_result_memory)  # Pages in the order they were fetched
+        self.pipeline = None
+        self.fetch_engine = None
+        self.is_interrupted = False
+
+    @classmethod
+    def resume(cls, job_id, generate_keywords, **kwargs):
+        """Rebuild a journaled job from its recorded settings so it can run to completion."""
+        journal = JobJournal(job_id)
+        try:
+            settings = journal.settings()
+        finally:
+            journal.close()
+        if not settings:
+            raise ValueError(f"No journal for job {job_id}")
+        return cls(
+            settings["description"],
+            settings["keywords_to_generate"],
+            settings["num_results_per_keyword"],
+            generate_keywords,
+            job_id=job_id,
+            **kwargs
+        )
+
+    def run(self):
+        """Run the job, yielding (event, value) tuples as it progresses."""
+        journal = JobJournal(self.job_id) if self.use_journal else None
+        resume = journal.load() if journal else None
+        records = {}  # record id -> row in self.results
+        if resume:
+            # Hand back everything the earlier attempt finished before doing anything new
+            for record_id, (url, title, description, extra) in resume.pages.items():
+                keywords = resume.hits.get(record_id, [])
+                index = records[record_id] = self.results.add(url, title, description, keywords, self.tag)
+                yield "result", PageRecord(index, url, title, description, list(keywords), extra)
+        if journal:
+            journal.start(self.description, self.keywords_to_generate, self.num_results_per_keyword)
+
+        tail = TailExporter(self.tail_path) if self.tail_path else None
+        page_cache = PageCache() if self.use_cache and not self.shared_fetch_engine else None
+        serp_cache = self.shared_serp_cache or (SerpCache() if self.use_cache else None)
+        self.fetch_engine = self.shared_fetch_engine or FetchEngine(
+            max_concurrent=self.max_concurrent_fetches,
+            cache=page_cache,
+            metrics=self.metrics,
+            host_concurrency=self.host_concurrency,
+            host_delay=self.host_delay,
+            respect_robots=self.respect_robots,
+            page_timeout=self.page_timeout,
+            parse_workers=self.parse_workers,
+            max_redirects=self.max_redirects
+        )
+        self.pipeline = ScrapePipeline(
+            self.description,
+            self.keywords_to_generate,
+            self.num_results_per_keyword,
+            self.generate_keywords,
+            self.search,
+            self.fetch_engine,
+            deduper=KeywordDeduper(),
+            serp_cache=serp_cache,
+            resume=resume,
+            metrics=self.metrics,
+            generate_timeout=self.generate_timeout,
+            search_timeout=self.search_timeout,
+            deadline=self.deadline,
+            adaptive=self.adaptive,
+            min_yield=self.min_yield
+        )
+        if self.is_interrupted:
+            self.pipeline.stop()  # Stopped before the pipeline existed
+
+        status = FAILED
+        try:
+            for event, value in self.pipeline.run():
+                if journal:
+                    self.journal_event(journal, event, value)
+
+                if event == "result":
+                    record_id, url, title, meta_description, keywords, extra = value
+                    index = records[record_id] = self.results.add(url, title, meta_description, keywords, self.tag)
+                    value = PageRecord(index, url, title, meta_description, list(keywords), extra)
+                    if tail:
+                        tail.write_page(url, title, meta_description, keywords)
+                elif event == "keyword_attached":
+                    record_id, keyword = value
+                    index = records[record_id]
+                    if not self.results.attach(index, keyword):
+                        continue
+                    record = PageRecord(index, *self.results.page(index))
+                    if tail:
+                        tail.write_page(record.url, record.title, record.description, [keyword])
+                    value = (record, keyword)
+                elif event == "queues" and tail:
+                    tail.flush()
+                yield event, value
+            status = STOPPED if self.is_interrupted or self.deadline_reached else FINISHED
+        except (GeneratorExit, KeyboardInterrupt):
+            status = STOPPED
+            raise
+        finally:
+            if journal:
+                journal.set_status(status)
+                journal.close()
+                prune_journals()  # Every run leaves a journal; keep the directory from growing without end
+            if tail:
+                tail.close()
+            if not self.shared_fetch_engine:
+                self.fetch_engine.close()
+            if page_cache:
+                page_cache.close()
+            if serp_cache and not self.shared_serp_cache:
+                serp_cache.close()
+
+    def journal_event(self, journal, event, value):
+        """Record a pipeline event that a resumed run should not have to redo."""
+        if event == "keyword":
+            journal.record_keyword(value)
+        elif event == "serp":
+            journal.record_serp(*value)
+        elif event == "result":
+            journal.record_page(*value)
+        elif event == "keyword_attached":
+            journal.record_hit(*value)
+
+    def stop(self):
+        """Stop the job; `run()` returns once every pipeline stage has drained."""
+        self.is_interrupted = True
+        if self.pipeline:
+            self.pipeline.stop()
+
+    @property
+    def deadline_reached(self):
+        """True if the run was cut short by its deadline, leaving the job unfinished."""
+        return bool(self.pipeline and self.pipeline.deadline_reached)
+
+    def stats(self):
+        """Combine the pipeline's search counters with the page cache's hit rate."""
+        if not self.pipeline:
+            return {}
+        return dict(self.pipeline.stats(), page_cache=self.fetch_engine.cache_stats())
@@ -0,0 +1,163 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+
+from scraper.cache import DEFAULT_CACHE_DIR
+
+JOURNAL_DIR = os.path.join(DEFAULT_CACHE_DIR, "jobs")
+MAX_FINISHED_JOURNALS = 20  # Journals of finished jobs kept for `cli.py jobs`, newest first
+MAX_JOURNAL_AGE = 30 * 24 * 60 * 60  # Seconds without a write after which any journal is deleted, finished or not
+
+# Job statuses
+RUNNING = "running"
+FINISHED = "finished"
+STOPPED = "stopped"
+FAILED = "failed"
+
+
+def new_job_id():
+    """Return a sortable, unique id for a new job."""
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+
+def journal_path(job_id):
+    os.makedirs(JOURNAL_DIR, exist_ok=True)
+    return os.path.join(JOURNAL_DIR, f"{job_id}.sqlite")
+
+
+def list_jobs():
+    """Return the settings and status of every journaled job, newest first."""
+    if not os.path.isdir(JOURNAL_DIR):
+        return []
+    jobs = []
+    for file_name in sorted(os.listdir(JOURNAL_DIR), reverse=True):
+        if file_name.endswith(".sqlite"):
+            journal = JobJournal(file_name[:-len(".sqlite")])
+            try:
+                jobs.append(dict(journal.settings(), job_id=journal.job_id, pages=journal.page_count()))
+            finally:
+                journal.close()
+    return jobs
+
+
+def delete_journal(job_id):
+    """Delete a job's journal with its SQLite side files."""
+    path = journal_path(job_id)
+    for file_path in (path, path + "-wal", path + "-shm"):
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+
+
+def prune_journals(keep_finished=MAX_FINISHED_JOURNALS, max_age=MAX_JOURNAL_AGE):
+    """Delete the journals of all but the newest `keep_finished` finished jobs, and every journal
+    not written to for `max_age` seconds; younger unfinished jobs are kept so they can be resumed.
+    """
+    now = time.time()
+    finished = 0
+    for job in list_jobs():
+        path = journal_path(job["job_id"])
+        written = max((os.path.getmtime(p) for p in (path, path + "-wal") if os.path.exists(p)), default=now)
+        if job.get("status") == FINISHED:
+            finished += 1
+        if now - written > max_age or (job.get("status") == FINISHED and finished > keep_finished):
+            delete_journal(job["job_id"])
+
+
+class ResumeState:
+    """What a previous attempt of a job already completed, as loaded from its journal."""
+    def __init__(self, keywords, serps, pages, hits):
+        self.keywords = keywords  # Generated keywords, in order
+        self.serps = serps  # keyword -> [url]
+        self.pages = pages  # record id -> (url, title, description, extra)
+        self.hits = hits  # record id -> [keyword]
+
+    @property
+    def next_record_id(self):
+        return max(self.pages, default=-1) + 1
+
+
+class JobJournal:
+    """Append-only SQLite record of a job's keywords, SERP responses and fetched pages.
+
+    Every entry is committed as soon as it is written, so a crash or a stop loses at most the
+    work that was still in flight, and `load()` lets a new run pick up where the last one ended.
+    """
+    def __init__(self, job_id, path=None):
+        self.job_id = job_id
+        self.path = path or journal_path(job_id)
+        self.connection = sqlite3.connect(self.path)
+        with self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS keywords (seq INTEGER PRIMARY KEY AUTOINCREMENT, keyword TEXT NOT NULL)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS serps (keyword TEXT PRIMARY KEY, urls TEXT NOT NULL)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS pages (record_id INTEGER PRIMARY KEY, url TEXT, title TEXT, description TEXT, extra TEXT)")
+            if "extra" not in {row[1] for row in self.connection.execute("PRAGMA table_info(pages)")}:
+                self.connection.execute("ALTER TABLE pages ADD COLUMN extra TEXT")  # Journals of older versions
+            self.connection.execute("CREATE TABLE IF NOT EXISTS hits (record_id INTEGER, keyword TEXT, PRIMARY KEY (record_id, keyword))")
+
+    def start(self, description, keywords_to_generate, num_results_per_keyword):
+        """Record the job's settings the first time it runs and mark it running."""
+        with self.connection:
+            for name, value in (
+                ("description", description),
+                ("keywords_to_generate", keywords_to_generate),
+                ("num_results_per_keyword", num_results_per_keyword),
+                ("created_at", time.time()),
+            ):
+                self.connection.execute("INSERT OR IGNORE INTO settings VALUES (?, ?)", (name, json.dumps(value)))
+        self.set_status(RUNNING)
+
+    def settings(self):
+        rows = self.connection.execute("SELECT name, value FROM settings").fetchall()
+        return {name: json.loads(value) for name, value in rows}
+
+    def set_status(self, status):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO settings VALUES ('status', ?)", (json.dumps(status),))
+
+    def record_keyword(self, keyword):
+        with self.connection:
+            self.connection.execute("INSERT INTO keywords (keyword) VALUES (?)", (keyword,))
+
+    def record_serp(self, keyword, urls):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO serps VALUES (?, ?)", (keyword, json.dumps(urls)))
+
+    def record_page(self, record_id, url, title, description, keywords, extra=None):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                (record_id, url, title, description, json.dumps(extra) if extra else None)
+            )
+            self.connection.executemany("INSERT OR IGNORE INTO hits VALUES (?, ?)", [(record_id, keyword) for keyword in keywords])
+
+    def record_hit(self, record_id, keyword):
+        with self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO hits VALUES (?, ?)", (record_id, keyword))
+
+    def page_count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def load(self):
+        """Return a ResumeState with everything journaled so far."""
+        keywords = [keyword for (keyword,) in self.connection.execute("SELECT keyword FROM keywords ORDER BY seq")]
+        serps = {keyword: json.loads(urls) for keyword, urls in self.connection.execute("SELECT keyword, urls FROM serps")}
+        pages = {
+            record_id: (url, title, description, json.loads(extra) if extra else {})
+            for record_id, url, title, description, extra in self.connection.execute(
+                "SELECT record_id, url, title, description, extra FROM pages ORDER BY record_id"
+            )
+        }
+        hits = {}
+        for record_id, keyword in self.connection.execute("SELECT record_id, keyword FROM hits ORDER BY rowid"):
+            hits.setdefault(record_id, []).append(keyword)
+        return ResumeState(keywords, serps, pages, hits)
+
+    def close(self):
+        self.connection.close()
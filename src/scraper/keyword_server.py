@@ -0,0 +1,238 @@
+import json
+import os
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8765
+DEFAULT_SERVER_URL = f"http://127.0.0.1:{DEFAULT_PORT}"
+SERVER_URL_ENV = "AISERP_KEYWORD_SERVER"  # Overrides the server clients look for
+MAX_BATCH_SEQUENCES = 32  # Keywords sampled together in one generate call
+BATCH_WINDOW = 0.02  # Seconds the batcher waits for more requests once one has arrived
+REQUEST_TIMEOUT = 120  # Seconds a client waits for its keywords
+QUEUE_TIMEOUT = 100  # Seconds the server waits for a request's keywords before answering 503, inside the client's timeout
+BUSY_RETRY_AFTER = 5  # Seconds a 503 asks the client to wait before sending the request again
+MAX_BUSY_RETRIES = 3  # 503 answers a client retries before giving up on the request
+HEALTH_TIMEOUT = 0.5
+RETRY_REMOTE_INTERVAL = 30  # Seconds a client sticks to its in-process fallback before trying the server again
+
+
+class KeywordServerBusy(Exception):
+    """Raised by the client when the keyword server keeps answering 503; it is up, just overloaded."""
+
+
+def server_url():
+    return os.environ.get(SERVER_URL_ENV, DEFAULT_SERVER_URL)
+
+
+class PendingRequest:
+    """A client's (description, count, avoid) request, filled a batch at a time."""
+    __slots__ = ("description", "avoid", "remaining", "keywords", "future")
+
+    def __init__(self, description, count, avoid=()):
+        self.description = description
+        self.avoid = tuple(avoid)
+        self.remaining = count
+        self.keywords = []
+        self.future = Future()
+
+
+class KeywordBatcher:
+    """Collects concurrent keyword requests and serves them from shared generate calls.
+
+    Requests queue up while the model is busy; each round takes up to MAX_BATCH_SEQUENCES
+    keywords' worth of them, a slice of a large request at a time, so a client asking for a
+    hundred keywords does not hold up one asking for five. Unfinished requests go to the back of
+    the line for the next round. A request whose caller gave up waiting before its first round is
+    dropped instead of generated for nobody.
+    """
+    def __init__(self, generator, max_batch=MAX_BATCH_SEQUENCES, window=BATCH_WINDOW):
+        self.generator = generator
+        self.max_batch = max_batch
+        self.window = window
+        self.requests = queue.Queue()
+        self.thread = threading.Thread(target=self._loop, name="keyword-batcher", daemon=True)
+        self.thread.start()
+
+    def generate(self, description, count, avoid=(), timeout=REQUEST_TIMEOUT):
+        """Queue a request and block until its keywords are ready; raise TimeoutError after `timeout`."""
+        request = PendingRequest(description, count, avoid)
+        self.requests.put(request)
+        try:
+            return request.future.result(timeout=timeout)
+        except FutureTimeoutError:
+            request.future.cancel()  # Only succeeds if no round has started on it yet
+            raise
+
+    def _loop(self):
+        waiting = []
+        while True:
+            if not waiting:
+                waiting.append(self.requests.get())
+                time.sleep(self.window)  # Give concurrent clients a moment to join this batch
+            while True:
+                try:
+                    waiting.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            batch = []  # (request, count)
+            room = self.max_batch
+            while waiting and room:
+                request = waiting.pop(0)
+                if not request.future.running() and not request.future.set_running_or_notify_cancel():
+                    continue  # The caller gave up before its first round
+                count = min(request.remaining, room)
+                batch.append((request, count))
+                room -= count
+
+            try:
+                results = self.generator.generate_many([(request.description, count, request.avoid) for request, count in batch])
+            except Exception as e:
+                for request, _ in batch:
+                    request.future.set_exception(e)
+                continue
+            for (request, count), keywords in zip(batch, results):
+                request.keywords.extend(keywords)
+                request.remaining -= count
+                if request.remaining > 0:
+                    waiting.append(request)
+                else:
+                    request.future.set_result(request.keywords)
+
+
+def serve_keywords(generator, host="127.0.0.1", port=DEFAULT_PORT, model_id=None, max_batch=MAX_BATCH_SEQUENCES):
+    """Serve keyword generation over localhost HTTP and return the server (call serve_forever()).
+
+    POST /generate with {"description": ..., "count": n, "avoid": [...]} returns {"keywords": [...]};
+    GET /health returns {"ok": true, "model": ...}.
+    """
+    batcher = KeywordBatcher(generator, max_batch=max_batch)
+
+    class KeywordHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path != "/health":
+                self.send_json(404, {"error": "not found"})
+                return
+            self.send_json(200, {"ok": True, "model": model_id})
+
+        def do_POST(self):
+            if self.path != "/generate":
+                self.send_json(404, {"error": "not found"})
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                keywords = batcher.generate(
+                    body["description"], int(body.get("count", 1)), body.get("avoid") or (), timeout=QUEUE_TIMEOUT
+                )
+            except FutureTimeoutError:
+                # Too many requests ahead of this one; the client waits and retries rather than loading its own model
+                self.send_json(503, {"error": "keyword server busy"}, {"Retry-After": str(BUSY_RETRY_AFTER)})
+                return
+            except Exception as e:
+                self.send_json(500, {"error": str(e)})
+                return
+            self.send_json(200, {"keywords": keywords})
+
+        def send_json(self, status, payload, headers=None):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), KeywordHandler)
+    server.daemon_threads = True
+    return server
+
+
+def server_available(url=None):
+    """Return True if a keyword server answers its health check."""
+    try:
+        with urllib.request.urlopen((url or server_url()) + "/health", timeout=HEALTH_TIMEOUT) as response:
+            return json.load(response).get("ok", False)
+    except (OSError, ValueError):
+        return False
+
+
+class RemoteKeywordGenerator:
+    """Thin client of a keyword server with the same generate() as KeywordGenerator.
+
+    If the server cannot be reached, `fallback()` is called once to load an in-process
+    KeywordGenerator, which serves requests until the server answers again. A server that answers
+    503 is only busy: the request is retried after its Retry-After, and KeywordServerBusy is
+    raised after MAX_BUSY_RETRIES, without loading a model of its own.
+    """
+    def __init__(self, url=None, fallback=None):
+        self.url = url or server_url()
+        self.fallback = fallback  # () -> KeywordGenerator
+        self.local = None
+        self.local_since = 0.0
+        self.lock = threading.Lock()
+
+    def generate(self, description, count=1, stop_event=None, avoid=()):
+        """Return `count` keywords for the description, from the server if it is up.
+
+        A request already sent to the server cannot be interrupted; `stop_event` only reaches the
+        in-process fallback. The pipeline stops waiting for the answer either way.
+        """
+        if self.local is None or time.monotonic() - self.local_since > RETRY_REMOTE_INTERVAL:
+            try:
+                return self._remote(description, count, avoid, stop_event)
+            except (OSError, ValueError):
+                if self.fallback is None:
+                    raise
+                self.local_since = time.monotonic()  # Try the server again once RETRY_REMOTE_INTERVAL has passed
+        return self._local().generate(description, count, stop_event, avoid)
+
+    def _remote(self, description, count, avoid=(), stop_event=None):
+        request = urllib.request.Request(
+            self.url + "/generate",
+            data=json.dumps({"description": description, "count": count, "avoid": list(avoid)}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        stop_event = stop_event or threading.Event()
+        for attempt in range(MAX_BUSY_RETRIES + 1):
+            try:
+                with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                    return json.load(response)["keywords"]
+            except urllib.error.HTTPError as e:
+                if e.code != 503:
+                    raise
+                retry_after = e.headers.get("Retry-After", "")
+                e.close()
+            if attempt == MAX_BUSY_RETRIES:
+                break
+            if stop_event.wait(float(retry_after) if retry_after.isdigit() else BUSY_RETRY_AFTER):
+                return []  # Stopped while waiting for the server
+        raise KeywordServerBusy(f"Keyword server at {self.url} is still busy after {MAX_BUSY_RETRIES} retries")
+
+    def _local(self):
+        with self.lock:
+            if self.local is None:
+                self.local = self.fallback()
+            return self.local
+
+
+def connect_keyword_generator(model_id, quantize=False, metrics=None, url=None):
+    """Return a client of the keyword server if one is running, else load the model in-process."""
+    from scraper.keywords import load_keyword_generator
+
+    def load():
+        return load_keyword_generator(model_id, quantize=quantize, metrics=metrics)
+
+    if server_available(url):
+        return RemoteKeywordGenerator(url, fallback=load)
+    return load()
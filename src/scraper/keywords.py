@@ -0,0 +1,229 @@
+import threading
+
+from scraper.metrics import Metrics
+
+# torch and transformers are imported inside the functions that need them, so importing this
+# module (or anything that only needs DEFAULT_BATCH_SIZE) stays cheap
+
+DEFAULT_MODEL_ID = "Qwen/Qwen2.5-0.5B-Instruct"
+DEFAULT_BATCH_SIZE = 8  # Keywords sampled per generate call
+MAX_NEW_TOKENS = 16
+TEMPERATURE = 0.7
+
+
+def build_messages(description, avoid=()):
+    """Build the chat messages that ask the model for a single search query.
+
+    `avoid` lists queries that stopped finding new websites; the model is asked to take the
+    description in another direction than those.
+    """
+    avoid_text = ""
+    if avoid:
+        avoid_text = (
+            "These queries only find websites that were already found, so do not repeat or rephrase them; "
+            "cover a different aspect of the description instead:\n"
+            + "".join(f"- {keyword}\n" for keyword in avoid) + "\n"
+        )
+    return [
+        {"role": "system", "content": "You are a helpful AI assistant."},
+        {"role": "user", "content": (
+            "Generate a single, natural-sounding medium/long-tail search query based on the provided description. "
+            "The query should be phrased like how a user would type it into Google, using complete phrases, and should be between 8-12 tokens. "
+            "Avoid lists of keywords or unnatural phrasing. "
+            "Only respond with the query itself.\n\n"
+            f"{avoid_text}"
+            f"Description:\n\n{description}"
+        )}
+    ]
+
+
+def clean_keyword(text):
+    """Strip quotes and separators the model likes to add around a query."""
+    return text.replace('"', '').replace("'", "").replace("-", " ").replace("_", " ").strip()
+
+
+def stopping_criteria(stop_event):
+    """Return generate() stopping criteria that end every sequence as soon as stop_event is set.
+
+    Checked after each decoding step, so a stop request interrupts a running generate call within
+    one forward pass instead of waiting for MAX_NEW_TOKENS.
+    """
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class StopEventCriteria(StoppingCriteria):
+        def __call__(self, input_ids, scores, **kwargs):
+            return torch.full((input_ids.shape[0],), stop_event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+    return StoppingCriteriaList([StopEventCriteria()])
+
+
+def quantized_model_path(model_id):
+    """Return where the int8 copy of a model is cached after its first conversion."""
+    from scraper.cache import default_cache_path
+
+    return default_cache_path(model_id.replace("/", "--") + "-int8.pt")
+
+
+def load_keyword_generator(model_id=DEFAULT_MODEL_ID, quantize=False, metrics=None):
+    """Load a causal LM and its tokenizer on the CPU and wrap them in a KeywordGenerator.
+
+    Weights are memory-mapped from safetensors where the checkpoint has them, without building a
+    randomly initialized copy first. With quantize=True the Linear layers are dynamically quantized
+    to int8; the converted model is saved next to the other caches and loaded directly next time.
+    Generation time and token counts are reported to `metrics` if given.
+    """
+    import os
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+
+    quantized_path = quantized_model_path(model_id) if quantize else None
+    if quantized_path and os.path.exists(quantized_path):
+        model = torch.load(quantized_path, weights_only=False)
+        return KeywordGenerator(model.eval(), tokenizer, metrics=metrics)
+
+    model = AutoModelForCausalLM.from_pretrained(
+        model_id,
+        device_map="cpu",
+        trust_remote_code=True,
+        low_cpu_mem_usage=True,
+    ).to("cpu")
+
+    if quantized_path:
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        torch.save(model, quantized_path)
+    return KeywordGenerator(model.eval(), tokenizer, metrics=metrics)
+
+
+class KeywordGenerator:
+    """Samples search queries in batches, reusing the KV cache of the shared prompt prefix."""
+    def __init__(self, model, tokenizer, batch_size=DEFAULT_BATCH_SIZE, metrics=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.batch_size = batch_size
+        self.metrics = metrics or Metrics()  # "generate.model" latency and "generate.tokens" count
+        self.lock = threading.Lock()  # generate() is not safe to call from several threads at once
+
+        # Prompt prefix state, rebuilt whenever the description changes
+        self._prefix_text = None
+        self._prefix_ids = None
+        self._prefix_cache = None
+
+    def generate(self, description, count=1, stop_event=None, avoid=()):
+        """Return `count` sampled keywords for the description, steering away from the `avoid` queries.
+
+        Setting `stop_event` interrupts generation; only the batches finished before that are returned.
+        """
+        keywords = []
+        with self.lock:
+            while len(keywords) < count:
+                if stop_event and stop_event.is_set():
+                    break
+                batch_size = min(self.batch_size, count - len(keywords))
+                batch = self._generate_batch(description, batch_size, stop_event, avoid)
+                if stop_event and stop_event.is_set():
+                    break  # The batch was cut short and its keywords are incomplete
+                keywords.extend(batch)
+        return keywords
+
+    def generate_many(self, requests):
+        """Return one keyword list per (description, count, avoid) request, sampled in shared batches.
+
+        Requests for a single prompt reuse its cached prefix; mixed prompts are left-padded into
+        one batch so they still cost a single generate call.
+        """
+        counts = [count for _, count, _ in requests]
+        prompts = {(description, tuple(avoid)) for description, _, avoid in requests}
+        if len(prompts) == 1:
+            description, avoid = prompts.pop()
+            keywords = self.generate(description, sum(counts), avoid=avoid)
+        else:
+            with self.lock:
+                keywords = self._generate_padded([
+                    (description, avoid) for description, count, avoid in requests for _ in range(count)
+                ])
+
+        results = []
+        for count in counts:
+            results.append(keywords[:count])
+            keywords = keywords[count:]
+        return results
+
+    def _prefix(self, description, avoid=()):
+        """Tokenize the prompt once and prefill its KV cache, leaving the last token for generate()."""
+        import torch
+        from transformers import DynamicCache
+
+        text = self.tokenizer.apply_chat_template(
+            build_messages(description, avoid),
+            tokenize=False,
+            add_generation_prompt=True
+        )
+        if text != self._prefix_text:
+            input_ids = self.tokenizer([text], return_tensors="pt").input_ids.to(self.model.device)
+            with torch.no_grad():
+                outputs = self.model(input_ids[:, :-1], past_key_values=DynamicCache(), use_cache=True)
+            self._prefix_text = text
+            self._prefix_ids = input_ids
+            self._prefix_cache = outputs.past_key_values.to_legacy_cache()
+        return self._prefix_ids, self._prefix_cache
+
+    def _generate_batch(self, description, batch_size, stop_event=None, avoid=()):
+        import torch
+        from transformers import DynamicCache
+
+        prefix_ids, prefix_cache = self._prefix(description, avoid)
+
+        # Every sequence in the batch starts from its own copy of the cached prefix
+        input_ids = prefix_ids.expand(batch_size, -1)
+        cache = DynamicCache.from_legacy_cache(tuple(
+            (key.expand(batch_size, -1, -1, -1).contiguous(), value.expand(batch_size, -1, -1, -1).contiguous())
+            for key, value in prefix_cache
+        ))
+
+        pad_token_id = self.tokenizer.pad_token_id or self.tokenizer.eos_token_id
+        with self.metrics.timer("generate.model"):
+            generated_ids = self.model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=cache,
+                max_new_tokens=MAX_NEW_TOKENS,
+                temperature=TEMPERATURE,
+                do_sample=True,
+                pad_token_id=pad_token_id,
+                stopping_criteria=stopping_criteria(stop_event) if stop_event else None
+            )
+        new_ids = generated_ids[:, input_ids.shape[1]:]
+        self.metrics.increment("generate.tokens", int((new_ids != pad_token_id).sum()))
+        responses = self.tokenizer.batch_decode(new_ids, skip_special_tokens=True)
+        return [clean_keyword(response) for response in responses]
+
+    def _generate_padded(self, prompts):
+        """Sample one keyword per (description, avoid) prompt in a single left-padded batch."""
+        texts = [
+            self.tokenizer.apply_chat_template(build_messages(description, avoid), tokenize=False, add_generation_prompt=True)
+            for description, avoid in prompts
+        ]
+        padding_side = self.tokenizer.padding_side
+        self.tokenizer.padding_side = "left"  # Generated tokens must follow every prompt directly
+        try:
+            inputs = self.tokenizer(texts, return_tensors="pt", padding=True).to(self.model.device)
+        finally:
+            self.tokenizer.padding_side = padding_side
+
+        pad_token_id = self.tokenizer.pad_token_id or self.tokenizer.eos_token_id
+        with self.metrics.timer("generate.model"):
+            generated_ids = self.model.generate(
+                input_ids=inputs.input_ids,
+                attention_mask=inputs.attention_mask,
+                max_new_tokens=MAX_NEW_TOKENS,
+                temperature=TEMPERATURE,
+                do_sample=True,
+                pad_token_id=pad_token_id
+            )
+        new_ids = generated_ids[:, inputs.input_ids.shape[1]:]
+        self.metrics.increment("generate.tokens", int((new_ids != pad_token_id).sum()))
+        responses = self.tokenizer.batch_decode(new_ids, skip_special_tokens=True)
+        return [clean_keyword(response) for response in responses]
@@ -0,0 +1,313 @@
+import atexit
+import codecs
+import re
+import threading
+import time
+from html.parser import HTMLParser
+
+NO_TITLE = "No Title Found"
+NO_DESCRIPTION = "No Description Found"
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+CHUNK_SIZE = 8 * 1024
+MAX_HEAD_BYTES = 128 * 1024  # Give up on pages whose head does not end within this many bytes
+DRAIN_LIMIT = 16 * 1024  # Read small leftovers so the connection can go back to the pool
+DEFAULT_PARSE_WORKERS = 0  # Parser processes; 0 parses on the fetch threads, which is as fast for heads this small
+
+META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([a-zA-Z0-9_\-]+)""", re.IGNORECASE)
+HEAD_END_RE = re.compile(rb"</head\s*>|<body[\s>]", re.IGNORECASE)
+HEAD_END_OVERLAP = 16  # Bytes of the previous chunk searched again, in case the marker straddles two chunks
+
+EXTRA_FIELDS = ("canonical", "og_title", "og_description", "lang", "robots")  # Stored with a page besides title and description
+META_FIELDS = {"description": "description", "og:title": "og_title", "og:description": "og_description", "robots": "robots"}  # <meta name/property> -> field
+
+
+class PageTimeout(Exception):
+    """Raised by read_head() when a page's head has not arrived by its deadline."""
+
+
+def _find_parser_backend():
+    """Pick the fastest HTML parser installed: selectolax, then lxml, then the standard library."""
+    try:
+        import selectolax.lexbor  # noqa: F401
+        return "selectolax"
+    except ImportError:
+        pass
+    try:
+        import lxml.html  # noqa: F401
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+
+PARSER_BACKEND = _find_parser_backend()
+
+
+class HeadParser(HTMLParser):
+    """Collects the head fields of a document with the standard library parser."""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.fields = {}
+        self._in_title = False
+        self._title_parts = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title" and "title" not in self.fields:
+            self._in_title = True
+        elif tag == "meta":
+            _collect_meta(self.fields, dict(attrs))
+        elif tag == "link":
+            _collect_link(self.fields, dict(attrs))
+        elif tag == "html":
+            _collect_html(self.fields, dict(attrs))
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._in_title:
+            self._in_title = False
+            self.fields["title"] = "".join(self._title_parts).strip()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title_parts.append(data)
+
+
+def _collect_meta(fields, attrs):
+    name = (attrs.get("name") or attrs.get("property") or "").lower()
+    content = attrs.get("content")
+    if not content:
+        return
+    key = META_FIELDS.get(name)
+    if key:
+        fields.setdefault(key, content.strip())
+
+
+def _collect_link(fields, attrs):
+    if "canonical" in (attrs.get("rel") or "").lower().split() and attrs.get("href"):
+        fields.setdefault("canonical", attrs["href"].strip())
+
+
+def _collect_html(fields, attrs):
+    if attrs.get("lang"):
+        fields.setdefault("lang", attrs["lang"].strip())
+
+
+def _parse_with_html_parser(text):
+    parser = HeadParser()
+    parser.feed(text)
+    return parser.fields
+
+
+def _parse_with_selectolax(text):
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(text)
+    fields = {}
+    title = tree.css_first("title")
+    if title is not None:
+        fields["title"] = title.text().strip()
+    for node in tree.css("meta"):
+        _collect_meta(fields, node.attributes)
+    for node in tree.css("link[rel]"):
+        _collect_link(fields, node.attributes)
+    html = tree.css_first("html")
+    if html is not None:
+        _collect_html(fields, html.attributes)
+    return fields
+
+
+def _parse_with_lxml(text):
+    import lxml.html
+
+    try:
+        root = lxml.html.document_fromstring(text)
+    except Exception:  # Empty or hopeless documents
+        return {}
+    fields = {}
+    title = root.find(".//title")
+    if title is not None:
+        fields["title"] = (title.text_content() or "").strip()
+    for node in root.iter("meta"):
+        _collect_meta(fields, node.attrib)
+    for node in root.iter("link"):
+        _collect_link(fields, node.attrib)
+    _collect_html(fields, root.attrib)
+    return fields
+
+
+PARSERS = {"selectolax": _parse_with_selectolax, "lxml": _parse_with_lxml, "html.parser": _parse_with_html_parser}
+
+
+def parse_head(data, content_type=""):
+    """Decode raw head bytes and return a dict of the head fields that were found.
+
+    Runs in the parser processes, so it only takes and returns plain picklable values. The
+    charset comes from the Content-Type header, then a <meta charset>, then UTF-8.
+    """
+    charset = header_charset(content_type)
+    if not charset:
+        match = META_CHARSET_RE.search(data, 0, 4096)
+        charset = match.group(1).decode("ascii") if match else "utf-8"
+    try:
+        text = codecs.decode(data, charset, "replace")
+    except LookupError:
+        text = codecs.decode(data, "utf-8", "replace")
+    return PARSERS[PARSER_BACKEND](text)
+
+
+class PageMetadata:
+    """Title, meta description and the other head fields extracted from one page."""
+    __slots__ = ("title", "description") + EXTRA_FIELDS
+
+    def __init__(self, title=NO_TITLE, description=NO_DESCRIPTION, canonical=None, og_title=None, og_description=None,
+                 lang=None, robots=None):
+        self.title = title or NO_TITLE
+        self.description = description or NO_DESCRIPTION
+        self.canonical = canonical
+        self.og_title = og_title
+        self.og_description = og_description
+        self.lang = lang
+        self.robots = robots
+
+    def extra(self):
+        """Return the fields found besides title and description, as a dict."""
+        return {field: getattr(self, field) for field in EXTRA_FIELDS if getattr(self, field)}
+
+
+class ParsePool:
+    """Parses heads in worker processes so parsing is not held back by the GIL of the fetch threads.
+
+    If a worker dies the pool breaks; the head at hand is then parsed in-process and a new pool
+    is started for the following ones.
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self.executor = self._start()
+        self.lock = threading.Lock()
+
+    def _start(self):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def parse(self, data, content_type):
+        from concurrent.futures.process import BrokenProcessPool
+
+        executor = self.executor
+        try:
+            return executor.submit(parse_head, data, content_type).result()
+        except BrokenProcessPool:
+            with self.lock:
+                if self.executor is executor:  # Not restarted yet by another fetch thread
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self.executor = self._start()
+            return parse_head(data, content_type)
+
+    def close(self, wait=False):
+        self.executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_parse_pools = {}
+_parse_pools_lock = threading.Lock()
+_parse_pools_registered = False  # close_parse_pools() is registered with atexit once a pool exists
+
+
+def shared_parse_pool(workers=DEFAULT_PARSE_WORKERS):
+    """Return the process-wide ParsePool with this many workers, or None to parse in-process."""
+    if not workers:
+        return None
+    global _parse_pools_registered
+    with _parse_pools_lock:
+        if not _parse_pools_registered:
+            atexit.register(close_parse_pools)
+            _parse_pools_registered = True
+        if workers not in _parse_pools:
+            _parse_pools[workers] = ParsePool(workers)
+        return _parse_pools[workers]
+
+
+def close_parse_pools(wait=True):
+    """Shut down every shared ParsePool; the next shared_parse_pool() call starts a new one."""
+    with _parse_pools_lock:
+        pools = list(_parse_pools.values())
+        _parse_pools.clear()
+    for pool in pools:
+        pool.close(wait)
+
+
+def is_html(content_type):
+    """Return True if a Content-Type header describes an HTML document (or is missing)."""
+    if not content_type:
+        return True
+    return content_type.split(";")[0].strip().lower() in HTML_CONTENT_TYPES
+
+
+def header_charset(content_type):
+    """Return the charset declared in a Content-Type header, if any."""
+    for param in content_type.split(";")[1:]:
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "charset" and value.strip():
+            return value.strip().strip('"\'')
+    return None
+
+
+def read_head(response, max_bytes=MAX_HEAD_BYTES, deadline=None, stop_event=None):
+    """Stream a response body into one buffer until the head has ended; return (head, bytes_read).
+
+    Chunks are appended to a single bytearray, which goes to the parser as it is. Reading ends
+    with whatever arrived so far once `stop_event` is set, and raises PageTimeout once the
+    monotonic `deadline` passes, since a head cut short there is not the page.
+    """
+    head = bytearray()
+    bytes_read = 0
+    for chunk in response.iter_content(CHUNK_SIZE):
+        search_from = max(0, len(head) - HEAD_END_OVERLAP)
+        head += chunk
+        bytes_read += len(chunk)
+        match = HEAD_END_RE.search(head, search_from)
+        if match:
+            del head[match.end():]  # The parser only needs the head
+            break
+        if len(head) >= max_bytes:
+            break
+        if stop_event and stop_event.is_set():
+            response.close()  # Cut off the body; the connection cannot be reused anyway
+            return head, bytes_read
+        if deadline and time.monotonic() > deadline:
+            response.close()
+            raise PageTimeout(f"Head not complete within the page timeout ({bytes_read} bytes received)")
+    _drain_small_remainder(response)
+    return head, bytes_read
+
+
+def extract_metadata(response, max_bytes=MAX_HEAD_BYTES, metrics=None, deadline=None, stop_event=None, pool=None):
+    """Stream a response body until its head has ended and return its PageMetadata.
+
+    The response must have been requested with stream=True. Non-HTML responses are skipped
+    without reading the body. The head is parsed by `pool` (a ParsePool) if given, else on the
+    calling thread with PARSER_BACKEND. With a Metrics instance, bytes read are counted under
+    "fetch.bytes" and the time spent parsing is recorded under "parse". Raises PageTimeout if the
+    head is still incomplete at `deadline`.
+    """
+    content_type = response.headers.get("Content-Type", "")
+    if not is_html(content_type):
+        return PageMetadata()
+
+    head, bytes_read = read_head(response, max_bytes, deadline, stop_event)
+    start = time.perf_counter()
+    fields = pool.parse(head, content_type) if pool else parse_head(head, content_type)
+    if metrics:
+        metrics.increment("fetch.bytes", bytes_read)
+        metrics.observe("parse", time.perf_counter() - start)
+    return PageMetadata(**fields)
+
+
+def _drain_small_remainder(response):
+    """Finish reading short bodies so the keep-alive connection can be reused."""
+    content_length = response.headers.get("Content-Length")
+    if not content_length or not content_length.isdigit():
+        return
+    remaining = int(content_length) - response.raw.tell()
+    if 0 < remaining <= DRAIN_LIMIT:
+        for _ in response.iter_content(CHUNK_SIZE):
+            pass
@@ -0,0 +1,154 @@
+import bisect
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency bucket upper bounds in seconds: 1 ms to ~2 min, 25% apart
+BUCKET_BOUNDS = [0.001 * 1.25 ** i for i in range(53)]
+
+# Counters turned into per-second rates in snapshots, keyed by the name they are reported under
+THROUGHPUT_COUNTERS = {
+    "keywords_per_second": "keywords.generated",
+    "searches_per_second": "search.calls",
+    "pages_per_second": "fetch.pages",
+    "bytes_per_second": "fetch.bytes",
+    "unique_urls_per_second": "urls.unique",
+}
+
+
+class Histogram:
+    """Fixed log-spaced buckets; cheap to update and good enough for p50/p99."""
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """Return the upper bound of the bucket holding the q-th quantile (0 < q <= 1)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bucket, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= target:
+                return min(BUCKET_BOUNDS[bucket], self.max) if bucket < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
+
+
+class Metrics:
+    """Thread-safe counters and latency histograms shared by every stage of a scrape.
+
+    Stage latencies are recorded under "generate", "generate.model", "search", "fetch" and
+    "parse", network setup under "dns", "connect" and "tls"; counters use dotted names such as "fetch.bytes" or "page_cache.hits".
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.monotonic()
+            self.counters = defaultdict(float)
+            self.histograms = defaultdict(Histogram)
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def observe(self, name, seconds):
+        with self.lock:
+            self.histograms[name].observe(seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """Record how long the with-block took under `name`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        """Return a JSON-serializable view of every counter, rate and latency summary."""
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            counters = dict(self.counters)
+            latency = {name: histogram.summary() for name, histogram in self.histograms.items()}
+
+        throughput = {
+            rate: counters.get(counter, 0) / elapsed if elapsed else 0.0
+            for rate, counter in THROUGHPUT_COUNTERS.items()
+        }
+        model_seconds = latency.get("generate.model", {}).get("mean", 0.0) * latency.get("generate.model", {}).get("count", 0)
+        throughput["tokens_per_second"] = counters.get("generate.tokens", 0) / model_seconds if model_seconds else 0.0
+        searches = counters.get("search.calls", 0)
+        throughput["unique_urls_per_search"] = counters.get("urls.unique", 0) / searches if searches else 0.0
+
+        return {
+            "elapsed_seconds": elapsed,
+            "counters": counters,
+            "throughput": throughput,
+            "hit_rates": {
+                "page_cache": _ratio(counters, "page_cache.hits", "page_cache.misses"),
+                "serp_cache": _ratio(counters, "serp_cache.hits", "serp_cache.misses"),
+                "dns_cache": _ratio(counters, "dns_cache.hits", "dns_cache.misses"),
+                "connection_reuse": _connection_reuse(counters),
+            },
+            "latency": latency,
+        }
+
+
+def _ratio(counters, hits, misses):
+    total = counters.get(hits, 0) + counters.get(misses, 0)
+    return counters.get(hits, 0) / total if total else 0.0
+
+
+def _connection_reuse(counters):
+    """Share of page requests that did not wait for a connection of their own to be opened.
+
+    Connections opened ahead by the prewarmer count as reused: the request found them ready.
+    """
+    requests = counters.get("fetch.requests", 0)
+    opened = counters.get("connections.opened", 0) - counters.get("connections.prewarmed", 0)
+    return max(0.0, 1 - opened / requests) if requests else 0.0
+
+
+def serve_metrics(metrics, port, host="127.0.0.1"):
+    """Serve `metrics.snapshot()` as JSON on http://host:port/ from a daemon thread."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(metrics.snapshot(), indent=2).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Keep scrape output clean
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
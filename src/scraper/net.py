@@ -0,0 +1,292 @@
+import ipaddress
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from scraper.metrics import Metrics
+
+DEFAULT_DNS_TTL = 300  # Seconds a lookup is reused when the resolver does not say (the system resolver never does)
+MIN_DNS_TTL = 30  # Record TTLs are clamped to this range, so a TTL of 0 does not mean a lookup per connection
+MAX_DNS_TTL = 3600
+FAILED_DNS_TTL = 10  # Seconds a failed lookup is remembered, so a dead host does not cost a lookup per URL
+DEFAULT_MAX_REDIRECTS = 5  # Redirects followed per page before it is given up
+MAX_POOLED_HOSTS = 512  # Hosts whose idle connections are kept; beyond that the least recently used host's are closed
+PREWARM_WORKERS = 8  # Threads resolving hosts and opening connections ahead of the fetches
+MAX_PREWARM_QUEUED = 256  # Hosts waiting to be warmed; further ones are skipped rather than warmed too late
+
+
+def _find_resolver_backend():
+    """Use dnspython when installed, for real record TTLs; the system resolver otherwise."""
+    try:
+        import dns.resolver  # noqa: F401
+        return "dnspython"
+    except ImportError:
+        return "system"
+
+
+RESOLVER_BACKEND = _find_resolver_backend()
+
+
+def _is_ip_address(host):
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+
+
+def _lookup_system(host, port):
+    """Return (addresses, ttl) from getaddrinfo, which honours /etc/hosts but not record TTLs."""
+    return socket.getaddrinfo(host, port, type=socket.SOCK_STREAM), DEFAULT_DNS_TTL
+
+
+def _lookup_dnspython(host, port):
+    import dns.exception
+    import dns.resolver
+
+    addresses = []
+    ttl = None
+    for record_type, family in (("A", socket.AF_INET), ("AAAA", socket.AF_INET6)):
+        try:
+            answer = dns.resolver.resolve(host, record_type, search=True)
+        except dns.exception.DNSException:
+            continue
+        ttl = answer.rrset.ttl if ttl is None else min(ttl, answer.rrset.ttl)
+        sockaddr = (lambda ip: (ip, port)) if family == socket.AF_INET else (lambda ip: (ip, port, 0, 0))
+        addresses += [(family, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", sockaddr(record.to_text())) for record in answer]
+    if not addresses:
+        return _lookup_system(host, port)  # Names only the system knows, such as localhost or /etc/hosts entries
+    return addresses, ttl
+
+
+class DnsCache:
+    """Resolves host names once per TTL and shares the answer with every connection to the host.
+
+    Concurrent lookups of the same host wait for a single query. Failures are remembered for
+    FAILED_DNS_TTL seconds and raised again as socket.gaierror.
+    """
+    def __init__(self):
+        self.entries = {}  # (host, port) -> (expires_at, addresses or gaierror)
+        self.in_flight = {}  # (host, port) -> Future of the lookup under way
+        self.lock = threading.Lock()
+
+    def resolve(self, host, port, metrics=None):
+        """Return getaddrinfo()-style address tuples for host:port."""
+        if _is_ip_address(host):
+            return socket.getaddrinfo(host.strip("[]"), port, type=socket.SOCK_STREAM)  # Nothing to look up
+        key = (host.lower(), port)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                if metrics:
+                    metrics.increment("dns_cache.hits")
+                return self._answer(entry[1])
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self.in_flight[key] = Future()
+        if not owner:
+            if metrics:
+                metrics.increment("dns_cache.hits")
+            return self._answer(future.result())
+
+        if metrics:
+            metrics.increment("dns_cache.misses")
+        start = time.perf_counter()
+        try:
+            lookup = _lookup_dnspython if RESOLVER_BACKEND == "dnspython" else _lookup_system
+            addresses, ttl = lookup(host, port)
+            ttl = min(max(ttl, MIN_DNS_TTL), MAX_DNS_TTL)
+        except socket.gaierror as e:
+            addresses, ttl = e, FAILED_DNS_TTL
+        if metrics:
+            metrics.observe("dns", time.perf_counter() - start)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, addresses)
+            del self.in_flight[key]
+        future.set_result(addresses)
+        return self._answer(addresses)
+
+    @staticmethod
+    def _answer(addresses):
+        if isinstance(addresses, socket.gaierror):
+            raise addresses
+        return addresses
+
+
+_dns_cache = DnsCache()
+
+
+def shared_dns_cache():
+    """Return the process-wide DnsCache, shared by every fetch engine and job."""
+    return _dns_cache
+
+
+def _connection_classes(dns_cache, metrics):
+    """Return urllib3 (HTTPConnectionPool, HTTPSConnectionPool) subclasses whose connections go
+    through `dns_cache` and record their connect and TLS handshake times to `metrics`.
+
+    Overrides urllib3 2.x internals (`_new_conn`, `_dns_host`), hence the urllib3>=2 requirement.
+    """
+    from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+
+    class CachedDnsConnection(HTTPConnection):
+        connect_seconds = 0.0  # DNS cache lookup and TCP handshake time of the latest connect()
+
+        def _new_conn(self):
+            start = time.perf_counter()
+            try:
+                addresses = dns_cache.resolve(self._dns_host, self.port, metrics)
+            except socket.gaierror as e:
+                raise NameResolutionError(self.host, self, e) from e
+
+            error = OSError("getaddrinfo returned no address")
+            for family, socktype, proto, _, sockaddr in addresses:
+                sock = socket.socket(family, socktype, proto)
+                try:
+                    for option in self.socket_options or ():
+                        sock.setsockopt(*option)
+                    if self.timeout is None or isinstance(self.timeout, (int, float)):
+                        sock.settimeout(self.timeout)
+                    if self.source_address:
+                        sock.bind(self.source_address)
+                    sock.connect(sockaddr)
+                except OSError as e:
+                    sock.close()
+                    error = e  # Try the host's next address
+                    continue
+                self.connect_seconds = time.perf_counter() - start
+                metrics.observe("connect", self.connect_seconds)
+                metrics.increment("connections.opened")
+                return sock
+
+            if isinstance(error, socket.timeout):
+                raise ConnectTimeoutError(
+                    self, f"Connection to {self.host} timed out. (connect timeout={self.timeout})"
+                ) from error
+            raise NewConnectionError(self, f"Failed to establish a new connection: {error}") from error
+
+    class CachedDnsHTTPSConnection(CachedDnsConnection, HTTPSConnection):
+        def connect(self):
+            start = time.perf_counter()
+            super().connect()
+            metrics.observe("tls", max(0.0, time.perf_counter() - start - self.connect_seconds))
+
+    class CachedDnsPool(HTTPConnectionPool):
+        ConnectionCls = CachedDnsConnection
+
+    class CachedDnsHTTPSPool(HTTPSConnectionPool):
+        ConnectionCls = CachedDnsHTTPSConnection
+
+    return CachedDnsPool, CachedDnsHTTPSPool
+
+
+def create_session(pool_size, metrics=None, dns_cache=None, max_redirects=DEFAULT_MAX_REDIRECTS):
+    """Return a requests.Session for fetching pages from many hosts.
+
+    Connections are pooled per host (`pool_size` each, for up to MAX_POOLED_HOSTS hosts, since
+    a SERP spreads over many hosts) and reused across keywords, host names go
+    through `dns_cache` (the shared one by default), every compression urllib3 can decode is
+    offered (brotli and zstd too once `brotli` / `zstandard` are installed) and at most
+    `max_redirects` redirects are followed. Connect and TLS handshake times are recorded under
+    "connect" and "tls", DNS lookups under "dns".
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util import make_headers
+
+    metrics = metrics or Metrics()
+    pool_classes = _connection_classes(dns_cache or shared_dns_cache(), metrics)
+
+    class CachedDnsAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super().init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = {"http": pool_classes[0], "https": pool_classes[1]}
+
+    session = requests.Session()
+    session.headers["Accept"] = "text/html,application/xhtml+xml;q=0.9,*/*;q=0.1"
+    session.headers["Accept-Encoding"] = make_headers(accept_encoding=True)["accept-encoding"]
+    session.max_redirects = max_redirects
+    adapter = CachedDnsAdapter(pool_connections=MAX_POOLED_HOSTS, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class Prewarmer:
+    """Resolves hosts and opens pooled connections to them before their pages are fetched.
+
+    `warm(urls)` returns at once; a few background threads then look up each new host and, if
+    its connection pool has no idle connection, connect (TLS included) and leave the connection
+    in the pool for the fetch that follows. `should_connect(url)`, if given, runs first on the
+    same thread and can veto the connection; the fetch engine uses it to skip cached pages and to
+    load robots.txt ahead, which warms the pool too.
+    """
+    def __init__(self, session, timeout, metrics=None, should_connect=None, workers=PREWARM_WORKERS):
+        self.session = session
+        self.timeout = timeout
+        self.metrics = metrics or Metrics()
+        self.should_connect = should_connect
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prewarm")
+        self.queued = set()  # Origins waiting for or being warmed
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def warm(self, urls):
+        """Warm the origins of `urls` in the background, one connection each."""
+        for url in urls:
+            try:
+                parts = urlsplit(url)
+                origin = (parts.scheme, (parts.hostname or "").lower(), parts.port)
+            except ValueError:
+                continue  # Malformed; its fetch reports the error
+            with self.lock:
+                if self.closed or origin in self.queued or len(self.queued) >= MAX_PREWARM_QUEUED:
+                    continue
+                self.queued.add(origin)
+            self.executor.submit(self._warm, url, origin)
+
+    def _warm(self, url, origin):
+        try:
+            if self.should_connect and not self.should_connect(url):
+                return
+            if not self.closed:
+                self._connect(url)
+        except Exception:
+            self.metrics.increment("connections.prewarm_errors")  # The fetch will try again and count its own error
+        finally:
+            with self.lock:
+                self.queued.discard(origin)
+
+    def _connect(self, url):
+        # Reaches into the pool like urllib3 2.x's urlopen() does, and needs requests>=2.32 for the TLS-aware pool lookup
+        import requests
+
+        settings = self.session.merge_environment_settings(url, {}, None, None, None)
+        if settings["proxies"].get(urlsplit(url).scheme):
+            return  # The connection would go to the proxy
+        adapter = self.session.get_adapter(url)
+        request = requests.Request("GET", url).prepare()
+        # Built from the same TLS settings as the request's, so this is the pool the fetch will use
+        pool = adapter.get_connection_with_tls_context(request, settings["verify"], cert=settings["cert"])
+        if pool.pool is None or pool.pool.empty():
+            return  # Closed, or every connection is already in use
+        conn = pool._get_conn(timeout=0)
+        try:
+            if not conn.is_connected:
+                conn.timeout = self.timeout
+                conn.connect()
+                self.metrics.increment("connections.prewarmed")
+        except Exception:
+            conn.close()
+            raise
+        finally:
+            pool._put_conn(conn)
+
+    def close(self):
+        self.closed = True
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,502 @@
+import heapq
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError, wait
+
+from scraper.adaptive import YieldTracker, DEFAULT_MIN_YIELD, REDIRECT, STOP
+from scraper.dedup import normalize_query
+from scraper.keywords import DEFAULT_BATCH_SIZE
+from scraper.metrics import Metrics
+from scraper.search import RateLimitError
+from scraper.urls import UrlIndex
+
+DEFAULT_QUEUE_SIZE = 8  # Max items waiting between two stages
+QUEUE_REPORT_INTERVAL = 0.5  # Seconds between ("queues", depths) events
+POLL_INTERVAL = 0.1  # Seconds a blocked stage waits before re-checking for a stop request
+MAX_REJECTION_RATIO = 3  # Give up regenerating after this many rejected keywords per requested keyword
+SEARCH_DEFER_DELAY = 30  # Seconds a rate-limited keyword waits before its next attempt, times the attempts so far
+MAX_SEARCH_ATTEMPTS = 5  # Rate-limited attempts before a keyword is skipped (a resumed run tries it again)
+DEFAULT_GENERATE_TIMEOUT = 120  # Seconds one generate call may take before it is cut short
+DEFAULT_SEARCH_TIMEOUT = 180  # Seconds one search may take, rate-limit backoff included, before the keyword is deferred
+
+_DONE = object()  # Sentinel a stage puts on its output queue when it has nothing more to send
+
+
+class StageTimeout(Exception):
+    """Raised when a blocking call made by a stage runs past its deadline."""
+
+
+class ScrapePipeline:
+    """Runs keyword generation, SERP lookup and page fetching as overlapping stages.
+
+    The stages are joined by bounded queues, so a slow stage pushes back on the one before it
+    instead of letting work pile up. `run()` yields (event, value) tuples to a single consumer:
+
+    - ("keyword", keyword) when a keyword has been generated
+    - ("serp", (keyword, urls)) when a keyword's result URLs are known
+    - ("result", (record_id, url, title, meta_description, keywords, extra)) once per distinct page,
+      extra being a dict of the other head fields found (canonical, og_title, lang...)
+    - ("keyword_attached", (record_id, keyword)) when a page that was already emitted
+      turns up again for another keyword
+    - ("keyword_done", keyword) once every page for a keyword has been fetched
+    - ("queues", depths) periodically, see `queue_depths()`
+    - ("error", message) for problems that do not abort the run
+
+    A keyword whose search stays rate limited is set aside and retried later while the other
+    keywords carry on; after MAX_SEARCH_ATTEMPTS it is skipped with an ("error", ...) event.
+
+    `stop()` takes effect within about POLL_INTERVAL: generate and search calls run on helper
+    threads that the stages stop waiting for, generation is interrupted through the stop_event
+    passed to `generate_keywords`, and queued fetches are cancelled. A generate call is cut short
+    after `generate_timeout` seconds and a search after `search_timeout` (the keyword is deferred
+    like a rate-limited one). With `deadline`, the whole run stops after that many seconds.
+
+    URL variants (http/https, www., tracking parameters...) are canonicalized so every page is
+    fetched once per run; all keywords that surfaced it are attached to the same record.
+
+    With `adaptive`, a YieldTracker follows how many new unique URLs each keyword's SERP brings.
+    Saturated keywords are passed back to `generate_keywords` as `avoid=[...]`, a sustained drop
+    below `min_yield` steers the next keywords elsewhere, and if that does not help the run stops
+    generating before `keywords_to_generate` with an ("error", ...) event.
+
+    Given a ResumeState from a job journal, the journaled keywords are replayed without being
+    generated again, their journaled SERPs are reused and journaled pages are not refetched.
+
+    Stage latencies and counters go to `metrics`, normally the same Metrics as the fetch engine's.
+    """
+    def __init__(self, description, keywords_to_generate, num_results_per_keyword,
+                 generate_keywords, search, fetch_engine, deduper=None, serp_cache=None, resume=None,
+                 queue_size=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE, metrics=None,
+                 generate_timeout=DEFAULT_GENERATE_TIMEOUT, search_timeout=DEFAULT_SEARCH_TIMEOUT, deadline=None,
+                 adaptive=False, min_yield=DEFAULT_MIN_YIELD):
+        self.description = description
+        self.keywords_to_generate = keywords_to_generate
+        self.num_results_per_keyword = num_results_per_keyword
+        self.generate_keywords = generate_keywords  # (description, count, stop_event=None, avoid=()) -> [keyword]
+        self.search = search  # (keyword, num_results) -> [url]
+        self.fetch_engine = fetch_engine
+        self.deduper = deduper  # Optional KeywordDeduper rejecting near-duplicate keywords
+        self.serp_cache = serp_cache  # Optional SerpCache consulted before searching
+        self.resume = resume  # Optional ResumeState of an earlier attempt at this job
+        self.batch_size = batch_size
+        self.metrics = metrics or Metrics()
+        self.generate_timeout = generate_timeout
+        self.search_timeout = search_timeout
+        self.deadline = deadline  # Seconds the whole run may take, or None
+        self.yield_tracker = YieldTracker(min_yield) if adaptive else None
+
+        self.searches = 0
+        self.searches_saved = 0
+        self.keywords_rejected = 0
+        self.urls_deduplicated = 0
+        self.unique_urls = 0
+        self.stopped_early = False  # Set when the adaptive mode ended keyword generation on low yield
+
+        self.keyword_queue = queue.Queue(maxsize=queue_size)  # keyword
+        self.serp_queue = queue.Queue(maxsize=queue_size)  # (keyword, [url])
+        self.output_queue = queue.Queue(maxsize=queue_size * 16)  # (event, value)
+
+        # Fetches are bounded separately so the fetch pool and its host queues never hold more than max_pending URLs
+        self.fetch_slots = threading.Semaphore(fetch_engine.max_pending)
+        self.fetches_in_flight = 0
+        self.remaining_per_keyword = {}
+        self.url_index = UrlIndex()  # canonical URL -> record id
+        self.next_record_id = 0
+        self.pending_keywords = {}  # record id -> keywords collected while its fetch is in flight
+        self.fetch_futures = {}  # Future -> URL of the fetches submitted and not reaped yet
+        self.lock = threading.Lock()
+
+        self.stop_event = threading.Event()
+        self.deadline_reached = False
+        self.error = None  # First exception raised by a stage; re-raised from run()
+
+        if resume:
+            for record_id, (url, *_) in resume.pages.items():
+                self.url_index.add(url, record_id)
+            self.next_record_id = resume.next_record_id
+
+    def stop(self):
+        """Ask every stage to finish and drop queued fetches; `run()` returns once the stages have drained."""
+        self.stop_event.set()
+        self._cancel_fetches()
+
+    def queue_depths(self):
+        """Return how many items are waiting in front of each stage."""
+        return {
+            "keywords": self.keyword_queue.qsize(),
+            "serp": self.serp_queue.qsize(),
+            "fetch": self.fetches_in_flight,
+            "results": self.output_queue.qsize(),
+        }
+
+    def stats(self):
+        """Return counters describing how much search work the run did and avoided, and what it found."""
+        stats = {
+            "searches": self.searches,
+            "searches_saved": self.searches_saved,
+            "keywords_rejected": self.keywords_rejected,
+            "urls_deduplicated": self.urls_deduplicated,
+            "unique_urls": self.unique_urls,
+            "unique_urls_per_search": self.unique_urls / self.searches if self.searches else 0.0,
+        }
+        if self.yield_tracker:
+            stats.update(self.yield_tracker.stats(), stopped_early=self.stopped_early)
+        return stats
+
+    def run(self):
+        """Start every stage and yield events until the pipeline finishes or is stopped."""
+        threads = [
+            threading.Thread(target=self._stage, args=(self._keyword_stage,), name="keyword-stage", daemon=True),
+            threading.Thread(target=self._stage, args=(self._serp_stage,), name="serp-stage", daemon=True),
+            threading.Thread(target=self._stage, args=(self._fetch_stage,), name="fetch-stage", daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+
+        last_report = 0
+        stop_at = time.monotonic() + self.deadline if self.deadline else None
+        try:
+            while True:
+                now = time.monotonic()
+                if stop_at and now >= stop_at and not self.stop_event.is_set():
+                    self.deadline_reached = True
+                    self.stop()
+                    yield "error", f"Stopped at the {self.deadline:g}s deadline."
+                if now - last_report >= QUEUE_REPORT_INTERVAL:
+                    last_report = now
+                    yield "queues", self.queue_depths()
+
+                event = self._get(self.output_queue, ignore_stop=True)
+                if event is _DONE:
+                    break
+                if event is None:
+                    if self.stop_event.is_set() and not any(thread.is_alive() for thread in threads):
+                        break
+                    continue
+                yield event
+        finally:
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+
+        if self.error:
+            raise self.error
+
+    # Stages
+
+    def _stage(self, target):
+        """Run a stage, turning an unexpected exception into a pipeline-wide stop."""
+        try:
+            target()
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+            self.stop_event.set()
+
+    def _keyword_stage(self):
+        generated = 0
+        if self.resume:
+            # Replay keywords from the earlier attempt; they count towards the total
+            for keyword in self.resume.keywords[:self.keywords_to_generate]:
+                if self.deduper:
+                    self.deduper.add(keyword)
+                if not self._put(self.keyword_queue, keyword):
+                    return
+                generated += 1
+
+        max_rejections = self.keywords_to_generate * MAX_REJECTION_RATIO
+        while generated < self.keywords_to_generate and not self.stop_event.is_set():
+            options = {}
+            if self.yield_tracker:
+                # Keywords still waiting for their SERP were chosen before any change of direction
+                decision = self.yield_tracker.decide(pending=self.keyword_queue.qsize() + self.serp_queue.qsize())
+                if decision == STOP:
+                    self.stopped_early = True
+                    self._emit("error", (
+                        f"Stopped after {generated} keywords: the last ones found few new URLs "
+                        f"({self.yield_tracker.marginal_yield():.0%} of their results)."
+                    ))
+                    break
+                if decision == REDIRECT:
+                    self.metrics.increment("keywords.redirects")
+                options["avoid"] = self.yield_tracker.avoid_keywords()
+            count = min(self.batch_size, self.keywords_to_generate - generated)
+            try:
+                with self.metrics.timer("generate"):
+                    keywords = self._call(self.generate_keywords, self.description, count, timeout=self.generate_timeout, **options)
+            except StageTimeout:
+                self._emit("error", f"Keyword generation took longer than {self.generate_timeout:g}s.")
+                break
+            if self.stop_event.is_set():
+                return
+            keywords = [keyword for keyword in keywords or [] if keyword]
+            if not keywords:
+                self._emit("error", "No keyword generated.")
+                break
+            for keyword in keywords:
+                # Near-duplicates are dropped and made up for by the next batch
+                if self.deduper and not self.deduper.accept(keyword):
+                    self.keywords_rejected += 1
+                    self.metrics.increment("keywords.rejected")
+                    continue
+                self.metrics.increment("keywords.generated")
+                self._emit("keyword", keyword)
+                if not self._put(self.keyword_queue, keyword):
+                    return
+                generated += 1
+            if self.keywords_rejected >= max_rejections:
+                self._emit("error", f"Stopped after {generated} distinct keywords; the rest were near-duplicates.")
+                break
+        self._put(self.keyword_queue, _DONE)
+
+    def _serp_stage(self):
+        deferred = []  # Heap of (retry_at, keyword, attempts) for keywords the search provider refused
+        keywords_done = False
+        while not (keywords_done and not deferred):
+            if self.stop_event.is_set():
+                return
+            if deferred and deferred[0][0] <= time.monotonic():
+                _, keyword, attempts = heapq.heappop(deferred)
+            elif keywords_done:
+                time.sleep(POLL_INTERVAL)
+                continue
+            else:
+                try:
+                    keyword = self.keyword_queue.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    continue
+                if keyword is _DONE:
+                    keywords_done = True
+                    continue
+                attempts = 0
+
+            urls = self.resume.serps.get(keyword) if self.resume else None
+            if urls is None:
+                try:
+                    urls = self._search(keyword)
+                except (RateLimitError, StageTimeout) as e:
+                    # Keep the keyword pending and carry on with the others in the meantime
+                    self.metrics.increment("search.timeouts" if isinstance(e, StageTimeout) else "search.rate_limited")
+                    attempts += 1
+                    if attempts >= MAX_SEARCH_ATTEMPTS:
+                        self._emit("error", f"Skipped '{keyword}': {e}")
+                        self._emit("keyword_done", keyword)
+                    else:
+                        delay = max(SEARCH_DEFER_DELAY * attempts, getattr(e, "retry_after", None) or 0)
+                        heapq.heappush(deferred, (time.monotonic() + delay, keyword, attempts))
+                    continue
+                if self.stop_event.is_set():
+                    return
+                self._emit("serp", (keyword, urls))
+            if not self._put(self.serp_queue, (keyword, urls)):
+                return
+        self._put(self.serp_queue, _DONE)
+
+    def _search(self, keyword):
+        """Return the SERP URLs for a keyword, from the cache when possible."""
+        query_key = normalize_query(keyword)
+        if self.serp_cache:
+            urls = self.serp_cache.get(query_key, self.num_results_per_keyword)
+            if urls is not None:
+                self.searches_saved += 1
+                self.metrics.increment("serp_cache.hits")
+                return urls
+            self.metrics.increment("serp_cache.misses")
+
+        try:
+            with self.metrics.timer("search"):
+                urls = self._call(self.search, keyword, self.num_results_per_keyword, timeout=self.search_timeout, stoppable=False)
+        except StageTimeout:
+            raise
+        except Exception:
+            self.metrics.increment("search.errors")
+            raise
+        if urls is None:
+            return []  # Stopped while waiting; the caller sees stop_event and drops this
+        urls = list(urls)
+        self.searches += 1
+        self.metrics.increment("search.calls")
+        self.metrics.increment("search.urls", len(urls))
+        if self.serp_cache:
+            self.serp_cache.put(query_key, self.num_results_per_keyword, urls)
+        return urls
+
+    def _fetch_stage(self):
+        while True:
+            item = self._get(self.serp_queue)
+            if item is None or item is _DONE:
+                break
+            keyword, urls = item
+
+            new_urls = self._index_urls(keyword, urls)
+            if not new_urls:
+                self._emit("keyword_done", keyword)
+                continue
+            # Look up hosts and open connections while the URLs wait for a fetch slot and their host's turn
+            self.fetch_engine.prewarm([url for _, url in new_urls])
+
+            for record_id, url in new_urls:
+                if not self._acquire_fetch_slot():
+                    break
+                with self.lock:
+                    self.fetches_in_flight += 1
+                future = self.fetch_engine.submit_url(url, self._fetch_one, record_id, url, keyword)
+                with self.lock:
+                    self.fetch_futures[future] = url
+            self._reap_fetches()
+
+        # Let the last fetches land before telling the consumer we are done, still answering a stop
+        with self.lock:
+            not_done = list(self.fetch_futures)
+        while not_done and not self.stop_event.is_set():
+            _, not_done = wait(not_done, timeout=POLL_INTERVAL)
+        if self.stop_event.is_set():
+            self._cancel_fetches()
+            return
+        self._reap_fetches()
+        self._put(self.output_queue, _DONE)
+
+    def _reap_fetches(self):
+        """Forget the finished fetches, reporting the ones that raised instead of dropping their error."""
+        with self.lock:
+            done = {future: url for future, url in self.fetch_futures.items() if future.done()}
+            for future in done:
+                del self.fetch_futures[future]
+        for future, url in done.items():
+            if future.cancelled():
+                continue
+            error = future.exception()
+            if error is not None:
+                self.metrics.increment("fetch.errors")
+                self._emit("error", f"Fetching {url} failed: {error}")
+
+    def _cancel_fetches(self):
+        """Cancel this pipeline's fetches that have not started; other jobs sharing the engine keep theirs."""
+        with self.lock:
+            futures, self.fetch_futures = list(self.fetch_futures), {}
+        self.fetch_engine.cancel(futures)
+
+    def _index_urls(self, keyword, urls):
+        """Attach the keyword to pages already seen and return (record_id, url) for the new ones."""
+        new_urls = []
+        attached = []
+        with self.lock:
+            for url in urls:
+                record_id = self.url_index.get(url)
+                if record_id is None:
+                    record_id = self.next_record_id
+                    self.next_record_id += 1
+                    self.url_index.add(url, record_id)
+                    self.pending_keywords[record_id] = [keyword]
+                    new_urls.append((record_id, url))
+                    continue
+
+                self.urls_deduplicated += 1
+                if record_id in self.pending_keywords:
+                    if keyword not in self.pending_keywords[record_id]:
+                        self.pending_keywords[record_id].append(keyword)
+                else:
+                    attached.append(record_id)
+            if new_urls:
+                self.remaining_per_keyword[keyword] = self.remaining_per_keyword.get(keyword, 0) + len(new_urls)
+            self.unique_urls += len(new_urls)
+
+        self.metrics.increment("urls.unique", len(new_urls))
+        if self.yield_tracker and not (self.resume and keyword in self.resume.serps):
+            # Replayed SERPs were already counted by the earlier attempt and now find nothing new
+            self.yield_tracker.record(keyword, len(new_urls), len(urls))
+
+        for record_id in attached:
+            self._emit("keyword_attached", (record_id, keyword))
+        return new_urls
+
+    def _fetch_one(self, record_id, url, keyword):
+        try:
+            if self.stop_event.is_set():
+                return
+            page = self.fetch_engine.get_page_metadata(url)
+            with self.lock:
+                keywords = list(self.pending_keywords[record_id])
+            # The record stays pending while the result is emitted, so keywords found meanwhile are
+            # collected rather than sent as keyword_attached ahead of it
+            self._emit("result", (record_id, url, page.title, page.description, keywords, page.extra()))
+            with self.lock:
+                late_keywords = self.pending_keywords.pop(record_id)[len(keywords):]
+                self.remaining_per_keyword[keyword] -= 1
+                keyword_done = self.remaining_per_keyword[keyword] == 0
+            for late_keyword in late_keywords:
+                self._emit("keyword_attached", (record_id, late_keyword))
+            if keyword_done:
+                self._emit("keyword_done", keyword)
+        finally:
+            with self.lock:
+                self.fetches_in_flight -= 1
+            self.fetch_slots.release()
+
+    def _call(self, fn, *args, timeout=None, stoppable=True, **kwargs):
+        """Run a blocking call on its own thread and return its result, or None once the pipeline stops.
+
+        Keyword arguments are passed on to fn. With `stoppable`, fn also gets a stop_event keyword
+        argument that is set on stop or when the timeout passes, so it can cut its work short. Otherwise a stopped or timed-out call is
+        left to finish on its thread and its result is dropped. Raises StageTimeout after
+        `timeout` seconds.
+        """
+        future = Future()
+        cancel = threading.Event()
+        if stoppable:
+            kwargs["stop_event"] = cancel
+
+        def run():
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        threading.Thread(target=run, name=f"{threading.current_thread().name}-call", daemon=True).start()
+        give_up_at = time.monotonic() + timeout if timeout else None
+        while not self.stop_event.is_set():
+            wait = POLL_INTERVAL
+            if give_up_at:
+                wait = min(wait, give_up_at - time.monotonic())
+                if wait <= 0:
+                    cancel.set()
+                    raise StageTimeout(f"no answer within {timeout:g}s")
+            try:
+                return future.result(timeout=wait)
+            except FutureTimeoutError:
+                continue
+        cancel.set()
+        return None
+
+    # Queue helpers that give up when the pipeline is stopped
+
+    def _emit(self, event, value):
+        return self._put(self.output_queue, (event, value))
+
+    def _put(self, q, item):
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q, ignore_stop=False):
+        """Return the next item, or None on timeout (consumer) / stop (stages)."""
+        while ignore_stop or not self.stop_event.is_set():
+            try:
+                return q.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if ignore_stop:
+                    return None
+        return None
+
+    def _acquire_fetch_slot(self):
+        while not self.stop_event.is_set():
+            if self.fetch_slots.acquire(timeout=POLL_INTERVAL):
+                return True
+        return False
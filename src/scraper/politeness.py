@@ -0,0 +1,266 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+DEFAULT_HOST_CONCURRENCY = 2  # Requests in flight to one host at a time
+DEFAULT_HOST_DELAY = 0.25  # Minimum seconds between two requests starting on the same host
+MAX_HOST_DELAY = 60  # Cap on the adaptive per-host delay
+MAX_QUEUED_URLS = 5000  # URLs the scheduler holds across every host queue
+LATENCY_SMOOTHING = 0.3  # Weight of the newest response time in a host's moving average
+TARGET_HOST_CONCURRENCY = 2.0  # Adaptive delay aims for about this many requests per response time
+THROTTLE_BACKOFF = 2.0  # Factor a host's delay grows by on 429/503 or a failed request
+THROTTLE_STATUSES = (429, 503)
+ROBOTS_TTL = 24 * 60 * 60  # Seconds a host's robots.txt is trusted before it is fetched again
+ROBOTS_USER_AGENT = "*"
+ROBOTS_DISALLOWED = "Disallowed by robots.txt"  # Description reported for pages robots.txt rules out
+
+
+def host_of(url):
+    """Return the host[:port] that per-host state and robots.txt are kept under."""
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+        return f"{host}:{parts.port}" if parts.port else host  # robots.txt applies to one port
+    except ValueError:
+        return ""  # Malformed URLs share one queue; their fetch fails on its own
+
+
+class RobotsCache:
+    """Fetches each host's robots.txt once per ROBOTS_TTL over the fetch engine's session."""
+    def __init__(self, session, timeout):
+        self.session = session
+        self.timeout = timeout
+        self.entries = {}  # host_of(url) -> (fetched_at, RobotFileParser)
+        self.host_locks = {}
+        self.lock = threading.Lock()
+
+    def parser_for(self, url):
+        """Return the RobotFileParser for a URL's host, fetching robots.txt if needed."""
+        parts = urlsplit(url)
+        host = host_of(url)  # Same key as the HostScheduler's state
+        with self.lock:
+            host_lock = self.host_locks.setdefault(host, threading.Lock())
+        with host_lock:  # One fetch per host even when several of its pages start at once
+            entry = self.entries.get(host)
+            if entry and time.time() - entry[0] < ROBOTS_TTL:
+                return entry[1]
+            parser = self._fetch(f"{parts.scheme}://{parts.netloc}/robots.txt")
+            self.entries[host] = (time.time(), parser)
+            return parser
+
+    def _fetch(self, robots_url):
+        parser = RobotFileParser(robots_url)
+        try:
+            response = self.session.get(robots_url, timeout=self.timeout)
+        except Exception:
+            parser.allow_all = True  # Unreachable robots.txt: behave as if there were none
+            return parser
+        # Same conventions as RobotFileParser.read(): 401/403 forbid everything, other errors allow everything
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif response.status_code >= 400 or "html" in response.headers.get("Content-Type", ""):
+            parser.allow_all = True
+        else:
+            parser.parse(response.text.splitlines())
+        parser.modified()
+        return parser
+
+    def can_fetch(self, url):
+        return self.parser_for(url).can_fetch(ROBOTS_USER_AGENT, url)
+
+    def crawl_delay(self, url):
+        parser = self.parser_for(url)
+        delay = parser.crawl_delay(ROBOTS_USER_AGENT)
+        rate = parser.request_rate(ROBOTS_USER_AGENT)
+        if rate and rate.requests:
+            delay = max(delay or 0, rate.seconds / rate.requests)
+        return float(delay or 0)
+
+
+class HostState:
+    """Queue and pacing state of one host."""
+    __slots__ = ("host", "queue", "active", "next_start", "delay", "min_delay", "latency", "answered", "fetched", "errors",
+                 "throttled")
+
+    def __init__(self, host, min_delay):
+        self.host = host
+        self.queue = deque()  # (future, fn, args)
+        self.active = 0
+        self.next_start = 0.0  # Monotonic time the next request may start
+        self.delay = min_delay
+        self.min_delay = min_delay  # Configured delay, raised by the host's crawl-delay
+        self.latency = None  # Moving average of response times
+        self.answered = False  # Set by the host's first response, or a robots.txt that disallowed a URL
+        self.fetched = 0
+        self.errors = 0
+        self.throttled = 0
+
+
+class HostScheduler:
+    """Sits in front of the fetch pool and hands out work host by host.
+
+    Each host gets its own queue, at most `host_concurrency` requests in flight and at least
+    `delay` seconds between request starts. A dispatcher thread walks the hosts that have work
+    round-robin and keeps up to `max_active` requests running overall, so one domain that fills
+    a SERP cannot starve the others. The delay adapts to what each host reports back through
+    `observe()`: it tracks the host's smoothed response time divided by TARGET_HOST_CONCURRENCY,
+    doubles on 429/503 and errors, and never drops below the configured delay or the host's
+    robots.txt crawl-delay.
+    """
+    def __init__(self, executor, max_active, host_concurrency=DEFAULT_HOST_CONCURRENCY, delay=DEFAULT_HOST_DELAY,
+                 robots=None, max_queued=MAX_QUEUED_URLS):
+        self.executor = executor
+        self.max_active = max_active
+        self.host_concurrency = host_concurrency
+        self.delay = delay
+        self.robots = robots  # Optional RobotsCache
+        self.max_queued = max_queued
+
+        self.hosts = {}  # host -> HostState
+        self.rotation = deque()  # HostStates with queued work, in round-robin order
+        self.queued = 0
+        self.active = 0
+        self.condition = threading.Condition()
+        self.closed = False
+        self.dispatcher = threading.Thread(target=self._dispatch_loop, name="host-scheduler", daemon=True)
+        self.dispatcher.start()
+
+    def submit(self, url, fn, *args):
+        """Queue fn(*args) behind the other requests to url's host and return a Future for its result."""
+        future = Future()
+        with self.condition:
+            host = host_of(url)
+            state = self.hosts.get(host)
+            if state is None:
+                state = self.hosts[host] = HostState(host, self.delay)
+            if not state.queue:
+                self.rotation.append(state)
+            state.queue.append((future, fn, args))
+            self.queued += 1
+            self.condition.notify()
+        return future
+
+    def allowed(self, url):
+        """Return False if the host's robots.txt forbids the URL; also applies its crawl-delay."""
+        if not self.robots:
+            return True
+        crawl_delay = self.robots.crawl_delay(url)
+        allowed = self.robots.can_fetch(url)
+        with self.condition:
+            state = self.hosts.get(host_of(url))
+            if state and not allowed:
+                state.answered = True  # No response will be observed for this URL, but robots.txt did answer
+            if state and crawl_delay > state.min_delay:
+                state.min_delay = min(crawl_delay, MAX_HOST_DELAY)
+                state.delay = max(state.delay, state.min_delay)
+                state.next_start = max(state.next_start, time.monotonic() + state.delay)  # This request is about to start
+        return allowed
+
+    def observe(self, url, seconds, status=None, failed=False):
+        """Feed one request's response time and outcome back into its host's delay."""
+        with self.condition:
+            state = self.hosts.get(host_of(url))
+            if state is None:
+                return
+            state.fetched += 1
+            state.answered = True
+            if failed or status in THROTTLE_STATUSES:
+                if failed:
+                    state.errors += 1
+                else:
+                    state.throttled += 1
+                state.delay = min(MAX_HOST_DELAY, max(state.delay, self.delay, 0.1) * THROTTLE_BACKOFF)
+                return
+
+            state.latency = seconds if state.latency is None else (
+                LATENCY_SMOOTHING * seconds + (1 - LATENCY_SMOOTHING) * state.latency
+            )
+            # Move halfway towards the latency-based target, like AutoThrottle, and stay above the floor
+            target = state.latency / TARGET_HOST_CONCURRENCY
+            state.delay = min(MAX_HOST_DELAY, max(state.min_delay, (state.delay + target) / 2))
+
+    def host_stats(self):
+        """Return per-host queue depth, requests in flight, current delay and outcome counts."""
+        with self.condition:
+            return {
+                host: {
+                    "queued": len(state.queue), "active": state.active, "delay": state.delay,
+                    "latency": state.latency, "fetched": state.fetched, "errors": state.errors,
+                    "throttled": state.throttled,
+                }
+                for host, state in self.hosts.items()
+            }
+
+    def discard_cancelled(self):
+        """Drop queued requests whose Future was cancelled, so they no longer hold a place in their host's queue."""
+        with self.condition:
+            for state in self.hosts.values():
+                kept = deque(entry for entry in state.queue if not entry[0].cancelled())
+                self.queued -= len(state.queue) - len(kept)
+                state.queue = kept
+            self.rotation = deque(state for state in self.rotation if state.queue)
+            self.condition.notify()
+
+    def close(self):
+        """Stop dispatching and cancel everything still queued."""
+        with self.condition:
+            self.closed = True
+            for state in self.hosts.values():
+                for future, _, _ in state.queue:
+                    future.cancel()
+                state.queue.clear()
+            self.rotation.clear()
+            self.queued = 0
+            self.condition.notify()
+
+    def _dispatch_loop(self):
+        with self.condition:
+            while not self.closed:
+                wait = self._dispatch_ready()
+                self.condition.wait(wait)
+
+    def _dispatch_ready(self):
+        """Start queued requests whose host has room, round-robin; return how long to sleep."""
+        now = time.monotonic()
+        while True:  # Pass over the hosts again while any of them could start something
+            wait = None
+            started = False
+            for _ in range(len(self.rotation)):
+                if self.active >= self.max_active:
+                    return None  # A finishing request wakes the dispatcher
+                state = self.rotation.popleft()
+                # A new host gets one request until it has answered, which also loads its robots.txt
+                limit = self.host_concurrency if state.answered else 1
+                if state.active >= limit or state.next_start > now:
+                    if state.active < limit:
+                        wait = min(wait or state.next_start - now, state.next_start - now)
+                    self.rotation.append(state)
+                    continue
+
+                future, fn, args = state.queue.popleft()
+                self.queued -= 1
+                started = True
+                if state.queue:
+                    self.rotation.append(state)  # Back of the line until every other host had its turn
+                if not future.set_running_or_notify_cancel():
+                    continue  # Cancelled while queued
+                state.active += 1
+                self.active += 1
+                state.next_start = now + state.delay
+                self.executor.submit(self._run, state, future, fn, args)
+            if not started:
+                return wait
+
+    def _run(self, state, future, fn, args):
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.condition:
+                state.active -= 1
+                self.active -= 1
+                self.condition.notify()
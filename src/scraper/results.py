@@ -0,0 +1,209 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+
+DEFAULT_MAX_RESULT_MEMORY = 256 * 1024 * 1024  # Bytes of rows kept in memory before the oldest spill to disk
+ROW_OVERHEAD = 120  # Approximate bytes a row costs beyond its strings: column slots and its keyword tuple
+SPILL_FRACTION = 0.5  # Share of the in-memory rows moved to disk once the ceiling is reached
+BLOCK_ROWS = 256  # Spilled rows read back from disk together
+CACHED_BLOCKS = 8  # Spilled blocks kept in memory, so scrolling or exporting does not hit SQLite per row
+
+
+def _close_spill(connection, path):
+    connection.close()
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class ResultStore:
+    """Pages found by a scrape, stored by column with interned keywords and a memory ceiling.
+
+    Rows are addressed by the index `add()` returns, in arrival order. Each column is a plain list
+    and a row's keywords are a tuple of ids into `keyword_names`, so a keyword shared by a thousand
+    pages is stored once. When the estimated size of the in-memory rows passes `max_memory`, the
+    oldest half moves to a temporary SQLite file and is read back a block at a time on demand;
+    memory then stays flat however many pages a campaign finds.
+
+    A row can carry a tag, the ID of the campaign job that found it, so the jobs of a campaign can
+    share one store.
+
+    Safe to use from several threads: a scrape job appends on its worker thread while the table
+    and exports read.
+    """
+    def __init__(self, max_memory=DEFAULT_MAX_RESULT_MEMORY, spill_dir=None):
+        self.max_memory = max_memory
+        self.spill_dir = spill_dir  # Directory for the spill file; the system temp directory if None
+        self.lock = threading.RLock()
+
+        # In-memory rows, the newest ones: index `spilled + i` is at position i
+        self.urls = []
+        self.titles = []
+        self.descriptions = []
+        self.keyword_ids = []  # Per row: tuple of ids into keyword_names
+        self.tags = []  # Per row: campaign job ID or None; one string object per job, so only a pointer per row
+        self.memory = 0  # Estimated bytes held by the in-memory rows
+        self.spilled = 0  # Rows [0, spilled) live in the spill file
+
+        self.keyword_names = []
+        self.keyword_lookup = {}  # keyword -> id
+
+        self.spill = None
+        self.spill_path = None
+        self.finalizer = None
+        self.blocks = OrderedDict()  # block number -> spilled rows, least recently used first
+
+    def __len__(self):
+        return self.spilled + len(self.urls)
+
+    def add(self, url, title, description, keywords, tag=None):
+        """Append a page and return its row index."""
+        with self.lock:
+            ids = tuple(dict.fromkeys(self._keyword_id(keyword) for keyword in keywords))
+            self.urls.append(url)
+            self.titles.append(title)
+            self.descriptions.append(description)
+            self.keyword_ids.append(ids)
+            self.tags.append(tag)
+            self.memory += self._row_size(url, title, description, ids)
+            if self.memory > self.max_memory and len(self.urls) > 1:
+                self._spill_oldest()
+            return len(self) - 1
+
+    def attach(self, index, keyword):
+        """Add a keyword to a row; return False if the row already had it."""
+        with self.lock:
+            keyword_id = self._keyword_id(keyword)
+            ids = self._row(index)[3]
+            if keyword_id in ids:
+                return False
+            ids += (keyword_id,)
+            if index >= self.spilled:
+                self.keyword_ids[index - self.spilled] = ids
+                self.memory += 8
+            else:
+                self.spill.execute("UPDATE rows SET keywords = ? WHERE idx = ?", (",".join(map(str, ids)), index))
+                self.blocks.pop(index // BLOCK_ROWS, None)
+            return True
+
+    def page(self, index):
+        """Return (url, title, description, keywords) for a row, keywords as a list."""
+        with self.lock:
+            url, title, description, ids, _ = self._row(index)
+            return url, title, description, [self.keyword_names[keyword_id] for keyword_id in ids]
+
+    def row(self, index):
+        """Return (url, title, description, keywords, tag) for a row, keywords joined into one string."""
+        with self.lock:
+            url, title, description, ids, tag = self._row(index)
+            return url, title, description, ", ".join(self.keyword_names[keyword_id] for keyword_id in ids), tag or ""
+
+    def cell(self, index, column):
+        return self.row(index)[column]
+
+    def rows(self, indexes=None):
+        """Return an iterator of row() for the given row indexes, or every row in arrival order.
+
+        Without indexes, the rows present when this is called are returned, so the iterator can
+        be consumed on another thread while more arrive.
+        """
+        if indexes is None:
+            indexes = range(len(self))
+        return (self.row(index) for index in indexes)
+
+    def pages(self):
+        """Yield page() for every row in arrival order."""
+        for index in range(len(self)):
+            yield self.page(index)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "rows": len(self), "in_memory": len(self.urls), "spilled": self.spilled,
+                "memory_bytes": self.memory, "keywords": len(self.keyword_names),
+            }
+
+    def close(self):
+        """Drop the spill file; the in-memory rows stay readable."""
+        with self.lock:
+            if self.finalizer:
+                self.finalizer()
+
+    def _keyword_id(self, keyword):
+        keyword_id = self.keyword_lookup.get(keyword)
+        if keyword_id is None:
+            keyword_id = self.keyword_lookup[keyword] = len(self.keyword_names)
+            self.keyword_names.append(keyword)
+        return keyword_id
+
+    @staticmethod
+    def _row_size(url, title, description, ids):
+        return sys.getsizeof(url) + sys.getsizeof(title) + sys.getsizeof(description) + ROW_OVERHEAD + 8 * len(ids)
+
+    def _row(self, index):
+        if index < 0 or index >= len(self):
+            raise IndexError(index)
+        if index >= self.spilled:
+            position = index - self.spilled
+            return (
+                self.urls[position], self.titles[position], self.descriptions[position], self.keyword_ids[position],
+                self.tags[position]
+            )
+
+        block = index // BLOCK_ROWS
+        rows = self.blocks.get(block)
+        if rows is None:
+            start = block * BLOCK_ROWS
+            rows = [
+                (url, title, description, tuple(map(int, keywords.split(","))) if keywords else (), tag)
+                for url, title, description, keywords, tag in self.spill.execute(
+                    "SELECT url, title, description, keywords, tag FROM rows WHERE idx >= ? AND idx < ? ORDER BY idx",
+                    (start, start + BLOCK_ROWS)
+                )
+            ]
+            self.blocks[block] = rows
+            if len(self.blocks) > CACHED_BLOCKS:
+                self.blocks.popitem(last=False)
+        else:
+            self.blocks.move_to_end(block)
+        return rows[index - block * BLOCK_ROWS]
+
+    def _open_spill(self):
+        fd, self.spill_path = tempfile.mkstemp(prefix="results-", suffix=".sqlite", dir=self.spill_dir)
+        os.close(fd)
+        self.spill = sqlite3.connect(self.spill_path, check_same_thread=False, isolation_level=None)
+        self.spill.execute("PRAGMA journal_mode=OFF")  # Scratch data: nothing to recover after a crash
+        self.spill.execute("PRAGMA synchronous=OFF")
+        self.spill.execute(
+            "CREATE TABLE rows (idx INTEGER PRIMARY KEY, url TEXT, title TEXT, description TEXT, keywords TEXT, tag TEXT)"
+        )
+        # Removes the file when the store is closed or garbage collected, whichever comes first
+        self.finalizer = weakref.finalize(self, _close_spill, self.spill, self.spill_path)
+
+    def _spill_oldest(self):
+        """Move the oldest SPILL_FRACTION of the in-memory rows to the spill file."""
+        if self.spill is None:
+            self._open_spill()
+        count = max(1, int(len(self.urls) * SPILL_FRACTION))
+        moved = zip(
+            self.urls[:count], self.titles[:count], self.descriptions[:count], self.keyword_ids[:count], self.tags[:count]
+        )
+        self.spill.execute("BEGIN")
+        self.spill.executemany(
+            "INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?)",
+            ((self.spilled + i, url, title, description, ",".join(map(str, ids)), tag)
+             for i, (url, title, description, ids, tag) in enumerate(moved))
+        )
+        self.spill.execute("COMMIT")
+        for position in range(count):
+            self.memory -= self._row_size(
+                self.urls[position], self.titles[position], self.descriptions[position], self.keyword_ids[position]
+            )
+        del self.urls[:count], self.titles[:count], self.descriptions[:count], self.keyword_ids[:count], self.tags[:count]
+        self.spilled += count
+        self.blocks.clear()  # The last cached block may have been cut short by the old boundary
@@ -0,0 +1,181 @@
+import random
+import threading
+import time
+
+DEFAULT_SEARCH_BACKEND = "google"
+DEFAULT_SEARCH_RATE = 0.5  # Queries per second the limiter starts at and never exceeds
+DEFAULT_SEARCH_BURST = 2  # Queries that may go out back to back after an idle spell
+MIN_SEARCH_RATE = 0.02  # Floor the adaptive rate backs off to (one query every 50 s)
+RATE_INCREASE = 0.05  # Share of the configured rate won back after each successful query
+RATE_DECREASE = 0.5  # Factor the rate is cut by on every 429/503
+BASE_BACKOFF = 2  # Seconds before the first retry of a rate-limited query
+MAX_BACKOFF = 120  # Cap on the wait between retries
+MAX_RETRIES = 4  # Retries inside one call before the query is handed back to the caller
+RETRY_STATUSES = (429, 503)
+
+
+class RateLimitError(Exception):
+    """Raised when a search provider keeps refusing a query; the query can be retried later."""
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after  # Seconds the provider asked us to wait, if it said
+
+
+def google_search(keyword, num_results):
+    """Return the result URLs Google lists for a keyword."""
+    from googlesearch import search  # Imported lazily so headless tools start fast
+
+    return list(search(keyword, num_results=num_results))
+
+
+class SearchBackend:
+    """A search provider: `search(keyword, num_results)` returns result URLs in rank order.
+
+    Backends are callables with the same signature, so anything that takes a plain search
+    function (ScrapePipeline, ScrapeJob) takes a backend too. Subclasses raise RateLimitError,
+    or let an exception with a 429/503 `response` through, when the provider throttles them.
+    """
+    name = None
+
+    def search(self, keyword, num_results):
+        raise NotImplementedError
+
+    def __call__(self, keyword, num_results):
+        return self.search(keyword, num_results)
+
+
+class GoogleSearchBackend(SearchBackend):
+    """Scrapes Google through the googlesearch package."""
+    name = "google"
+
+    def search(self, keyword, num_results):
+        return google_search(keyword, num_results)
+
+
+SEARCH_BACKENDS = {}  # name -> SearchBackend subclass
+
+
+def register_backend(backend_class):
+    """Make a SearchBackend subclass available by its name (usable as a class decorator)."""
+    SEARCH_BACKENDS[backend_class.name] = backend_class
+    return backend_class
+
+
+register_backend(GoogleSearchBackend)
+
+
+def get_backend(name=DEFAULT_SEARCH_BACKEND, **options):
+    if name not in SEARCH_BACKENDS:
+        raise ValueError(f"Unknown search backend: {name} (available: {', '.join(sorted(SEARCH_BACKENDS))})")
+    return SEARCH_BACKENDS[name](**options)
+
+
+def rate_limit_delay(error):
+    """Return (is_rate_limited, retry_after) for an exception raised by a backend."""
+    if isinstance(error, RateLimitError):
+        return True, error.retry_after
+    response = getattr(error, "response", None)
+    if getattr(response, "status_code", None) not in RETRY_STATUSES:
+        return False, None
+    retry_after = response.headers.get("Retry-After", "")
+    return True, float(retry_after) if retry_after.isdigit() else None
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`."""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def drain(self):
+        """Drop saved-up tokens so nothing bursts out right after a ban."""
+        with self.lock:
+            self.tokens = 0
+            self.updated = time.monotonic()
+
+
+class RateLimitedSearch:
+    """Paces queries to a backend with a token bucket whose rate adapts to the provider.
+
+    Every 429/503 halves the rate and retries the query after an exponential backoff with jitter
+    (or the provider's Retry-After); every success wins back a little of the configured rate. This
+    settles just under the provider's limit instead of alternating bursts and bans. After
+    `max_retries` failed retries the call raises RateLimitError so the caller can keep the query
+    pending and come back to it.
+    """
+    def __init__(self, backend, rate=DEFAULT_SEARCH_RATE, burst=DEFAULT_SEARCH_BURST, max_retries=MAX_RETRIES):
+        self.backend = backend
+        self.max_rate = rate
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate, burst)
+        self.lock = threading.Lock()
+        self.rate_limited = 0  # Queries refused by the provider
+        self.retries = 0
+
+    @property
+    def rate(self):
+        return self.bucket.rate
+
+    def __call__(self, keyword, num_results):
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                urls = self.backend(keyword, num_results)
+            except Exception as e:
+                limited, retry_after = rate_limit_delay(e)
+                if not limited:
+                    raise
+                self._slow_down()
+                if attempt >= self.max_retries:
+                    raise RateLimitError(f"Search for '{keyword}' is still rate limited after {attempt} retries", retry_after) from e
+                backoff = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt) * random.uniform(0.5, 1)
+                time.sleep(max(backoff, retry_after or 0))
+                attempt += 1
+                with self.lock:
+                    self.retries += 1
+                continue
+            self._speed_up()
+            return urls
+
+    def _slow_down(self):
+        with self.lock:
+            self.rate_limited += 1
+            self.bucket.rate = max(MIN_SEARCH_RATE, self.bucket.rate * RATE_DECREASE)
+        self.bucket.drain()
+
+    def _speed_up(self):
+        with self.lock:
+            self.bucket.rate = min(self.max_rate, self.bucket.rate + self.max_rate * RATE_INCREASE)
+
+    def stats(self):
+        return {"rate": self.rate, "rate_limited": self.rate_limited, "retries": self.retries}
+
+
+_default_searches = {}
+_default_searches_lock = threading.Lock()
+
+
+def default_search(name=DEFAULT_SEARCH_BACKEND, rate=DEFAULT_SEARCH_RATE):
+    """Return the process-wide rate-limited search for a backend, so jobs share what it has learned."""
+    with _default_searches_lock:
+        key = (name, rate)
+        if key not in _default_searches:
+            _default_searches[key] = RateLimitedSearch(get_backend(name), rate=rate)
+        return _default_searches[key]
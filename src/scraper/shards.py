@@ -0,0 +1,307 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+
+from scraper.cache import default_cache_path
+from scraper.urls import canonicalize_url
+
+DEFAULT_KEYWORDS_PER_SHARD = 10
+DEFAULT_LEASE_SECONDS = 300  # A worker that has not renewed its lease for this long is presumed dead
+DEFAULT_MAX_ATTEMPTS = 3  # Leases handed out for one shard before it is marked failed
+IDLE_POLL_INTERVAL = 2  # Seconds a worker waits before asking again when every shard is leased
+# SQLite's WAL and file locks are not reliable on these, so leases would stop being exclusive
+NETWORK_FILESYSTEMS = frozenset(("nfs", "nfs4", "cifs", "smb3", "smbfs", "9p", "afs", "ceph", "glusterfs", "fuse.sshfs"))
+
+# Shard statuses
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+def default_queue_path():
+    return default_cache_path("shards.sqlite")
+
+
+def filesystem_type(path):
+    """Return the type of the filesystem holding path, from /proc/mounts, or None where that is unavailable."""
+    try:
+        with open("/proc/mounts", encoding="utf-8") as mounts:
+            entries = [line.split()[1:3] for line in mounts]
+    except OSError:
+        return None
+    path = os.path.realpath(os.path.dirname(os.path.abspath(path)))
+    best, fstype = "", None
+    for mount_point, mount_type in entries:
+        mount_point = mount_point.replace("\\040", " ")
+        inside = path == mount_point or path.startswith(mount_point.rstrip("/") + "/")
+        if inside and len(mount_point) >= len(best):
+            best, fstype = mount_point, mount_type
+    return fstype
+
+
+def worker_id():
+    """Return an id naming this process and machine, for lease ownership."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def split_job(description, keywords, results, keywords_per_shard=DEFAULT_KEYWORDS_PER_SHARD):
+    """Split one description into shard specs of at most keywords_per_shard keywords each."""
+    specs = []
+    for start in range(0, keywords, keywords_per_shard):
+        specs.append({
+            "description": description,
+            "keywords": min(keywords_per_shard, keywords - start),
+            "results": results,
+        })
+    return specs
+
+
+class ShardQueue:
+    """SQLite-backed work queue of scrape shards with lease-based retry.
+
+    A coordinator adds shards; any number of worker processes on the same machine `claim()` a
+    shard, renew the lease while they work and `complete()` it with the pages found. A shard whose
+    lease expires (the worker died or hung) goes back to the queue and is handed to the next
+    worker that asks, up to `max_attempts` leases.
+
+    Claims rely on SQLite's locking, which only holds between processes of one host: a queue file
+    on a network filesystem (NFS, SMB...) is refused with ValueError. To spread a campaign over
+    several machines, give each its own queue and split the jobs between them.
+    """
+    def __init__(self, path=None, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path or default_queue_path()
+        fstype = filesystem_type(self.path)
+        if fstype in NETWORK_FILESYSTEMS:
+            raise ValueError(f"Shard queue {self.path} is on a {fstype} filesystem; keep it on a local disk")
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Autocommit mode; writes that must be atomic across processes open their own IMMEDIATE transaction
+        self.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS shards (
+                shard_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                campaign TEXT NOT NULL,
+                spec TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                lease_expires REAL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                finished_at REAL
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS shards_status ON shards (status, lease_expires)")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                shard_id INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                title TEXT,
+                description TEXT,
+                keywords TEXT NOT NULL
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS results_shard ON results (shard_id)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.connection.execute("INSERT OR IGNORE INTO meta VALUES ('queue_id', ?)", (uuid.uuid4().hex[:8],))
+        self.queue_id = self.connection.execute("SELECT value FROM meta WHERE name = 'queue_id'").fetchone()[0]
+
+    @contextmanager
+    def transaction(self):
+        """Hold the database write lock for the block so no other process can claim in between."""
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def add(self, campaign, specs):
+        """Queue shard specs ({"description", "keywords", "results"}) under a campaign name."""
+        now = time.time()
+        with self.transaction():
+            self.connection.executemany(
+                "INSERT INTO shards (campaign, spec, status, created_at) VALUES (?, ?, ?, ?)",
+                [(campaign, json.dumps(spec), PENDING, now) for spec in specs]
+            )
+        return len(specs)
+
+    def claim(self, owner):
+        """Lease the oldest available shard to owner and return (shard_id, campaign, spec), or None."""
+        now = time.time()
+        with self.transaction():
+            while True:
+                row = self.connection.execute(
+                    "SELECT shard_id, campaign, spec, attempts FROM shards "
+                    "WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY shard_id LIMIT 1",
+                    (PENDING, LEASED, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                shard_id, campaign, spec, attempts = row
+                if attempts < self.max_attempts:
+                    break
+                # Its last lease expired too; stop handing it out
+                self.connection.execute(
+                    "UPDATE shards SET status = ?, error = COALESCE(error, 'lease expired'), finished_at = ? WHERE shard_id = ?",
+                    (FAILED, now, shard_id)
+                )
+            self.connection.execute(
+                "UPDATE shards SET status = ?, owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE shard_id = ?",
+                (LEASED, owner, now + self.lease_seconds, shard_id)
+            )
+        return shard_id, campaign, json.loads(spec)
+
+    def renew(self, shard_id, owner):
+        """Extend owner's lease on a shard; return False if the lease was lost to another worker."""
+        cursor = self.connection.execute(
+            "UPDATE shards SET lease_expires = ? WHERE shard_id = ? AND owner = ? AND status = ?",
+            (time.time() + self.lease_seconds, shard_id, owner, LEASED)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, shard_id, owner, pages):
+        """Store a shard's (url, title, description, keywords) pages and mark it done.
+
+        Returns False, storing nothing, if the lease had already passed to another worker.
+        """
+        with self.transaction():
+            cursor = self.connection.execute(
+                "UPDATE shards SET status = ?, finished_at = ?, error = NULL WHERE shard_id = ? AND owner = ? AND status = ?",
+                (DONE, time.time(), shard_id, owner, LEASED)
+            )
+            if cursor.rowcount != 1:
+                return False
+            self.connection.execute("DELETE FROM results WHERE shard_id = ?", (shard_id,))
+            self.connection.executemany(
+                "INSERT INTO results VALUES (?, ?, ?, ?, ?)",
+                [(shard_id, url, title, description, json.dumps(keywords)) for url, title, description, keywords in pages]
+            )
+        return True
+
+    def fail(self, shard_id, owner, error):
+        """Give a shard back after an error; it is retried until it has used up its attempts."""
+        with self.transaction():
+            self.connection.execute(
+                "UPDATE shards SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, owner = NULL, "
+                "lease_expires = NULL, error = ?, finished_at = ? WHERE shard_id = ? AND owner = ? AND status = ?",
+                (self.max_attempts, FAILED, PENDING, error, time.time(), shard_id, owner, LEASED)
+            )
+
+    def release(self, shard_id, owner):
+        """Hand a shard back untouched, e.g. when its worker is stopped."""
+        self.connection.execute(
+            "UPDATE shards SET status = ?, owner = NULL, lease_expires = NULL, attempts = MAX(attempts - 1, 0) "
+            "WHERE shard_id = ? AND owner = ? AND status = ?",
+            (PENDING, shard_id, owner, LEASED)
+        )
+
+    def status(self):
+        """Return {campaign: {status: count, "pages": count}}."""
+        campaigns = {}
+        for campaign, status, count in self.connection.execute(
+            "SELECT campaign, status, COUNT(*) FROM shards GROUP BY campaign, status"
+        ):
+            campaigns.setdefault(campaign, {})[status] = count
+        for campaign, count in self.connection.execute(
+            "SELECT campaign, COUNT(*) FROM results JOIN shards USING (shard_id) GROUP BY campaign"
+        ):
+            campaigns.setdefault(campaign, {})["pages"] = count
+        return campaigns
+
+    def has_open_shards(self):
+        """Return True while any shard is pending or leased."""
+        return self.connection.execute(
+            "SELECT 1 FROM shards WHERE status IN (?, ?) LIMIT 1", (PENDING, LEASED)
+        ).fetchone() is not None
+
+    def iter_results(self, campaign=None):
+        """Yield (url, title, description, keywords) merged across shards by canonical URL.
+
+        Shards of one description generate keywords independently, so the same page can come back
+        from several of them; it is returned once, with every keyword that found it.
+        """
+        query = "SELECT url, title, description, keywords FROM results JOIN shards USING (shard_id)"
+        params = ()
+        if campaign:
+            query += " WHERE campaign = ?"
+            params = (campaign,)
+        merged = {}  # canonical URL -> [url, title, description, keywords]
+        for url, title, description, keywords in self.connection.execute(query + " ORDER BY results.shard_id, results.rowid", params):
+            page = merged.get(canonicalize_url(url))
+            if page is None:
+                merged[canonicalize_url(url)] = [url, title, description, json.loads(keywords)]
+                continue
+            for keyword in json.loads(keywords):
+                if keyword not in page[3]:
+                    page[3].append(keyword)
+        for url, title, description, keywords in merged.values():
+            yield url, title, description, keywords
+
+    def close(self):
+        self.connection.close()
+
+
+def run_worker(queue, generate_keywords, job_options=None, owner=None, stop_when_idle=True, log=print):
+    """Claim and run shards until the queue has nothing left to do; return how many were completed.
+
+    Each shard runs as a ScrapeJob journaled under a stable id, so a shard retried on the same
+    machine resumes instead of starting over. The lease is renewed while the job reports progress.
+    """
+    from scraper.job import ScrapeJob
+
+    owner = owner or worker_id()
+    job_options = job_options or {}
+    completed = 0
+    while True:
+        claimed = queue.claim(owner)
+        if claimed is None:
+            if stop_when_idle and not queue.has_open_shards():
+                return completed
+            time.sleep(IDLE_POLL_INTERVAL)
+            continue
+
+        shard_id, campaign, spec = claimed
+        log(f"[{owner}] shard {shard_id} ({campaign}): {spec['keywords']} keywords")
+        job = ScrapeJob(
+            spec["description"], spec["keywords"], spec["results"], generate_keywords,
+            job_id=f"shard-{queue.queue_id}-{shard_id}", **job_options
+        )
+        last_renewal = time.monotonic()
+        try:
+            for event, value in job.run():
+                if event == "queues" and time.monotonic() - last_renewal > queue.lease_seconds / 3:
+                    last_renewal = time.monotonic()
+                    if not queue.renew(shard_id, owner):
+                        log(f"[{owner}] lost the lease on shard {shard_id}")
+                        job.stop()
+        except KeyboardInterrupt:
+            job.results.close()
+            queue.release(shard_id, owner)
+            raise
+        except Exception as e:
+            job.results.close()
+            log(f"[{owner}] shard {shard_id} failed: {e}")
+            queue.fail(shard_id, owner, str(e))
+            continue
+
+        rows = list(job.results.pages())
+        job.results.close()
+        if job.is_interrupted:
+            continue
+        if job.deadline_reached:
+            # Only part of the shard was scraped: give it back so it is finished, resuming from the journal here
+            log(f"[{owner}] shard {shard_id} stopped at its deadline with {len(rows)} pages")
+            queue.fail(shard_id, owner, f"Stopped at the {job.deadline:g}s deadline")
+            continue
+        if not queue.complete(shard_id, owner, rows):
+            continue
+        completed += 1
+        log(f"[{owner}] shard {shard_id} done: {len(rows)} pages")
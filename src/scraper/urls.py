@@ -0,0 +1,68 @@
+import hashlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Query parameters that only track where a click came from and never change the page
+TRACKING_PARAMS = frozenset((
+    "gclid", "dclid", "fbclid", "msclkid", "yclid", "mc_cid", "mc_eid", "igshid", "_ga", "_hsenc", "_hsmi", "ref_src",
+))
+
+
+def is_tracking_param(name):
+    name = name.lower()
+    return name.startswith("utm_") or name in TRACKING_PARAMS
+
+
+def canonicalize_url(url):
+    """Return one canonical form for the variants of a URL that point at the same page.
+
+    http/https, a leading "www.", default ports, a trailing slash, tracking parameters,
+    query parameter order and the fragment are all normalized away. A malformed URL (a bad port
+    or an unclosed IPv6 bracket) is returned stripped but otherwise as it is, so its fetch fails
+    on its own instead of taking the job down.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url.strip()
+    scheme = parts.scheme.lower()
+    if scheme == "http":
+        scheme = "https"
+
+    host = (parts.hostname or "").rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    netloc = host
+    if port and port not in DEFAULT_PORTS.values():
+        netloc = f"{host}:{port}"
+
+    path = parts.path.rstrip("/") or "/"
+
+    query = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if not is_tracking_param(name)]
+    query.sort()
+
+    return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+
+def url_hash(url):
+    """Return a 64-bit hash of a URL's canonical form."""
+    digest = hashlib.blake2b(canonicalize_url(url).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class UrlIndex:
+    """Maps canonical URLs to record ids, keeping only a 64-bit hash per URL in memory."""
+    def __init__(self):
+        self.ids = {}
+
+    def get(self, url):
+        """Return the record id for a URL (in any of its variants), or None."""
+        return self.ids.get(url_hash(url))
+
+    def add(self, url, record_id):
+        self.ids[url_hash(url)] = record_id
+
+    def __len__(self):
+        return len(self.ids)
@@ -1,13 +1,45 @@
 from PyQt5.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QHeaderView, QPushButton, QLabel, QSpinBox, QTextEdit, QScrollArea, QProgressBar, QTableWidget, QTableWidgetItem, QFileDialog
+    QWidget, QVBoxLayout, QHBoxLayout, QHeaderView, QPushButton, QLabel, QSpinBox, QTextEdit, QScrollArea, QProgressBar, QTableView, QLineEdit, QFileDialog
 )
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt5.QtWidgets import QApplication
-import csv
+from ui.results_model import ResultTableModel, ResultFilterProxy, HEADERS
+from scraper.export import export_rows, format_for_path, TAIL_FORMATS
+
+EXPORT_FILTERS = "CSV Files (*.csv);;JSON Lines (*.jsonl);;Parquet Files (*.parquet)"
+TAIL_FILTERS = "CSV Files (*.csv);;JSON Lines (*.jsonl)"
+JOBS_FILTERS = "JSON Lines (*.jsonl);;All Files (*)"
+FILTER_FORMATS = {"CSV Files (*.csv)": "csv", "JSON Lines (*.jsonl)": "jsonl", "Parquet Files (*.parquet)": "parquet"}
+METRIC_STAGES = ("generate", "search", "fetch", "dns", "connect", "tls", "parse")  # Latency rows shown in the stats panel
+
+class ExportWorkerSignals(QObject):
+    """Defines the signals available from a running export thread."""
+    finished = pyqtSignal(str)  # Signal with a summary once the file is written
+    error = pyqtSignal(str)     # Signal to send error messages
+
+class ExportWorker(QRunnable):
+    """Writes rows to a file on a background thread so the table stays responsive."""
+    def __init__(self, rows, file_name, fmt):
+        super().__init__()
+        self.rows = rows
+        self.file_name = file_name
+        self.fmt = fmt
+        self.signals = ExportWorkerSignals()
+
+    def run(self):
+        try:
+            written = export_rows(self.rows, self.file_name, self.fmt, HEADERS)
+        except Exception as e:
+            self.signals.error.emit(f"Export failed: {str(e)}")
+            return
+        self.signals.finished.emit(f"Exported {written} rows to {self.file_name}")
 
 class ContentPanel(QWidget):
     def __init__(self):
         super().__init__()
+        self.threadpool = QThreadPool.globalInstance()
+        self.tail_path = None  # File that rows are appended to while scraping, if chosen
+        self.adaptive = False  # Steer keywords by the yield of new URLs and stop early when it runs dry
         self.initUI()
 
     def initUI(self):
@@ -126,6 +158,14 @@ class ContentPanel(QWidget):
             }
         """)
 
+        # Resume Button, finishes the last stopped or crashed job from its journal
+        self.resume_button = QPushButton('RESUME LAST JOB')
+        self.resume_button.setStyleSheet(self.scrape_button.styleSheet())
+
+        # Campaign Button, runs every description of a JSONL jobs file side by side
+        self.campaign_button = QPushButton('RUN CAMPAIGN FROM FILE')
+        self.campaign_button.setStyleSheet(self.scrape_button.styleSheet())
+
         # Copy URLs Button
         self.copy_button = QPushButton('COPY URLS')
         self.copy_button.setStyleSheet("""
@@ -145,8 +185,8 @@ class ContentPanel(QWidget):
         """)
         self.copy_button.clicked.connect(self.copy_urls_to_clipboard)
 
-        # Export to CSV Button
-        self.export_button = QPushButton('EXPORT TO CSV')
+        # Export Button
+        self.export_button = QPushButton('EXPORT')
         self.export_button.setStyleSheet("""
             QPushButton {
                 background-color: #4CAF50;  /* Initial background color */
@@ -162,10 +202,10 @@ class ContentPanel(QWidget):
                 background-color: #3d8c40;  /* Darker green when pressed */
             }
         """)
-        self.export_button.clicked.connect(self.export_to_csv)
+        self.export_button.clicked.connect(self.export_results)
 
-        # Export Selected to CSV Button
-        self.export_selected_button = QPushButton('EXPORT SELECTED TO CSV')
+        # Export Selected Button
+        self.export_selected_button = QPushButton('EXPORT SELECTED')
         self.export_selected_button.setStyleSheet("""
             QPushButton {
                 background-color: #4CAF50;  /* Initial background color */
@@ -181,12 +221,29 @@ class ContentPanel(QWidget):
                 background-color: #3d8c40;  /* Darker green when pressed */
             }
         """)
-        self.export_selected_button.clicked.connect(self.export_selected_to_csv)
-
-        # Search Results Table with 4 columns (URL, Title, Description, keyword)
-        self.result_table = QTableWidget()
-        self.result_table.setColumnCount(4)
-        self.result_table.setHorizontalHeaderLabels(["URL", "TITLE", "DESCRIPTION", "KEYWORD"])
+        self.export_selected_button.clicked.connect(self.export_selected)
+
+        # Live Export Button, appends rows to a file while scraping
+        self.tail_button = QPushButton('LIVE EXPORT: OFF')
+        self.tail_button.setStyleSheet(self.export_selected_button.styleSheet())
+        self.tail_button.clicked.connect(self.toggle_live_export)
+
+        # Adaptive Keywords Button, toggles yield-driven keyword generation
+        self.adaptive_button = QPushButton('ADAPTIVE KEYWORDS: OFF')
+        self.adaptive_button.setStyleSheet(self.export_selected_button.styleSheet())
+        self.adaptive_button.clicked.connect(self.toggle_adaptive)
+
+        # Search Results Table with 4 columns (URL, Title, Description, keyword), backed by a model
+        # so rows can stream in while the scrape runs
+        self.result_model = ResultTableModel(self)
+        self.result_proxy = ResultFilterProxy(self)
+        self.result_proxy.setSourceModel(self.result_model)
+
+        self.result_table = QTableView()
+        self.result_table.setModel(self.result_proxy)
+        self.result_table.setSortingEnabled(True)
+        self.result_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)  # Keep arrival order until a header is clicked
+        self.result_table.verticalHeader().setDefaultSectionSize(24)  # Fixed row height, no per-row measuring
 
         # Make all columns even in width
         header = self.result_table.horizontalHeader()
@@ -196,6 +253,12 @@ class ContentPanel(QWidget):
         self.result_table.setSelectionMode(self.result_table.MultiSelection)  # Enable multi-row selection
         self.result_table.setStyleSheet("color: white; font-weight: bold; font-size: 11px; background-color: #222;")  # Set table text to white
 
+        # Filter field for the results table
+        self.filter_input = QLineEdit(self)
+        self.filter_input.setPlaceholderText("Filter results")
+        self.filter_input.setStyleSheet("color: white; background-color: #333; border: 1px solid #555; padding: 5px;")
+        self.filter_input.textChanged.connect(self.result_proxy.set_filter_text)
+
         # Scrollable Result Area
         self.result_area = QScrollArea(self)
         self.result_area.setWidget(self.result_table)
@@ -230,6 +293,31 @@ class ContentPanel(QWidget):
         """)
         self.stop_button.setEnabled(False)  # Disable initially
 
+        # Add model loading label
+        self.model_label = QLabel(self)
+        self.model_label.setStyleSheet("color: #FFA500; font-weight: bold;")
+        self.model_label.setText("")  # Initially empty
+
+        # Add current keyword label
+        self.keyword_status_label = QLabel(self)
+        self.keyword_status_label.setStyleSheet("color: white; font-weight: bold;")
+        self.keyword_status_label.setText("")  # Initially empty
+
+        # Add pipeline queue depth label
+        self.queue_label = QLabel(self)
+        self.queue_label.setStyleSheet("color: white; font-weight: bold;")
+        self.queue_label.setText("")  # Initially empty
+
+        # Add run statistics label
+        self.stats_label = QLabel(self)
+        self.stats_label.setStyleSheet("color: white; font-weight: bold;")
+        self.stats_label.setText("")  # Initially empty
+
+        # Add per-stage performance panel
+        self.metrics_label = QLabel(self)
+        self.metrics_label.setStyleSheet("color: white; font-family: monospace; font-size: 11px; font-weight: normal;")
+        self.metrics_label.setText("")  # Initially empty
+
         # Add error label
         self.error_label = QLabel(self)
         self.error_label.setStyleSheet("color: red; font-weight: bold;")
@@ -241,105 +329,172 @@ class ContentPanel(QWidget):
         layout.addLayout(result_layout)
         layout.addLayout(description_layout)
         layout.addWidget(self.scrape_button)
+        layout.addWidget(self.resume_button)  # Add the Resume button below the scrape button
+        layout.addWidget(self.campaign_button)  # Add the Campaign button below the Resume button
+        layout.addWidget(self.adaptive_button)  # Add the Adaptive Keywords toggle below the Resume button
+        layout.addWidget(self.model_label)  # Add the model loading state below the scrape button
         layout.addWidget(self.copy_button)  # Add the Copy URLs button
         layout.addWidget(self.export_button)  # Add the Export to CSV button
-        layout.addWidget(self.export_selected_button)  # Add the Export Selected to CSV button
+        layout.addWidget(self.export_selected_button)  # Add the Export Selected button
+        layout.addWidget(self.tail_button)  # Add the Live Export button
+        layout.addWidget(self.filter_input)  # Add the filter field above the results
         layout.addWidget(self.result_area)
         layout.addWidget(self.progress_bar)
+        layout.addWidget(self.keyword_status_label)  # Add the latest keyword below the progress bar
+        layout.addWidget(self.queue_label)  # Add the queue depths below the latest keyword
+        layout.addWidget(self.stats_label)  # Add the run statistics below the queue depths
+        layout.addWidget(self.metrics_label)  # Add the stage latencies below the run statistics
         layout.addWidget(self.stop_button)  # Add the Export Selected to CSV button
         layout.addWidget(self.error_label)  # Add the error label below progress bar
 
         # Set the layout for the content panel
         self.setLayout(layout)
 
-    def display_results(self, results):
-        """Display the scraped results in the table."""
-        self.result_table.setRowCount(len(results))
-        for row, (url, title, description, keyword) in enumerate(results):
-            self.result_table.setItem(row, 0, QTableWidgetItem(url))
-            self.result_table.setItem(row, 1, QTableWidgetItem(title))
-            self.result_table.setItem(row, 2, QTableWidgetItem(description))
-            self.result_table.setItem(row, 3, QTableWidgetItem(keyword))
+    def clear_results(self, store=None):
+        """Remove every row from the results table and show the rows of a new ResultStore as they arrive."""
+        self.result_model.set_store(store)
+        self.keyword_status_label.setText("")
+
+    def append_results(self, indexes):
+        """Append a batch of rows, given by their index in the store, to the table."""
+        self.result_model.append_rows(indexes)
+
+    def attach_keywords(self, indexes):
+        """Refresh rows, given by store index, that gained keywords."""
+        self.result_model.attach_keywords(indexes)
+
+    def selected_source_rows(self):
+        """Return the model row numbers of the selected table rows."""
+        selected_rows = self.result_table.selectionModel().selectedRows()
+        return sorted(self.result_proxy.mapToSource(index).row() for index in selected_rows)
+
+    def set_model_loading(self, loading):
+        """Disable scraping and show a notice while the keyword model loads."""
+        self.model_label.setText("MODEL LOADING..." if loading else "")
+        self.model_label.setVisible(loading)
+        self.scrape_button.setEnabled(not loading)
+        self.resume_button.setEnabled(not loading)
+        self.campaign_button.setEnabled(not loading)
+
+    def display_keyword(self, keyword):
+        """Show the keyword most recently generated."""
+        self.keyword_status_label.setText(f"KEYWORD: {keyword}")
+
+    def display_queue_depths(self, depths):
+        """Show how much work is waiting in front of each pipeline stage."""
+        self.queue_label.setText(
+            f"KEYWORDS QUEUED: {depths['keywords']}   "
+            f"SERPS QUEUED: {depths['serp']}   "
+            f"FETCHES IN FLIGHT: {depths['fetch']}"
+        )
+
+    def display_stats(self, stats):
+        """Show cache hit rates and how many searches were avoided."""
+        page_cache = stats.get("page_cache")
+        text = (
+            f"SEARCHES: {stats['searches']}   "
+            f"SEARCHES SAVED: {stats['searches_saved']}   "
+            f"DUPLICATE KEYWORDS REJECTED: {stats['keywords_rejected']}   "
+            f"DUPLICATE URLS SKIPPED: {stats['urls_deduplicated']}"
+        )
+        if page_cache:
+            text += f"   PAGE CACHE HIT RATE: {page_cache['hit_rate']:.0%}"
+        if "unique_urls" in stats:
+            text += f"\nUNIQUE URLS: {stats['unique_urls']}   PER SEARCH: {stats['unique_urls_per_search']:.1f}"
+        if stats.get("marginal_yield") is not None:
+            text += (
+                f"   RECENT YIELD: {stats['marginal_yield']:.0%}   SATURATED KEYWORDS: {stats['saturated_keywords']}   "
+                f"REDIRECTS: {stats['redirects']}"
+            )
+        self.stats_label.setText(text)
+
+    def display_metrics(self, snapshot):
+        """Show throughput, cache hit rates, error counts and per-stage latencies from a Metrics snapshot."""
+        counters = snapshot["counters"]
+        throughput = snapshot["throughput"]
+        lines = [
+            f"PAGES/S: {throughput['pages_per_second']:.1f}   KEYWORDS/S: {throughput['keywords_per_second']:.2f}   "
+            f"SEARCHES/S: {throughput['searches_per_second']:.2f}   UNIQUE URLS/S: {throughput['unique_urls_per_second']:.1f}   "
+            f"TOKENS/S: {throughput['tokens_per_second']:.0f}   "
+            f"DOWNLOADED: {counters.get('fetch.bytes', 0) / 1e6:.1f} MB ({counters.get('fetch.wire_bytes', 0) / 1e6:.1f} MB on the wire)",
+            f"PAGE CACHE: {snapshot['hit_rates']['page_cache']:.0%}   SERP CACHE: {snapshot['hit_rates']['serp_cache']:.0%}   "
+            f"DNS CACHE: {snapshot['hit_rates']['dns_cache']:.0%}   CONNECTIONS REUSED: {snapshot['hit_rates']['connection_reuse']:.0%}   "
+            f"FETCH ERRORS: {counters.get('fetch.errors', 0):.0f}   TIMEOUTS: {counters.get('fetch.timeouts', 0):.0f}   "
+            f"HTTP ERRORS: {counters.get('fetch.http_errors', 0):.0f}   SEARCH ERRORS: {counters.get('search.errors', 0):.0f}",
+            f"{'STAGE':<10}{'COUNT':>8}{'P50':>10}{'P90':>10}{'P99':>10}{'MAX':>10}",
+        ]
+        for stage in METRIC_STAGES:
+            latency = snapshot["latency"].get(stage)
+            if latency:
+                lines.append(
+                    f"{stage.upper():<10}{latency['count']:>8}" +
+                    "".join(f"{latency[key] * 1000:>8.0f}ms" for key in ("p50", "p90", "p99", "max"))
+                )
+        self.metrics_label.setText("\n".join(lines))
 
     def copy_urls_to_clipboard(self):
         """Copy all URLs from the search results to the clipboard."""
-        urls = []
-        for row in range(self.result_table.rowCount()):
-            url_item = self.result_table.item(row, 0)
-            if url_item:
-                urls.append(url_item.text())
-
         clipboard = QApplication.clipboard()
-        clipboard.setText("\n".join(urls))  # Copy all URLs to the clipboard, separated by newlines
+        clipboard.setText("\n".join(row[0] for row in self.result_model.rows()))  # Copy all URLs to the clipboard, separated by newlines
 
-    def export_to_csv(self):
-        """Export the table data to a CSV file."""
-        # Open a file dialog to save the file
-        options = QFileDialog.Options()
-        file_name, _ = QFileDialog.getSaveFileName(self, "Save CSV", "", "CSV Files (*.csv)", options=options)
+    def export_results(self):
+        """Export every row to a CSV, JSONL or Parquet file."""
+        self.start_export(self.result_model.rows())
 
-        if file_name:
-            # Append .csv if not present
-            if not file_name.endswith(".csv"):
-                file_name += ".csv"
-
-            # Write the data to the CSV file
-            with open(file_name, mode='w', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                
-                # Write the header row
-                writer.writerow(["URL", "TITLE", "DESCRIPTION", "KEYWORD"])
-                
-                # Write the rows from the table
-                for row in range(self.result_table.rowCount()):
-                    url_item = self.result_table.item(row, 0)
-                    title_item = self.result_table.item(row, 1)
-                    description_item = self.result_table.item(row, 2)
-                    keyword_item = self.result_table.item(row, 3)
-
-                    # Write the row data to the CSV file
-                    writer.writerow([
-                        url_item.text() if url_item else "",
-                        title_item.text() if title_item else "",
-                        description_item.text() if description_item else "",
-                        keyword_item.text() if keyword_item else ""
-                    ])
-
-    def export_selected_to_csv(self):
-        """Export the selected rows to a CSV file."""
-        selected_rows = self.result_table.selectionModel().selectedRows()
+    def export_selected(self):
+        """Export the selected rows to a CSV, JSONL or Parquet file."""
+        selected_rows = self.selected_source_rows()
 
         if not selected_rows:
             return  # Exit if no rows are selected
 
+        self.start_export(self.result_model.rows(selected_rows))
+
+    def start_export(self, rows):
+        """Ask for a file name and write the rows to it on a background thread."""
         # Open a file dialog to save the file
         options = QFileDialog.Options()
-        file_name, _ = QFileDialog.getSaveFileName(self, "Save CSV", "", "CSV Files (*.csv)", options=options)
+        file_name, selected_filter = QFileDialog.getSaveFileName(self, "Export", "", EXPORT_FILTERS, options=options)
 
         if file_name:
-            # Append .csv if not present
-            if not file_name.endswith(".csv"):
-                file_name += ".csv"
-
-            # Write the selected data to the CSV file
-            with open(file_name, mode='w', newline='', encoding='utf-8') as file:
-                writer = csv.writer(file)
-                
-                # Write the header row
-                writer.writerow(["URL", "TITLE", "DESCRIPTION", "KEYWORD"])
-                
-                # Write the selected rows
-                for index in selected_rows:
-                    row = index.row()
-                    url_item = self.result_table.item(row, 0)
-                    title_item = self.result_table.item(row, 1)
-                    description_item = self.result_table.item(row, 2)
-                    keyword_item = self.result_table.item(row, 3)
-
-                    # Write the row data to the CSV file
-                    writer.writerow([
-                        url_item.text() if url_item else "",
-                        title_item.text() if title_item else "",
-                        description_item.text() if description_item else "",
-                        keyword_item.text() if keyword_item else ""
-                    ])
+            # Append the extension of the chosen format if not present
+            fmt = FILTER_FORMATS.get(selected_filter, format_for_path(file_name))
+            if not file_name.endswith("." + fmt):
+                file_name += "." + fmt
+
+            worker = ExportWorker(rows, file_name, fmt)
+            worker.signals.finished.connect(self.export_finished)
+            worker.signals.error.connect(self.error_label.setText)
+            self.threadpool.start(worker)
+
+    def export_finished(self, message):
+        print(message)
+        self.error_label.setText("")
+
+    def choose_jobs_file(self):
+        """Ask for a JSONL jobs file to run as a campaign; return its path, or None if cancelled."""
+        file_name, _ = QFileDialog.getOpenFileName(self, "Run Campaign", "", JOBS_FILTERS)
+        return file_name or None
+
+    def toggle_adaptive(self):
+        """Turn yield-driven keyword generation on or off for the next scrape."""
+        self.adaptive = not self.adaptive
+        self.adaptive_button.setText(f"ADAPTIVE KEYWORDS: {'ON' if self.adaptive else 'OFF'}")
+
+    def toggle_live_export(self):
+        """Pick a CSV/JSONL file that scrapes append rows to as they arrive, or turn that off."""
+        if self.tail_path:
+            self.tail_path = None
+            self.tail_button.setText('LIVE EXPORT: OFF')
+            return
+
+        options = QFileDialog.Options()
+        file_name, selected_filter = QFileDialog.getSaveFileName(self, "Live Export", "", TAIL_FILTERS, options=options)
+        if file_name:
+            fmt = FILTER_FORMATS.get(selected_filter, format_for_path(file_name))
+            if fmt not in TAIL_FORMATS:
+                fmt = "csv"
+            if not file_name.endswith("." + fmt):
+                file_name += "." + fmt
+            self.tail_path = file_name
+            self.tail_button.setText(f'LIVE EXPORT: {file_name}')
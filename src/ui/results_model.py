@@ -0,0 +1,119 @@
+from array import array
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel, QVariant
+
+HEADERS = ["URL", "TITLE", "DESCRIPTION", "KEYWORD", "JOB"]  # JOB is the campaign job a row came from
+
+
+class ResultTableModel(QAbstractTableModel):
+    """Table model over the ResultStore of a scrape job.
+
+    The store holds the pages, with interned keywords and its oldest rows on disk past its memory
+    ceiling; the model only keeps the display order as an array of store indexes, so rows are not
+    copied into the table. Sorting reorders that array with Python's sort rather than comparing
+    through Qt, and rows that arrive afterwards are appended at the bottom.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.store = None
+        self.order = array("q")  # Store index of each table row
+
+    def set_store(self, store):
+        """Show a new store, empty until append_rows() announces its rows."""
+        self.beginResetModel()
+        self.store = store
+        self.order = array("q")
+        self.endResetModel()
+
+    def clear(self):
+        self.set_store(None)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADERS[section]
+        return QVariant()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return QVariant()
+        return self.cell(index.row(), index.column())
+
+    def cell(self, row, column):
+        return self.store.cell(self.order[row], column)
+
+    def row(self, row):
+        """Return (url, title, description, keywords, job) for a row, keywords joined into one string."""
+        return self.store.row(self.order[row])
+
+    def row_matches(self, row, needle):
+        """Return True if any cell of the row contains the lowercase needle."""
+        return any(needle in (value or "").lower() for value in self.row(row))
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Reorder the rows by one column's values."""
+        if column < 0 or not self.order:
+            return
+        self.layoutAboutToBeChanged.emit()
+        keys = [(row[column] or "").lower() for row in self.store.rows(self.order)]
+        order_rows = sorted(range(len(keys)), key=keys.__getitem__, reverse=order == Qt.DescendingOrder)
+        self.order = array("q", (self.order[row] for row in order_rows))
+
+        # Keep selections pointing at the same rows
+        new_rows = {old_row: new_row for new_row, old_row in enumerate(order_rows)}
+        old_indexes = self.persistentIndexList()
+        self.changePersistentIndexList(
+            old_indexes, [self.index(new_rows[index.row()], index.column()) for index in old_indexes]
+        )
+        self.layoutChanged.emit()
+
+    def rows(self, row_numbers=None):
+        """Return an iterator over every row in table order, or only the given row numbers.
+
+        The order is captured when this is called, so the iterator can be consumed on another
+        thread while rows keep being appended or the table is re-sorted.
+        """
+        if row_numbers is None:
+            indexes = array("q", self.order)
+        else:
+            indexes = [self.order[row] for row in row_numbers]
+        return self.store.rows(indexes) if self.store else iter(())
+
+    def append_rows(self, indexes):
+        """Show a batch of rows just added to the store, given their store indexes."""
+        if not indexes:
+            return
+        first = len(self.order)
+        self.beginInsertRows(QModelIndex(), first, first + len(indexes) - 1)
+        self.order.extend(indexes)
+        self.endInsertRows()
+
+    def attach_keywords(self, indexes):
+        """Refresh the keyword column after rows, given by store index, gained keywords."""
+        if not indexes or not self.order:
+            return
+        keyword_column = HEADERS.index("KEYWORD")
+        # One signal for the whole column; the view only repaints the rows it shows
+        self.dataChanged.emit(self.index(0, keyword_column), self.index(len(self.order) - 1, keyword_column))
+
+
+class ResultFilterProxy(QSortFilterProxyModel):
+    """Case-insensitive substring filter over a ResultTableModel that leaves sorting to the model."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.needle = ""
+
+    def set_filter_text(self, text):
+        self.needle = text.lower()
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return not self.needle or self.sourceModel().row_matches(source_row, self.needle)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sourceModel().sort(column, order)